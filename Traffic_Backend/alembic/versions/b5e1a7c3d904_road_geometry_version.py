@@ -0,0 +1,33 @@
+"""road_network geometry_version
+Revision ID: b5e1a7c3d904
+Revises: f2a7c9d18e54
+Create Date: 2026-10-16 23:58:20.517342
+"""
+
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b5e1a7c3d904'
+down_revision = 'f2a7c9d18e54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('road_network', sa.Column('geometry_version', sa.String(length=32), nullable=True))
+    # Backfill: a fresh version per existing road
+    connection = op.get_bind()
+    ids = [row[0] for row in connection.execute(sa.text("SELECT id FROM road_network"))]
+    if ids:
+        connection.execute(
+            sa.text("UPDATE road_network SET geometry_version = :version WHERE id = :id"),
+            [{"id": road_id, "version": uuid.uuid4().hex} for road_id in ids],
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('road_network') as batch_op:
+        batch_op.drop_column('geometry_version')
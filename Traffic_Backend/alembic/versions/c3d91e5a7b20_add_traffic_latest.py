@@ -0,0 +1,50 @@
+"""add traffic_latest
+Revision ID: c3d91e5a7b20
+Revises: fdbbc179a45f
+Create Date: 2026-10-16 23:05:12.418305
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3d91e5a7b20'
+down_revision = 'fdbbc179a45f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('traffic_latest',
+    sa.Column('road_segment_id', sa.Integer(), nullable=False),
+    sa.Column('traffic_dynamics_id', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('flow_entropy', sa.Float(), nullable=True),
+    sa.Column('congestion_state', sa.String(length=32), nullable=True),
+    sa.Column('vehicle_count', sa.Integer(), nullable=True),
+    sa.Column('average_speed', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['road_segment_id'], ['road_network.id'], ),
+    sa.ForeignKeyConstraint(['traffic_dynamics_id'], ['traffic_dynamics.id'], ),
+    sa.PrimaryKeyConstraint('road_segment_id')
+    )
+    # Backfill from existing history: newest reading per segment, highest id on ties
+    op.execute("""
+        INSERT INTO traffic_latest
+            (road_segment_id, traffic_dynamics_id, timestamp, flow_entropy, congestion_state, vehicle_count, average_speed)
+        SELECT td.road_segment_id, td.id, td.timestamp, td.flow_entropy, td.congestion_state, td.vehicle_count, td.average_speed
+        FROM traffic_dynamics td
+        JOIN (
+            SELECT MAX(t.id) AS id
+            FROM traffic_dynamics t
+            JOIN (
+                SELECT road_segment_id, MAX(timestamp) AS newest
+                FROM traffic_dynamics
+                GROUP BY road_segment_id
+            ) n ON t.road_segment_id = n.road_segment_id AND t.timestamp = n.newest
+            GROUP BY t.road_segment_id
+        ) picked ON td.id = picked.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('traffic_latest')
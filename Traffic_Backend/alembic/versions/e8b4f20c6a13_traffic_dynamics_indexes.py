@@ -0,0 +1,24 @@
+"""traffic_dynamics indexes
+Revision ID: e8b4f20c6a13
+Revises: c3d91e5a7b20
+Create Date: 2026-10-16 23:41:37.902214
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e8b4f20c6a13'
+down_revision = 'c3d91e5a7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_traffic_dynamics_segment_timestamp', 'traffic_dynamics', ['road_segment_id', 'timestamp'], unique=False)
+    op.create_index('ix_traffic_dynamics_timestamp', 'traffic_dynamics', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_traffic_dynamics_timestamp', table_name='traffic_dynamics')
+    op.drop_index('ix_traffic_dynamics_segment_timestamp', table_name='traffic_dynamics')
@@ -0,0 +1,108 @@
+"""traffic rollups
+Revision ID: f2a7c9d18e54
+Revises: e8b4f20c6a13
+Create Date: 2026-10-17 00:32:48.551960
+"""
+
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f2a7c9d18e54'
+down_revision = 'e8b4f20c6a13'
+branch_labels = None
+depends_on = None
+
+ROLLUP_TABLES = ('traffic_rollup_1m', 'traffic_rollup_15m', 'traffic_rollup_1h')
+
+# Frozen copies of the app's settings at this revision: bucket width and the
+# days of history backfilled into each table (None for all of it)
+BUCKETS = {'traffic_rollup_1m': (60, 2), 'traffic_rollup_15m': (15 * 60, 60), 'traffic_rollup_1h': (60 * 60, None)}
+SUM_COLUMNS = (
+    'sample_count', 'speed_count', 'speed_sum', 'speed_sq_sum',
+    'vehicle_samples', 'vehicle_sum', 'entropy_samples', 'entropy_sum',
+)
+BATCH_ROWS = 5000
+
+
+def upgrade() -> None:
+    for name in ROLLUP_TABLES:
+        op.create_table(name,
+        sa.Column('road_segment_id', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('speed_count', sa.Integer(), nullable=False),
+        sa.Column('speed_sum', sa.Float(precision=53), nullable=False),
+        sa.Column('speed_sq_sum', sa.Float(precision=53), nullable=False),
+        sa.Column('vehicle_samples', sa.Integer(), nullable=False),
+        sa.Column('vehicle_sum', sa.Integer(), nullable=False),
+        sa.Column('entropy_samples', sa.Integer(), nullable=False),
+        sa.Column('entropy_sum', sa.Float(precision=53), nullable=False),
+        sa.ForeignKeyConstraint(['road_segment_id'], ['road_network.id'], ),
+        sa.PrimaryKeyConstraint('road_segment_id', 'bucket_start')
+        )
+        op.create_index(f'ix_{name}_bucket_start', name, ['bucket_start'], unique=False)
+
+    _backfill(op.get_bind())
+
+
+def _bucket_start(timestamp, bucket_seconds):
+    midnight = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    offset = int((timestamp - midnight).total_seconds())
+    return midnight + timedelta(seconds=offset - offset % bucket_seconds)
+
+
+def _backfill(connection):
+    """Aggregate the existing history into the rollup tables, one segment at a time."""
+    now = datetime.now()
+    oldest = {name: now - timedelta(days=days) if days is not None else None for name, (_, days) in BUCKETS.items()}
+    readings = sa.text(
+        "SELECT id, timestamp, average_speed, vehicle_count, flow_entropy FROM traffic_dynamics"
+        " WHERE road_segment_id = :segment_id AND id > :last_id AND timestamp IS NOT NULL"
+        " ORDER BY id LIMIT :limit"
+    ).columns(sa.column('id', sa.Integer), sa.column('timestamp', sa.DateTime), sa.column('average_speed', sa.Float),
+              sa.column('vehicle_count', sa.Integer), sa.column('flow_entropy', sa.Float))
+    segment_ids = connection.execute(sa.text(
+        "SELECT DISTINCT road_segment_id FROM traffic_dynamics WHERE road_segment_id IS NOT NULL"
+    )).scalars().all()
+
+    for segment_id in segment_ids:
+        buckets = {name: {} for name in ROLLUP_TABLES}
+        last_id = 0
+        while True:
+            rows = connection.execute(readings, {'segment_id': segment_id, 'last_id': last_id, 'limit': BATCH_ROWS}).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                speed, vehicles, entropy = row.average_speed, row.vehicle_count, row.flow_entropy
+                increments = (
+                    1, int(speed is not None), speed or 0.0, speed * speed if speed is not None else 0.0,
+                    int(vehicles is not None), vehicles or 0, int(entropy is not None), entropy or 0.0,
+                )
+                for name, (bucket_seconds, _) in BUCKETS.items():
+                    if oldest[name] is not None and row.timestamp < oldest[name]:
+                        continue
+                    totals = buckets[name].setdefault(_bucket_start(row.timestamp, bucket_seconds), [0] * len(SUM_COLUMNS))
+                    for i, value in enumerate(increments):
+                        totals[i] += value
+
+        for name, by_start in buckets.items():
+            if not by_start:
+                continue
+            insert = sa.text(
+                f"INSERT INTO {name} (road_segment_id, bucket_start, {', '.join(SUM_COLUMNS)})"
+                f" VALUES (:road_segment_id, :bucket_start, {', '.join(':' + c for c in SUM_COLUMNS)})"
+            ).bindparams(sa.bindparam('bucket_start', type_=sa.DateTime))
+            connection.execute(insert, [
+                {'road_segment_id': segment_id, 'bucket_start': start, **dict(zip(SUM_COLUMNS, totals))}
+                for start, totals in by_start.items()
+            ])
+
+
+def downgrade() -> None:
+    for name in reversed(ROLLUP_TABLES):
+        op.drop_index(f'ix_{name}_bucket_start', table_name=name)
+        op.drop_table(name)
@@ -0,0 +1,310 @@
+"""
+Contraction hierarchies over the compact CSR road graph.
+
+Optional preprocessing for the uploaded road network: nodes are contracted one
+by one (adding shortcut edges where no witness path exists), after which a
+point-to-point query is a small bidirectional search that only climbs the
+hierarchy. The result is persisted next to a hash of the network so a restart
+or re-upload of the same network reuses it.
+"""
+
+import hashlib
+import heapq
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Nodes settled per witness search before a shortcut is added anyway
+WITNESS_SETTLE_LIMIT = 60
+
+# Bump when the on-disk layout changes so old files are rebuilt
+CH_FORMAT_VERSION = 1
+
+
+def network_hash(csr) -> str:
+    """Stable hash of a CSR road graph's topology, weights and node coordinates."""
+    digest = hashlib.sha256()
+    for array in (csr.indptr, csr.indices, csr.weight, csr.node_coords):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(str(CH_FORMAT_VERSION).encode())
+    return digest.hexdigest()[:20]
+
+
+def _to_csr(adjacency: List[dict]):
+    """Pack per-node {neighbor: (weight, middle)} dicts into CSR arrays."""
+    indptr = np.zeros(len(adjacency) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in adjacency], out=indptr[1:])
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    weight = np.empty(indptr[-1], dtype=np.float64)
+    middle = np.empty(indptr[-1], dtype=np.int32)
+    for node, edges in enumerate(adjacency):
+        start = indptr[node]
+        for offset, (neighbor, (w, mid)) in enumerate(edges.items()):
+            indices[start + offset] = neighbor
+            weight[start + offset] = w
+            middle[start + offset] = mid
+    return indptr, indices, weight, middle
+
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy of a directed road graph, indexed by CSR node.
+
+    up_* arrays hold, for each node, its edges to higher-ranked nodes;
+    down_* arrays hold, for each node, the edges arriving from higher-ranked
+    nodes. middle is the contracted node a shortcut bypasses (-1 for an
+    original road edge).
+
+    Attributes:
+        rank (np.ndarray): Contraction order of each node
+        network_hash (str): Hash of the CSR graph the hierarchy was built from
+    """
+
+    def __init__(self, rank, up_indptr, up_indices, up_weight, up_middle,
+                 down_indptr, down_indices, down_weight, down_middle, network_hash: str = ""):
+        self.rank = rank
+        self.up_indptr, self.up_indices, self.up_weight, self.up_middle = (
+            up_indptr, up_indices, up_weight, up_middle
+        )
+        self.down_indptr, self.down_indices, self.down_weight, self.down_middle = (
+            down_indptr, down_indices, down_weight, down_middle
+        )
+        self.network_hash = network_hash
+        # Python adjacency lists: queries touch few nodes, and list access beats numpy scalars
+        self._up = self._adjacency(up_indptr, up_indices, up_weight, up_middle)
+        self._down = self._adjacency(down_indptr, down_indices, down_weight, down_middle)
+
+    @staticmethod
+    def _adjacency(indptr, indices, weight, middle):
+        targets, weights, middles = indices.tolist(), weight.tolist(), middle.tolist()
+        bounds = indptr.tolist()
+        return [
+            list(zip(targets[lo:hi], weights[lo:hi], middles[lo:hi]))
+            for lo, hi in zip(bounds[:-1], bounds[1:])
+        ]
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.rank)
+
+    @property
+    def num_shortcuts(self) -> int:
+        return int((self.up_middle >= 0).sum() + (self.down_middle >= 0).sum())
+
+    @classmethod
+    def build(cls, csr) -> "ContractionHierarchy":
+        """
+        Contract every node of a CSRRoadGraph in edge-difference order.
+
+        Priorities are updated lazily: a popped node is re-evaluated and pushed
+        back if it is no longer the cheapest to contract.
+        """
+        n = csr.num_nodes
+        out_edges = [dict() for _ in range(n)]
+        in_edges = [dict() for _ in range(n)]
+        indptr, indices, weight = csr.indptr.tolist(), csr.indices.tolist(), csr.weight.tolist()
+        for u in range(n):
+            for e in range(indptr[u], indptr[u + 1]):
+                v, w = indices[e], weight[e]
+                if u != v and w < out_edges[u].get(v, (float('inf'),))[0]:
+                    out_edges[u][v] = (w, -1)
+                    in_edges[v][u] = (w, -1)
+
+        contracted = [False] * n
+        deleted_neighbors = [0] * n
+
+        def witness_distances(source, skip, max_dist):
+            """Bounded Dijkstra among uncontracted nodes, never passing through skip."""
+            dist = {source: 0.0}
+            heap = [(0.0, source)]
+            settled = 0
+            while heap and settled < WITNESS_SETTLE_LIMIT:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > max_dist:
+                    break
+                settled += 1
+                for v, (w, _) in out_edges[u].items():
+                    if v == skip:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def shortcuts_for(v):
+            shortcuts = []
+            for u, (w_uv, _) in in_edges[v].items():
+                targets = [(x, w_uv + w_vx) for x, (w_vx, _) in out_edges[v].items() if x != u]
+                if not targets:
+                    continue
+                dist = witness_distances(u, v, max(via for _, via in targets))
+                shortcuts.extend((u, x, via) for x, via in targets if dist.get(x, float('inf')) > via)
+            return shortcuts
+
+        def priority(v):
+            edge_difference = len(shortcuts_for(v)) - len(in_edges[v]) - len(out_edges[v])
+            return edge_difference + deleted_neighbors[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.empty(n, dtype=np.int32)
+        up = [None] * n
+        down = [None] * n
+        order = 0
+
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            current = priority(v)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, x, via in shortcuts_for(v):
+                if via < out_edges[u].get(x, (float('inf'),))[0]:
+                    out_edges[u][x] = (via, v)
+                    in_edges[x][u] = (via, v)
+
+            # Every remaining neighbor will be contracted later, so these edges point up the hierarchy
+            up[v] = out_edges[v]
+            down[v] = in_edges[v]
+            for x in out_edges[v]:
+                del in_edges[x][v]
+                deleted_neighbors[x] += 1
+            for u in in_edges[v]:
+                del out_edges[u][v]
+                deleted_neighbors[u] += 1
+            out_edges[v], in_edges[v] = {}, {}
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        return cls(rank, *_to_csr(up), *_to_csr(down), network_hash=network_hash(csr))
+
+    def _search(self, source: int, target: int):
+        """Bidirectional upward search; returns (distance, meeting node, parents) or None."""
+        dists = ({source: 0.0}, {target: 0.0})
+        parents = ({source: None}, {target: None})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        adjacency = (self._up, self._down)
+        best, meet = float('inf'), None
+
+        while heaps[0] or heaps[1]:
+            for side in (0, 1):
+                heap = heaps[side]
+                if not heap:
+                    continue
+                d, u = heapq.heappop(heap)
+                if d >= best:
+                    heap.clear()
+                    continue
+                dist, other = dists[side], dists[1 - side]
+                if d > dist[u]:
+                    continue
+                if u in other and d + other[u] < best:
+                    best, meet = d + other[u], u
+                for v, w, mid in adjacency[side][u]:
+                    nd = d + w
+                    if nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        parents[side][v] = (u, mid)
+                        heapq.heappush(heap, (nd, v))
+
+        if meet is None:
+            return None
+        return best, meet, parents
+
+    def distance(self, source: int, target: int) -> Optional[float]:
+        """Shortest-path cost between two CSR nodes, or None when unreachable."""
+        if source == target:
+            return 0.0
+        result = self._search(source, target)
+        return result[0] if result is not None else None
+
+    def shortest_path(self, source: int, target: int) -> Optional[Tuple[float, List[int]]]:
+        """Shortest path between two CSR nodes as (cost, node list) with shortcuts unpacked."""
+        if source == target:
+            return 0.0, [source]
+        result = self._search(source, target)
+        if result is None:
+            return None
+        best, meet, (forward, backward) = result
+
+        hops = []
+        node = meet
+        while forward[node] is not None:
+            parent, mid = forward[node]
+            hops.append((parent, node, mid))
+            node = parent
+        hops.reverse()
+        node = meet
+        while backward[node] is not None:
+            child, mid = backward[node]
+            hops.append((node, child, mid))
+            node = child
+
+        path = [source]
+        for u, v, mid in hops:
+            path.extend(self._unpack(u, v, mid))
+        return best, path
+
+    def _unpack(self, u: int, v: int, mid: int) -> List[int]:
+        """Original nodes after u on the edge u -> v, expanding shortcuts recursively."""
+        stack = [(u, v, mid)]
+        nodes = []
+        while stack:
+            a, b, m = stack.pop()
+            if m < 0:
+                nodes.append(b)
+                continue
+            # Both halves of a shortcut hang off the lower-ranked middle node
+            first = next(x for x in self._down[m] if x[0] == a)
+            second = next(x for x in self._up[m] if x[0] == b)
+            stack.append((m, b, second[2]))
+            stack.append((a, m, first[2]))
+        return nodes
+
+    def save(self, path: str):
+        """Write the hierarchy to an .npz file atomically."""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(suffix=".npz.part", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                np.savez(
+                    fh,
+                    rank=self.rank,
+                    up_indptr=self.up_indptr, up_indices=self.up_indices,
+                    up_weight=self.up_weight, up_middle=self.up_middle,
+                    down_indptr=self.down_indptr, down_indices=self.down_indices,
+                    down_weight=self.down_weight, down_middle=self.down_middle,
+                    network_hash=np.array(self.network_hash),
+                )
+            os.replace(partial_path, path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "ContractionHierarchy":
+        """Read a hierarchy written by save()."""
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files}
+        return cls(network_hash=str(arrays.pop("network_hash")), **arrays)
+
+    @classmethod
+    def load_or_build(cls, csr, cache_dir: str) -> "ContractionHierarchy":
+        """Reuse the cached hierarchy for this network if present, otherwise build and cache it."""
+        path = os.path.join(cache_dir, f"ch_{network_hash(csr)}.npz")
+        if os.path.exists(path):
+            return cls.load(path)
+        hierarchy = cls.build(csr)
+        hierarchy.save(path)
+        return hierarchy
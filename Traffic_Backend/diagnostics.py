@@ -0,0 +1,109 @@
+"""
+Opt-in request diagnostics for hot endpoints.
+
+Endpoints log through get_diagnostics_logger(). When diagnostics are enabled
+(NAVDRISHTI_DIAGNOSTICS=DEBUG, INFO, ...), records are put on a bounded queue
+by the request thread and written by a background QueueListener to a
+size-capped rotating file. When disabled, the loggers sit above every level, so
+a call is a single isEnabledFor check: nothing is formatted, queued or written.
+"""
+
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Optional
+
+DIAGNOSTICS_LOGGER = "navdrishti.diagnostics"
+
+# Level name to record at (e.g. "DEBUG"); empty or unknown disables diagnostics
+DIAGNOSTICS_LEVEL = os.getenv("NAVDRISHTI_DIAGNOSTICS", "")
+DIAGNOSTICS_FILE = os.getenv("NAVDRISHTI_DIAGNOSTICS_FILE", "traffic_endpoint_debug.log")
+DIAGNOSTICS_MAX_BYTES = int(os.getenv("NAVDRISHTI_DIAGNOSTICS_MAX_BYTES", str(5 * 1024 * 1024)))
+DIAGNOSTICS_BACKUP_COUNT = int(os.getenv("NAVDRISHTI_DIAGNOSTICS_BACKUPS", "3"))
+
+# Records waiting for the writer thread; beyond this they are dropped, never blocking a request
+DIAGNOSTICS_QUEUE_SIZE = 10000
+
+_DISABLED = logging.CRITICAL + 1
+
+_root = logging.getLogger(DIAGNOSTICS_LOGGER)
+_root.setLevel(_DISABLED)
+_root.propagate = False
+
+_handler: Optional["DroppingQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts and discards records when the queue is full."""
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def get_diagnostics_logger(name: str) -> logging.Logger:
+    """Child logger of the diagnostics tree for one endpoint or module."""
+    return logging.getLogger(f"{DIAGNOSTICS_LOGGER}.{name}")
+
+
+def diagnostics_enabled() -> bool:
+    return _listener is not None
+
+
+def start_diagnostics(level: Optional[str] = None, path: Optional[str] = None) -> bool:
+    """
+    Start writing diagnostics if a level is configured. Safe to call more than once.
+
+    Returns:
+        True if diagnostics are running after the call
+    """
+    global _handler, _listener
+    if _listener is not None:
+        return True
+
+    level_name = (level if level is not None else DIAGNOSTICS_LEVEL).strip().upper()
+    numeric_level = logging.getLevelName(level_name) if level_name else None
+    if not isinstance(numeric_level, int):
+        return False
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        path or DIAGNOSTICS_FILE,
+        maxBytes=DIAGNOSTICS_MAX_BYTES,
+        backupCount=DIAGNOSTICS_BACKUP_COUNT,
+        encoding="utf-8",
+        delay=True,
+    )
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    _handler = DroppingQueueHandler(queue.Queue(DIAGNOSTICS_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(_handler.queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    _root.addHandler(_handler)
+    _root.setLevel(numeric_level)
+    return True
+
+
+def stop_diagnostics():
+    """Flush queued records to the file and disable diagnostics again."""
+    global _handler, _listener
+    if _listener is None:
+        return
+    _root.setLevel(_DISABLED)
+    _root.removeHandler(_handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _handler, _listener = None, None
+
+
+def dropped_records() -> int:
+    """Records discarded because the writer thread fell behind."""
+    return _handler.dropped if _handler is not None else 0
@@ -10,15 +10,25 @@ import sys
 this_dir = os.path.dirname(os.path.abspath(__file__))
 if this_dir not in sys.path:
     sys.path.insert(0, this_dir)
+# traffic_rollups imports through the Traffic_Backend package
+repo_root = os.path.dirname(this_dir)
+if repo_root not in sys.path:
+    sys.path.append(repo_root)
 
 from db_config import engine, SessionLocal
-from models import Base, Project, User
+from models import Base, Project, User, rebuild_traffic_latest
+from traffic_rollups import rebuild_traffic_rollups
 from auth import create_user
 
 
 def create_tables():
     print("Creating tables...")
     Base.metadata.create_all(bind=engine)
+    # traffic_latest and the rollups may be new next to existing history; rollup
+    # buckets older than the remaining raw history are kept, not rebuilt
+    with engine.begin() as conn:
+        rebuild_traffic_latest(conn)
+        rebuild_traffic_rollups(conn)
     print("Tables created")
 
 
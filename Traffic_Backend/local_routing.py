@@ -0,0 +1,315 @@
+"""
+Offline routing on the in-process road graph.
+
+Answers get_diversion_routes in the same response shape as the parsed Mapbox
+Directions result, so air-gapped deployments and load tests get road-following
+routes without network access. Durations use the latest TrafficDynamics speed
+of every segment along a route, with a default speed where none is recorded.
+"""
+
+import logging
+import math
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import networkx as nx
+import pandas as pd
+import shapely
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from Traffic_Backend.models import RoadNetwork, TrafficLatest
+from Traffic_Backend.road_routing import (
+    RoutePath, SearchBudget, k_shortest_paths, node_haversine_m,
+)
+
+logger = logging.getLogger("local_routing")
+
+# Speed used for segments without a TrafficDynamics reading, per routing profile
+DEFAULT_SPEED_KMH = {
+    "driving-traffic": 30.0,
+    "driving": 30.0,
+    "walking": 5.0,
+}
+# Only the traffic-aware profile uses observed speeds
+TRAFFIC_PROFILES = {"driving-traffic"}
+
+# Seconds between reloads of the per-segment speed table
+SPEED_REFRESH_S = 60.0
+
+# Per-request limits for the alternative-route search
+LOCAL_ROUTE_TIME_BUDGET_S = 0.5
+LOCAL_ROUTE_MAX_EXPANSIONS = 200_000
+
+# Origin/destination farther than this from every graph node are rejected
+LOCAL_SNAP_MAX_M = 1000.0
+
+# Heading change (degrees) between consecutive edges counted as a turn
+TURN_ANGLE_DEG = 30.0
+
+# Column of an uploaded road network that holds RoadNetwork.id. A plain "id"
+# property is not trusted: in OSM exports it is the way id, unrelated to road_network.
+ROAD_ID_COLUMN = "road_segment_id"
+# Ids checked against road_network per query
+ROAD_ID_LOOKUP_BATCH = 5000
+
+
+def load_segment_speeds(db: Optional[Session] = None) -> Dict[Any, float]:
+    """Latest positive average_speed (km/h) of every road segment with TrafficDynamics readings."""
+    owns_session = db is None
+    if owns_session:
+        from Traffic_Backend.db_config import SessionLocal
+        db = SessionLocal()
+    try:
+        rows = (
+            db.query(TrafficLatest.road_segment_id, TrafficLatest.average_speed)
+            .filter(TrafficLatest.average_speed > 0)
+            .all()
+        )
+        return {segment_id: float(speed) for segment_id, speed in rows}
+    finally:
+        if owns_session:
+            db.close()
+
+
+def _integral_id(value) -> Optional[int]:
+    """value as an int when it is a whole number or a string of digits, else None."""
+    if isinstance(value, (bool, np.bool_)):
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return int(value) if math.isfinite(value) and float(value).is_integer() else None
+    if isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+        return int(value)
+    return None
+
+
+def _explicit_road_ids(values: pd.Series, db: Session) -> List[Optional[int]]:
+    """
+    Per row, the ROAD_ID_COLUMN value when it is an integral id that no other row
+    repeats and that exists in road_network, else None.
+    """
+    candidates = [_integral_id(value) for value in values]
+    counts = Counter(road_id for road_id in candidates if road_id is not None)
+    unique = [road_id for road_id, n in counts.items() if n == 1]
+    known = set()
+    for start in range(0, len(unique), ROAD_ID_LOOKUP_BATCH):
+        batch = unique[start:start + ROAD_ID_LOOKUP_BATCH]
+        known.update(road_id for (road_id,) in db.query(RoadNetwork.id).filter(RoadNetwork.id.in_(batch)))
+
+    ids = [road_id if road_id in known else None for road_id in candidates]
+    rejected = sum(road_id is None for road_id in ids) - int(values.isna().sum())
+    if rejected:
+        logger.warning(
+            f"{rejected} uploaded {ROAD_ID_COLUMN} values are not unique, integral RoadNetwork ids; "
+            f"matching those segments by name"
+        )
+    return ids
+
+
+def road_network_ids(road_network, db: Optional[Session] = None) -> pd.Index:
+    """
+    RoadNetwork.id of every row of an uploaded road network, to use as its index.
+
+    Graph edges and snapped points carry the GeoDataFrame index as segment_id,
+    while TrafficLatest and TrafficDynamics are keyed by RoadNetwork.id, so the
+    upload is re-indexed by the real ids. A ROAD_ID_COLUMN value is used when it
+    is an integral id, unique in the upload and present in road_network; other
+    rows are matched by road name against the road_network table. Rows without
+    a match (or sharing a name with another road) get None and route on default
+    speeds.
+    """
+    ids: List[Optional[int]] = [None] * len(road_network)
+    has_ids = ROAD_ID_COLUMN in road_network.columns
+    has_names = "name" in road_network.columns
+    if has_ids or has_names:
+        owns_session = db is None
+        if owns_session:
+            from Traffic_Backend.db_config import SessionLocal
+            db = SessionLocal()
+        try:
+            if has_ids:
+                ids = _explicit_road_ids(road_network[ROAD_ID_COLUMN], db)
+            if has_names and None in ids:
+                rows = db.query(RoadNetwork.id, RoadNetwork.name).all()
+                id_by_name: Dict[Any, Any] = {}
+                for road_id, name in rows:
+                    # A name held by two roads cannot tell them apart
+                    id_by_name[name] = None if name in id_by_name else road_id
+                # An id already given explicitly to another row is not handed out again
+                claimed = {road_id for road_id in ids if road_id is not None}
+                for row, name in enumerate(road_network["name"]):
+                    if ids[row] is None and id_by_name.get(name) not in claimed:
+                        ids[row] = id_by_name.get(name)
+        finally:
+            if owns_session:
+                db.close()
+
+    unmatched = sum(road_id is None for road_id in ids)
+    if unmatched:
+        logger.warning(f"{unmatched} of {len(ids)} uploaded road segments have no RoadNetwork id")
+        return pd.Index(ids, dtype=object, name="road_segment_id")
+    return pd.Index(ids, dtype="int64", name="road_segment_id")
+
+
+def _count_turns(coords: np.ndarray) -> int:
+    """Number of vertices where the heading changes by more than TURN_ANGLE_DEG."""
+    if len(coords) < 3:
+        return 0
+    deltas = np.diff(coords, axis=0)
+    # Scale longitude by cos(latitude) so headings are not skewed away from the equator
+    deltas[:, 0] *= np.cos(np.radians(coords[:-1, 1]))
+    headings = np.degrees(np.arctan2(deltas[:, 1], deltas[:, 0]))
+    change = np.abs((np.diff(headings) + 180.0) % 360.0 - 180.0)
+    return int((change > TURN_ANGLE_DEG).sum())
+
+
+class LocalRouter:
+    """
+    Alternative routes on the in-process road graph (a road_graph.CSRRoadGraph,
+    or a DiGraph built by road_graph.build_road_graph).
+
+    Paths are found by k-shortest-paths on 'length_m' and then ranked by
+    estimated travel time.
+
+    Args:
+        graph: CSRRoadGraph (or NetworkX DiGraph) keyed by (lon, lat) node ids
+        csr: Optional CSRRoadGraph of the same network, used for nearest-node lookups
+            (defaults to graph when graph is itself a CSRRoadGraph)
+        speed_loader: Callable returning {segment_id: speed_kmh}; None routes on default speeds
+        refresh_s: Seconds a loaded speed table is reused
+    """
+
+    def __init__(self, graph, csr=None,
+                 speed_loader: Optional[Callable[[], Dict[Any, float]]] = None,
+                 refresh_s: float = SPEED_REFRESH_S):
+        self.graph = graph
+        self.csr = csr if csr is not None or isinstance(graph, nx.DiGraph) else graph
+        self.speed_loader = speed_loader
+        self.refresh_s = refresh_s
+        self._speeds: Dict[Any, float] = {}
+        self._speeds_loaded_at: Optional[float] = None
+        self._edges = None
+        self._edge_lines = None
+        if self.csr is None and graph.number_of_nodes():
+            self._node_ids = list(graph.nodes())
+            self._node_coords = np.array(self._node_ids, dtype=float)
+
+    def segment_speeds(self) -> Dict[Any, float]:
+        """Per-segment speeds, reloaded when older than refresh_s (kept on loader failure)."""
+        now = time.monotonic()
+        if self.speed_loader is not None and (
+            self._speeds_loaded_at is None or now - self._speeds_loaded_at >= self.refresh_s
+        ):
+            try:
+                self._speeds = self.speed_loader()
+            except Exception as e:
+                logger.warning(f"Could not load segment speeds, keeping previous table: {e}")
+            self._speeds_loaded_at = now
+        return self._speeds
+
+    def nearest_node(self, point: Tuple[float, float]) -> Optional[Hashable]:
+        """Closest graph node to a (lon, lat) point, or None when the graph is empty."""
+        if self.csr is not None:
+            nodes, _ = self.csr.nearest_nodes([point[0]], [point[1]])
+            return self.csr.node_key(int(nodes[0])) if nodes[0] >= 0 else None
+        if not self.graph.number_of_nodes():
+            return None
+        d2 = ((self._node_coords - np.asarray(point, dtype=float)) ** 2).sum(axis=1)
+        return self._node_ids[int(np.argmin(d2))]
+
+    def edge_lines(self) -> Tuple[list, np.ndarray]:
+        """Graph edges as (u, v) pairs and matching straight LineStrings, built on first use."""
+        if self._edges is None:
+            self._edges = list(self.graph.edges())
+            coords = np.array(self._edges, dtype=float).reshape(len(self._edges), 2, 2)
+            self._edge_lines = shapely.linestrings(coords)
+        return self._edges, self._edge_lines
+
+    def blocked_edges(self, avoid_zones) -> set:
+        """Edges that enter any of the zones (an AvoidanceZones) and must not be routed over."""
+        if avoid_zones is None or len(avoid_zones) == 0:
+            return set()
+        edges, lines = self.edge_lines()
+        mask = avoid_zones.intersecting(lines)
+        return {edges[i] for i in np.flatnonzero(mask)}
+
+    def _snap(self, point: Tuple[float, float], label: str) -> Hashable:
+        node = self.nearest_node(point)
+        if node is None or node_haversine_m(point, node) > LOCAL_SNAP_MAX_M:
+            raise HTTPException(status_code=400, detail=f"{label} is not near the loaded road network")
+        return node
+
+    def duration_s(self, route: RoutePath, profile: str) -> float:
+        """Travel time of a route from per-edge meters and segment speeds."""
+        default = DEFAULT_SPEED_KMH.get(profile, DEFAULT_SPEED_KMH["driving"])
+        speeds = self.segment_speeds() if profile in TRAFFIC_PROFILES else {}
+        kmh = np.array([speeds.get(s, default) for s in route.edge_attrs['segment_id']], dtype=float)
+        return float((route.edge_attrs['length_m'] / (kmh / 3.6)).sum())
+
+    def route(
+        self,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float],
+        alternatives: int = 3,
+        profile: str = "driving-traffic",
+        avoid_zones=None,
+    ) -> Dict[str, Any]:
+        """
+        Up to `alternatives` routes, fastest first, shaped like get_diversion_routes output.
+        Edges entering any of avoid_zones are masked out before the search.
+        """
+        start = self._snap(origin, "Origin")
+        end = self._snap(destination, "Destination")
+        blocked = self.blocked_edges(avoid_zones)
+
+        budget = SearchBudget(LOCAL_ROUTE_TIME_BUDGET_S, LOCAL_ROUTE_MAX_EXPANSIONS)
+        paths = k_shortest_paths(
+            self.graph, start, end, k=max(1, alternatives), weight='length_m',
+            budget=budget, heuristic=node_haversine_m, ignored_edges=blocked,
+        )
+        if not paths:
+            detail = "No route found on the local road network"
+            if blocked:
+                detail = "No route on the local road network avoids the construction zones"
+            raise HTTPException(status_code=404, detail=detail)
+
+        candidates = []
+        for cost, nodes in paths:
+            path = RoutePath.from_nodes(self.graph, nodes, cost)
+            candidates.append((self.duration_s(path, profile), path))
+        candidates.sort(key=lambda c: c[0])
+
+        routes = []
+        for idx, (duration, path) in enumerate(candidates):
+            coords = np.array(path.nodes, dtype=float)
+            distance = float(path.edge_attrs['length_m'].sum())
+            routes.append({
+                "id": f"route-{idx + 1}",
+                "duration_seconds": duration,
+                "duration_minutes": round(duration / 60, 1),
+                "distance_meters": distance,
+                "distance_km": round(distance / 1000, 2),
+                "geometry": {"type": "LineString", "coordinates": coords.tolist()},
+                "legs": [],
+                "weight": duration,
+                "turn_count": _count_turns(coords),
+                "road_classes": [],
+                "turn_instructions": [],
+                "profile": profile,
+            })
+
+        logger.info(f"Local router found {len(routes)} routes ({budget.expansions} expansions)")
+        return {
+            "success": True,
+            "routes": routes,
+            "waypoints": [
+                {"name": "", "location": list(start), "distance": node_haversine_m(origin, start)},
+                {"name": "", "location": list(end), "distance": node_haversine_m(destination, end)},
+            ],
+            "engine": "local",
+            "avoidance": {"zones": len(avoid_zones) if avoid_zones is not None else 0, "blocked_edges": len(blocked)},
+        }
@@ -1,9 +1,18 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from .auth import require_role
 from .routers.projects import router as projects_router
+from .diagnostics import start_diagnostics, stop_diagnostics
+from .traffic_rollups import run_retention_periodically
+import asyncio
 import pandas as pd
+import numpy as np
 import io
+import json
+import os
+import tempfile
 from typing import Optional, Tuple
 from pydantic import BaseModel
 import socket
@@ -12,15 +21,20 @@ import socket
 try:
     import geopandas as gpd  # type: ignore
     from shapely.geometry import Point, LineString  # type: ignore
-    from shapely.ops import nearest_points  # type: ignore
     import networkx as nx  # type: ignore
+    from .road_graph import RoadSegmentIndex, build_road_graph, CSRRoadGraph
+    from .contraction_hierarchy import ContractionHierarchy
+    from .local_routing import LocalRouter, load_segment_speeds, road_network_ids
     _GEO_DEPS_AVAILABLE = True
 except Exception:
     gpd = None  # type: ignore
     Point = None  # type: ignore
     LineString = None  # type: ignore
-    nearest_points = None  # type: ignore
     nx = None  # type: ignore
+    RoadSegmentIndex = None  # type: ignore
+    build_road_graph = None  # type: ignore
+    CSRRoadGraph = None  # type: ignore
+    ContractionHierarchy = None  # type: ignore
     _GEO_DEPS_AVAILABLE = False
 
 app = FastAPI(title="Damaged Roads Service", version="1.0.0")
@@ -113,6 +127,9 @@ async def _diagnostic_startup():
         except Exception as db_err:
             logger.warning(f'Could not run DB test: {db_err}')
 
+        if start_diagnostics():
+            logger.info('Endpoint diagnostics enabled')
+
         logger.info('Diagnostic startup complete')
     except Exception as e:
         logger.exception('Exception during diagnostic startup:')
@@ -122,17 +139,68 @@ async def _diagnostic_startup():
 async def _diagnostic_shutdown():
     try:
         logger.info('Application shutdown event fired')
+        stop_diagnostics()
     except Exception:
         pass
 
+
+@app.on_event("startup")
+async def _start_mapbox_client():
+    # Same module object the routers import (they put Traffic_Backend on sys.path)
+    import mapbox_service
+    await mapbox_service.start_http_client()
+    await run_in_threadpool(mapbox_service.geocode_cache.warm)
+
+
+@app.on_event("startup")
+async def _start_traffic_retention():
+    global _traffic_retention_task
+    from .db_config import SessionLocal
+    _traffic_retention_task = asyncio.create_task(run_retention_periodically(SessionLocal))
+
+
+@app.on_event("shutdown")
+async def _stop_traffic_retention():
+    if _traffic_retention_task is not None:
+        _traffic_retention_task.cancel()
+
+
+@app.on_event("shutdown")
+async def _close_mapbox_client():
+    import mapbox_service
+    await mapbox_service.close_http_client()
+    # Waits for the writer thread to store queued entries
+    await run_in_threadpool(mapbox_service.geocode_cache.close)
+
 # Global variables to store road network data
 road_network_gdf: Optional[object] = None
-road_network_graph: Optional[object] = None
+road_network_graph: Optional[object] = None  # NetworkX graph, only built on request (networkx_graph=true)
+road_network_index: Optional[object] = None  # STRtree over road segments, built on upload
+road_network_csr: Optional[object] = None  # compact CSR road graph every routing endpoint searches
+road_network_ch: Optional[object] = None  # optional contraction hierarchy over road_network_csr
 damaged_roads_df: Optional[pd.DataFrame] = None  # Store ingested damaged roads data
+damaged_roads_store_path: Optional[str] = None  # On-disk snapped results from streaming ingestion
+_traffic_retention_task: Optional[asyncio.Task] = None  # periodic traffic_rollups.apply_retention
 
 # Tolerance for snapping GPS points (in degrees)
 SNAP_TOLERANCE = 0.0001
 
+# Rows serialized per chunk when streaming snapped results as NDJSON
+NDJSON_CHUNK_ROWS = 5000
+
+# Streaming ingestion: rows read per CSV chunk and where snapped chunks are appended
+DAMAGED_ROADS_CHUNK_ROWS = 20000
+DAMAGED_ROADS_STORE_DIR = os.getenv(
+    "DAMAGED_ROADS_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "navdrishti_damaged_roads")
+)
+
+# Contraction hierarchies are cached here, one file per road network hash
+ROUTING_CH_CACHE_DIR = os.getenv(
+    "ROUTING_CH_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "navdrishti_routing_ch")
+)
+
 
 class DamagedRoadPoint(BaseModel):
     """Model for a damaged road point"""
@@ -155,7 +223,8 @@ class SnappedPoint(BaseModel):
 def snap_point_to_linestring(
     point,
     road_network,
-    tolerance: float = SNAP_TOLERANCE
+    tolerance: float = SNAP_TOLERANCE,
+    road_index=None
 ) -> Tuple[Optional[object], float, Optional[int]]:
     """
     Snap a GPS point to the nearest LineString in the road network.
@@ -164,6 +233,7 @@ def snap_point_to_linestring(
         point: Shapely Point object (lon, lat)
         road_network: GeoDataFrame containing LineString geometries
         tolerance: Maximum distance in degrees to snap (default: 0.0001)
+        road_index: Optional prebuilt RoadSegmentIndex for road_network
     
     Returns:
         Tuple of (snapped_point, distance, road_segment_id)
@@ -175,38 +245,25 @@ def snap_point_to_linestring(
     if road_network is None or len(road_network) == 0:
         raise ValueError("Road network not loaded. Please upload a GeoJSON file first.")
     
-    min_distance = float('inf')
-    nearest_point = None
-    nearest_segment_id = None
+    if road_index is None:
+        road_index = RoadSegmentIndex(road_network)
     
-    # Iterate through all road segments
-    for idx, row in road_network.iterrows():
-        road_geometry = row.geometry
-        
-        if isinstance(road_geometry, LineString):
-            # Find the nearest point on this LineString
-            nearest_on_line, _ = nearest_points(road_geometry, point)
-            distance = point.distance(nearest_on_line)
-            
-            # Check if this is the closest so far and within tolerance
-            if distance < min_distance:
-                min_distance = distance
-                nearest_point = nearest_on_line
-                nearest_segment_id = idx
+    result = road_index.snap([point.x], [point.y], tolerance)
     
     # Check if the nearest point is within tolerance
-    if min_distance <= tolerance:
-        return nearest_point, min_distance, nearest_segment_id
+    if result.within_tolerance[0]:
+        return Point(result.snapped_lon[0], result.snapped_lat[0]), float(result.distance[0]), result.road_segment_id[0]
     else:
-        return None, min_distance, None
+        return None, float(result.distance[0]), None
 
 
-def initialize_networkx_graph(road_network) -> object:
+def initialize_networkx_graph(road_network, include_geometry: bool = True) -> object:
     """
     Initialize a NetworkX DiGraph (Directed Graph) from road network GeoJSON data.
     
     Args:
         road_network: GeoDataFrame containing LineString geometries
+        include_geometry: Attach a LineString 'geometry' to every edge (costly on large networks)
     
     Returns:
         NetworkX DiGraph representing the road network
@@ -217,51 +274,205 @@ def initialize_networkx_graph(road_network) -> object:
     if road_network is None or len(road_network) == 0:
         raise ValueError("Road network not loaded. Please upload a GeoJSON file first.")
     
-    G = nx.DiGraph()
+    # Nodes are rounded (lon, lat) tuples; edges follow the LineString direction only
+    return build_road_graph(road_network, include_geometry=include_geometry)
+
+
+def _normalize_damaged_roads_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize damaged-roads CSV columns in place and validate the required ones."""
+    # Normalize column names (handle both 'Lat'/'Latitude' and 'Lon'/'Longitude')
+    if 'Latitude' in df.columns:
+        df['Lat'] = df['Latitude']
+    if 'Longitude' in df.columns:
+        df['Lon'] = df['Longitude']
+    if 'Image_URL' in df.columns:
+        df['EvidenceImageUrl'] = df['Image_URL']
+    elif 'EvidenceImageUrl' not in df.columns:
+        df['EvidenceImageUrl'] = None
     
-    # Process each road segment
-    for idx, row in road_network.iterrows():
-        geometry = row.geometry
-        
-        if isinstance(geometry, LineString):
-            coords = list(geometry.coords)
-            
-            # Add nodes (intersections/endpoints)
-            for coord in coords:
-                node_id = (round(coord[0], 6), round(coord[1], 6))  # Use rounded coordinates as node ID
-                if not G.has_node(node_id):
-                    G.add_node(node_id, lat=coord[1], lon=coord[0])
+    # Validate required columns
+    required_columns = ['Lat', 'Lon', 'Severity']
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        raise HTTPException(
+            status_code=400,
+            detail=f"CSV must contain columns: {required_columns}. Missing: {missing_columns}"
+        )
+    return df
+
+
+def snap_damaged_roads_frame(df: pd.DataFrame, road_index, tolerance: float = SNAP_TOLERANCE) -> pd.DataFrame:
+    """
+    Snap a normalized damaged-roads DataFrame (Lat, Lon, Severity) in bulk.
+    
+    Args:
+        df: DataFrame with 'Lat', 'Lon' and 'Severity' columns
+        road_index: RoadSegmentIndex of the loaded road network
+        tolerance: Maximum distance in degrees to snap
+    
+    Returns:
+        Columnar DataFrame with the SnappedPoint fields plus a 'warning' column
+        (None for points that were snapped within tolerance)
+    """
+    lats = df['Lat'].to_numpy(dtype=float)
+    lons = df['Lon'].to_numpy(dtype=float)
+    snap = road_index.snap(lons, lats, tolerance)
+    
+    warning = np.full(len(df), None, dtype=object)
+    outside = ~snap.within_tolerance
+    if outside.any():
+        warning[outside] = [
+            f"Point is {distance:.6f} degrees away from nearest road (tolerance: {tolerance})"
+            for distance in snap.distance[outside]
+        ]
+    
+    return pd.DataFrame({
+        "original_lat": lats,
+        "original_lon": lons,
+        "snapped_lat": snap.snapped_lat,
+        "snapped_lon": snap.snapped_lon,
+        "severity": df['Severity'].astype(str).to_numpy(),
+        "distance": snap.distance,
+        "road_segment_id": pd.array(snap.road_segment_id, dtype="Int64"),
+        "warning": warning,
+    })
+
+
+def _snapped_frame_to_records(snapped: pd.DataFrame) -> list:
+    """Convert a snapped results frame into JSON-ready dicts (warning only on unsnapped points)."""
+    columns = {
+        col: snapped[col].astype(object).where(snapped[col].notna(), None).tolist()
+        for col in snapped.columns
+    }
+    records = []
+    for i in range(len(snapped)):
+        record = {col: values[i] for col, values in columns.items()}
+        if record["warning"] is None:
+            del record["warning"]
+        records.append(record)
+    return records
+
+
+def _iter_snapped_ndjson(df: pd.DataFrame, road_index, chunk_rows: int = NDJSON_CHUNK_ROWS):
+    """
+    Snap a normalized damaged-roads frame chunk by chunk and yield the results as
+    newline-delimited JSON, one record per line, shaped like the JSON response's results.
+    """
+    for start in range(0, len(df), chunk_rows):
+        snapped = snap_damaged_roads_frame(df.iloc[start:start + chunk_rows], road_index, SNAP_TOLERANCE)
+        yield "".join(json.dumps(record) + "\n" for record in _snapped_frame_to_records(snapped))
+
+
+def _ingest_damaged_roads_chunked(csv_file, road_index, chunk_rows: int) -> Tuple[str, int, int]:
+    """
+    Snap a damaged-roads CSV chunk by chunk and append each chunk to the on-disk store.
+    Only one chunk is held in memory at a time, regardless of the file size.
+    
+    Args:
+        csv_file: Binary file object positioned at the start of the CSV
+        road_index: RoadSegmentIndex of the loaded road network
+        chunk_rows: Number of CSV rows to read and snap per chunk
+    
+    Returns:
+        Tuple of (store_path, total_points, snapped_points)
+    """
+    os.makedirs(DAMAGED_ROADS_STORE_DIR, exist_ok=True)
+    fd, partial_path = tempfile.mkstemp(suffix=".csv.part", dir=DAMAGED_ROADS_STORE_DIR)
+    os.close(fd)
+    
+    total_points = 0
+    snapped_points = 0
+    try:
+        for chunk_number, chunk in enumerate(pd.read_csv(csv_file, chunksize=chunk_rows)):
+            chunk = _normalize_damaged_roads_columns(chunk)
+            snapped = snap_damaged_roads_frame(chunk, road_index, SNAP_TOLERANCE)
+            snapped["evidence_image_url"] = chunk["EvidenceImageUrl"].to_numpy()
+            snapped.to_csv(partial_path, mode="a", header=(chunk_number == 0), index=False)
             
-            # Add edges (road segments)
-            for i in range(len(coords) - 1):
-                start_node = (round(coords[i][0], 6), round(coords[i][1], 6))
-                end_node = (round(coords[i+1][0], 6), round(coords[i+1][1], 6))
-                
-                # Calculate edge weight (distance in degrees, can be converted to meters)
-                edge_length = Point(coords[i]).distance(Point(coords[i+1]))
-                
-                # Add edge with attributes
-                edge_attrs = {
-                    'length': edge_length,
-                    'segment_id': idx,
-                    'geometry': LineString([coords[i], coords[i+1]])
-                }
-                
-                # Add both directions for undirected roads (or just one for directed)
-                G.add_edge(start_node, end_node, **edge_attrs)
-                # Uncomment below if roads are bidirectional
-                # G.add_edge(end_node, start_node, **edge_attrs)
-    
-    return G
+            total_points += len(snapped)
+            snapped_points += int(snapped["warning"].isna().sum())
+        
+        # Publish the completed store atomically so readers never see a partial file
+        store_path = os.path.join(DAMAGED_ROADS_STORE_DIR, "damaged_roads_snapped.csv")
+        os.replace(partial_path, store_path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    
+    return store_path, total_points, snapped_points
+
+
+def _read_damaged_roads_store_bbox(store_path: str, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> pd.DataFrame:
+    """Scan the on-disk damaged-roads store in chunks, keeping only rows inside the bounding box."""
+    matches = []
+    for chunk in pd.read_csv(store_path, chunksize=DAMAGED_ROADS_CHUNK_ROWS):
+        chunk = chunk.rename(columns={
+            "original_lat": "Lat",
+            "original_lon": "Lon",
+            "severity": "Severity",
+            "evidence_image_url": "EvidenceImageUrl",
+        })
+        matches.append(chunk[
+            (chunk['Lat'] >= lat_min) & (chunk['Lat'] <= lat_max) &
+            (chunk['Lon'] >= lon_min) & (chunk['Lon'] <= lon_max)
+        ])
+    if not matches:
+        return pd.DataFrame(columns=["Lat", "Lon", "Severity", "EvidenceImageUrl"])
+    return pd.concat(matches, ignore_index=True)
+
+
+def _build_road_network(contents: bytes, edge_geometry: bool, contraction_hierarchy: bool,
+                        networkx_graph: bool) -> tuple:
+    """
+    Parse an uploaded GeoJSON road network and build what routing needs from it.
+    Runs in the threadpool: every step is CPU-bound on large networks.
+    
+    Returns:
+        Tuple of (GeoDataFrame, CSRRoadGraph, RoadSegmentIndex, NetworkX graph or None,
+        ContractionHierarchy or None)
+    """
+    road_network = gpd.read_file(io.BytesIO(contents))
+    
+    # Validate that geometries are LineStrings
+    if not all(isinstance(geom, LineString) for geom in road_network.geometry):
+        raise HTTPException(
+            status_code=400,
+            detail="Road network must contain LineString geometries"
+        )
+    
+    # Segment ids on graph edges and snapped points must be RoadNetwork.id, the key of traffic readings
+    road_network.index = road_network_ids(road_network)
+    
+    # Routing graph and the spatial index used for snapping
+    csr = CSRRoadGraph.from_road_network(road_network)
+    index = RoadSegmentIndex(road_network)
+    graph = initialize_networkx_graph(road_network, include_geometry=edge_geometry) if networkx_graph else None
+    ch = ContractionHierarchy.load_or_build(csr, ROUTING_CH_CACHE_DIR) if contraction_hierarchy else None
+    return road_network, csr, index, graph, ch
 
 
 @app.post("/upload-road-network")
-async def upload_road_network(file: UploadFile = File(...), user=Depends(require_role("admin"))):
+async def upload_road_network(
+    file: UploadFile = File(...),
+    edge_geometry: bool = True,
+    contraction_hierarchy: bool = False,
+    networkx_graph: bool = False,
+    user=Depends(require_role("admin"))
+):
     """
     Upload and load a GeoJSON road network file.
-    This initializes the road network GeoDataFrame and NetworkX graph.
+    This initializes the road network GeoDataFrame and the compact CSR graph all routing runs on.
+    Pass contraction_hierarchy=true to also build (or reuse from disk) a contraction
+    hierarchy that answers shortest-path queries without searching the full graph.
+    Pass networkx_graph=true to also keep a NetworkX graph of the network
+    (road_network_graph) for ad-hoc analysis; it costs far more memory per edge
+    and routing does not use it. edge_geometry=false leaves per-edge LineStrings out of it.
+    Segments are identified by RoadNetwork.id, read from a road_segment_id
+    property (when it names an existing road) or matched by name against the
+    road_network table, so traffic speeds and snapped points refer to the same roads.
     """
-    global road_network_gdf, road_network_graph
+    global road_network_gdf, road_network_graph, road_network_index, road_network_csr, road_network_ch
     
     if not _GEO_DEPS_AVAILABLE:
         raise HTTPException(status_code=503, detail="Geo libraries not installed. Install geopandas, shapely, networkx.")
@@ -270,25 +481,27 @@ async def upload_road_network(file: UploadFile = File(...), user=Depends(require
         raise HTTPException(status_code=400, detail="File must be a GeoJSON file")
     
     try:
-        # Read the uploaded file
         contents = await file.read()
-        road_network_gdf = gpd.read_file(io.BytesIO(contents))
-        
-        # Validate that geometries are LineStrings
-        if not all(isinstance(geom, LineString) for geom in road_network_gdf.geometry):
-            raise HTTPException(
-                status_code=400,
-                detail="Road network must contain LineString geometries"
+        # Parsing and the graph/index builds are CPU-bound; keep them off the event loop
+        road_network_gdf, road_network_csr, road_network_index, road_network_graph, road_network_ch = (
+            await run_in_threadpool(
+                _build_road_network, contents, edge_geometry, contraction_hierarchy, networkx_graph
             )
+        )
         
-        # Initialize NetworkX graph
-        road_network_graph = initialize_networkx_graph(road_network_gdf)
+        # Offline routing backend for get_diversion_routes (used when Mapbox is not configured)
+        import mapbox_service
+        mapbox_service.set_local_router(
+            LocalRouter(road_network_csr, speed_loader=load_segment_speeds)
+        )
         
         return {
             "message": "Road network loaded successfully",
             "num_segments": len(road_network_gdf),
-            "num_nodes": road_network_graph.number_of_nodes(),
-            "num_edges": road_network_graph.number_of_edges()
+            "num_nodes": road_network_csr.num_nodes,
+            "num_edges": road_network_csr.num_edges,
+            "contraction_hierarchy": road_network_ch is not None,
+            "networkx_graph": road_network_graph is not None
         }
     
     except Exception as e:
@@ -296,13 +509,23 @@ async def upload_road_network(file: UploadFile = File(...), user=Depends(require
 
 
 @app.post("/ingest-damaged-roads")
-async def ingest_damaged_roads(file: UploadFile = File(...), user=Depends(require_role("admin"))):
+async def ingest_damaged_roads(
+    file: UploadFile = File(...),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    stream: bool = False,
+    chunksize: int = Query(DAMAGED_ROADS_CHUNK_ROWS, ge=1),
+    user=Depends(require_role("admin"))
+):
     """
     Ingest a CSV file containing damaged roads data (Lat, Lon, Severity).
     Snaps each GPS point to the nearest road segment in the loaded network.
+    Use format=ndjson to stream one snapped point per line for very large uploads.
+    Use stream=true to read the upload in chunks of `chunksize` rows and append
+    the snapped results to an on-disk store, keeping peak memory bounded; only a
+    summary is returned, so it cannot be combined with format=ndjson.
     Admin-only endpoint.
     """
-    global road_network_gdf
+    global road_network_gdf, road_network_index, damaged_roads_df, damaged_roads_store_path
 
     if not _GEO_DEPS_AVAILABLE:
         raise HTTPException(status_code=503, detail="Geo libraries not installed. Install geopandas, shapely, networkx.")
@@ -316,78 +539,55 @@ async def ingest_damaged_roads(file: UploadFile = File(...), user=Depends(requir
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="File must be a CSV file")
     
+    if stream and format != "json":
+        raise HTTPException(
+            status_code=400,
+            detail="stream=true stores the snapped results and returns a summary; it cannot be combined with format=ndjson"
+        )
+    
     try:
-        # Read CSV file
-        contents = await file.read()
-        df = pd.read_csv(io.BytesIO(contents))
+        if road_network_index is None:
+            road_network_index = RoadSegmentIndex(road_network_gdf)
         
-        # Store the original dataframe for evidence image retrieval
-        damaged_roads_df = df.copy()
+        if stream:
+            # The upload is already spooled to disk by Starlette; read it back in chunks
+            await file.seek(0)
+            store_path, total_points, snapped_points = await run_in_threadpool(
+                _ingest_damaged_roads_chunked, file.file, road_network_index, chunksize
+            )
+            damaged_roads_df = None
+            damaged_roads_store_path = store_path
+            return {
+                "message": f"Processed {total_points} damaged road points",
+                "successfully_snapped": snapped_points,
+                "outside_tolerance": total_points - snapped_points,
+                "results_stored": True
+            }
         
-        # Normalize column names (handle both 'Lat'/'Latitude' and 'Lon'/'Longitude')
-        if 'Latitude' in df.columns:
-            df['Lat'] = df['Latitude']
-        if 'Longitude' in df.columns:
-            df['Lon'] = df['Longitude']
-        if 'Image_URL' in df.columns:
-            df['EvidenceImageUrl'] = df['Image_URL']
-        elif 'EvidenceImageUrl' not in df.columns:
-            df['EvidenceImageUrl'] = None
+        # Read CSV file off the event loop
+        df = await run_in_threadpool(lambda: _normalize_damaged_roads_columns(pd.read_csv(file.file)))
         
-        # Validate required columns
-        required_columns = ['Lat', 'Lon', 'Severity']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            raise HTTPException(
-                status_code=400,
-                detail=f"CSV must contain columns: {required_columns}. Missing: {missing_columns}"
-            )
+        # Store the dataframe for evidence image retrieval
+        damaged_roads_df = df
+        damaged_roads_store_path = None
         
-        # Process each damaged road point
-        snapped_results = []
-        for _, row in df.iterrows():
-            lat = float(row['Lat'])
-            lon = float(row['Lon'])
-            severity = str(row['Severity'])
-            
-            # Create Point geometry (note: shapely uses lon, lat order)
-            point = Point(lon, lat)
-            
-            # Snap to nearest road segment
-            snapped_point, distance, segment_id = snap_point_to_linestring(
-                point, road_network_gdf, SNAP_TOLERANCE
-            )
-            
-            if snapped_point:
-                snapped_results.append({
-                    "original_lat": lat,
-                    "original_lon": lon,
-                    "snapped_lat": snapped_point.y,
-                    "snapped_lon": snapped_point.x,
-                    "severity": severity,
-                    "distance": distance,
-                    "road_segment_id": int(segment_id) if segment_id is not None else None
-                })
-            else:
-                # Point is outside tolerance
-                snapped_results.append({
-                    "original_lat": lat,
-                    "original_lon": lon,
-                    "snapped_lat": None,
-                    "snapped_lon": None,
-                    "severity": severity,
-                    "distance": distance,
-                    "road_segment_id": None,
-                    "warning": f"Point is {distance:.6f} degrees away from nearest road (tolerance: {SNAP_TOLERANCE})"
-                })
+        if format == "ndjson":
+            # Snapped chunk by chunk while the response is written
+            return StreamingResponse(_iter_snapped_ndjson(df, road_network_index), media_type="application/x-ndjson")
+        
+        # Snap all damaged road points in one bulk nearest-segment query
+        snapped = await run_in_threadpool(snap_damaged_roads_frame, df, road_network_index, SNAP_TOLERANCE)
         
+        num_snapped = int(snapped["warning"].isna().sum())
         return {
             "message": f"Processed {len(df)} damaged road points",
-            "successfully_snapped": sum(1 for r in snapped_results if r.get("snapped_lat") is not None),
-            "outside_tolerance": sum(1 for r in snapped_results if r.get("snapped_lat") is None),
-            "results": snapped_results
+            "successfully_snapped": num_snapped,
+            "outside_tolerance": len(snapped) - num_snapped,
+            "results": _snapped_frame_to_records(snapped)
         }
     
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing damaged roads CSV: {str(e)}")
 
@@ -395,7 +595,7 @@ async def ingest_damaged_roads(file: UploadFile = File(...), user=Depends(requir
 @app.get("/road-network-status")
 async def get_road_network_status():
     """Get the status of the loaded road network and graph."""
-    global road_network_gdf, road_network_graph
+    global road_network_gdf, road_network_graph, road_network_csr, road_network_ch
     
     if road_network_gdf is None:
         return {
@@ -405,10 +605,14 @@ async def get_road_network_status():
     
     return {
         "road_network_loaded": True,
-        "graph_initialized": road_network_graph is not None,
+        "graph_initialized": road_network_csr is not None,
         "num_segments": len(road_network_gdf),
-        "num_nodes": road_network_graph.number_of_nodes() if road_network_graph else 0,
-        "num_edges": road_network_graph.number_of_edges() if road_network_graph else 0
+        "num_nodes": road_network_csr.num_nodes if road_network_csr is not None else 0,
+        "num_edges": road_network_csr.num_edges if road_network_csr is not None else 0,
+        "csr_graph_bytes": road_network_csr.nbytes if road_network_csr is not None else 0,
+        "networkx_graph": road_network_graph is not None,
+        "contraction_hierarchy": road_network_ch is not None,
+        "contraction_shortcuts": road_network_ch.num_shortcuts if road_network_ch is not None else 0
     }
 
 
@@ -430,34 +634,40 @@ async def get_cluster_evidence_images(
     Returns:
         List of evidence images with metadata
     """
-    global damaged_roads_df
+    global damaged_roads_df, damaged_roads_store_path
     
-    if damaged_roads_df is None:
+    if damaged_roads_df is None and damaged_roads_store_path is None:
         raise HTTPException(
             status_code=400,
             detail="No damaged roads data loaded. Please upload a CSV file first."
         )
     
     try:
-        # Normalize column names
-        df = damaged_roads_df.copy()
-        if 'Latitude' in df.columns:
-            df['Lat'] = df['Latitude']
-        if 'Longitude' in df.columns:
-            df['Lon'] = df['Longitude']
-        if 'Image_URL' in df.columns:
-            df['EvidenceImageUrl'] = df['Image_URL']
-        
         # Filter points within radius
         lat_min = lat - radius_degrees
         lat_max = lat + radius_degrees
         lon_min = lon - radius_degrees
         lon_max = lon + radius_degrees
         
-        nearby_points = df[
-            (df['Lat'] >= lat_min) & (df['Lat'] <= lat_max) &
-            (df['Lon'] >= lon_min) & (df['Lon'] <= lon_max)
-        ].copy()
+        if damaged_roads_df is not None:
+            # Normalize column names
+            df = damaged_roads_df.copy()
+            if 'Latitude' in df.columns:
+                df['Lat'] = df['Latitude']
+            if 'Longitude' in df.columns:
+                df['Lon'] = df['Longitude']
+            if 'Image_URL' in df.columns:
+                df['EvidenceImageUrl'] = df['Image_URL']
+            
+            nearby_points = df[
+                (df['Lat'] >= lat_min) & (df['Lat'] <= lat_max) &
+                (df['Lon'] >= lon_min) & (df['Lon'] <= lon_max)
+            ].copy()
+        else:
+            # Streamed uploads live on disk; scan them chunk by chunk
+            nearby_points = _read_damaged_roads_store_bbox(
+                damaged_roads_store_path, lat_min, lat_max, lon_min, lon_max
+            )
         
         # Calculate distance for each point (simple Euclidean for filtering)
         nearby_points['distance'] = (
@@ -11,11 +11,23 @@ Security Notes:
 """
 
 import os
+import re
+import time
+import email.utils
+import random
+import asyncio
+import queue
+import sqlite3
+import tempfile
+import threading
 import httpx
 import logging
-from typing import List, Dict, Tuple, Optional, Any
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional, Any, Hashable, Callable, Awaitable
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 import json
+from zone_avoidance import AvoidanceZones
 
 # Configure logging for audit trail
 logger = logging.getLogger("mapbox_service")
@@ -46,6 +58,652 @@ ROUTING_PROFILES = {
 # Timeout settings (prevent hanging requests)
 REQUEST_TIMEOUT = 30.0
 
+# Connection pool shared by every Mapbox call (one TCP+TLS handshake per kept-alive connection)
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("MAPBOX_MAX_CONNECTIONS", "50")),
+    max_keepalive_connections=int(os.getenv("MAPBOX_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("MAPBOX_KEEPALIVE_EXPIRY", "30")),
+)
+
+# HTTP/2 needs the optional 'h2' package (httpx[http2]); fall back to HTTP/1.1 without it
+try:
+    import h2  # type: ignore  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+# =====================================================
+# SHARED HTTP CLIENT
+# =====================================================
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+async def start_http_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """
+    Create the application-scoped client used for all Mapbox calls.
+    Called on app startup; pass a transport (e.g. httpx.MockTransport) to
+    point the client at a local stand-in instead of api.mapbox.com.
+    """
+    global _http_client
+    await close_http_client()
+    http2 = _HTTP2_AVAILABLE and transport is None
+    _http_client = httpx.AsyncClient(
+        timeout=REQUEST_TIMEOUT,
+        limits=HTTP_POOL_LIMITS,
+        http2=http2,
+        transport=transport,
+    )
+    logger.info(f"Mapbox HTTP client started (http2={'yes' if http2 else 'no'})")
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared client and its pooled connections (app shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        client, _http_client = _http_client, None
+        await client.aclose()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled client; created on first use if startup has not run (scripts, tests)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=HTTP_POOL_LIMITS, http2=_HTTP2_AVAILABLE)
+    return _http_client
+
+
+# =====================================================
+# RESPONSE CACHE
+# =====================================================
+
+# Directions cache: coordinates are snapped to this grid (degrees) before keying
+DIRECTIONS_CACHE_GRID_DEG = float(os.getenv("MAPBOX_DIRECTIONS_CACHE_GRID_DEG", "0.0005"))
+DIRECTIONS_CACHE_MAX_ENTRIES = int(os.getenv("MAPBOX_DIRECTIONS_CACHE_MAX_ENTRIES", "1024"))
+
+# Seconds a cached Directions result stays valid, per routing profile
+DIRECTIONS_CACHE_TTL = {
+    "driving-traffic": float(os.getenv("MAPBOX_DIRECTIONS_TTL_TRAFFIC", "120")),  # live traffic goes stale fast
+    "driving": float(os.getenv("MAPBOX_DIRECTIONS_TTL_DRIVING", "86400")),
+    "walking": float(os.getenv("MAPBOX_DIRECTIONS_TTL_WALKING", "86400")),
+}
+
+
+class TTLLRUCache:
+    """
+    In-process cache with per-entry expiry and least-recently-used eviction.
+    Counts hits and misses (expired entries count as misses).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, record_stats: bool = True) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            if record_stats:
+                self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        if record_stats:
+            self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+directions_cache = TTLLRUCache(DIRECTIONS_CACHE_MAX_ENTRIES)
+
+
+def _snap_to_grid(point: Tuple[float, float], grid: float = DIRECTIONS_CACHE_GRID_DEG) -> Tuple[float, float]:
+    """Round a (lon, lat) point to the cache grid so nearby requests share an entry."""
+    if grid <= 0:
+        return (point[0], point[1])
+    return (round(round(point[0] / grid) * grid, 7), round(round(point[1] / grid) * grid, 7))
+
+
+def _copy_route_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy a cached result deep enough that callers can annotate routes without touching the cache."""
+    return {**result, "routes": [dict(route) for route in result.get("routes", [])]}
+
+
+# Geocoding cache: in-memory LRU in front of a SQLite file that survives restarts
+GEOCODE_CACHE_PATH = os.getenv(
+    "MAPBOX_GEOCODE_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "navdrishti_geocode_cache.sqlite3")
+)
+GEOCODE_CACHE_TTL = float(os.getenv("MAPBOX_GEOCODE_CACHE_TTL", str(30 * 86400)))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("MAPBOX_GEOCODE_CACHE_MAX_ENTRIES", "4096"))
+
+# Shortest cached forward query that may answer a longer one typed after it
+GEOCODE_PREFIX_MIN_CHARS = 3
+
+# Decimal places lon/lat are rounded to for reverse-geocode keys (~11 m)
+GEOCODE_REVERSE_DECIMALS = 4
+
+# Most entries the background writer stores per SQLite transaction
+GEOCODE_WRITE_BATCH = 100
+
+
+def normalize_geocode_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so equivalent queries share a key."""
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+
+class GeocodeCache:
+    """
+    Two-tier geocoding cache: a TTLLRUCache in memory backed by a SQLite table.
+
+    Forward entries are keyed by normalized query text, reverse entries by
+    rounded lon/lat. A forward query that extends a cached one (the user kept
+    typing) is answered from the shorter query's results when some of them
+    still match every typed word.
+
+    A memory miss costs one disk query for the key and all its prefixes; the
+    *_async lookups run it in a worker thread so the event loop never waits on
+    SQLite. Writes go to memory at once and to disk from a background writer
+    thread in batches (flush() waits for them).
+    """
+
+    def __init__(self, path: str, ttl: float = GEOCODE_CACHE_TTL, max_entries: int = GEOCODE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.memory = TTLLRUCache(max_entries)
+        self.disk_hits = 0
+        self.prefix_hits = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_disabled = False
+        self._lock = threading.Lock()
+        self._writes: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and not self._disk_disabled:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS geocode_cache ("
+                    " kind TEXT NOT NULL, key TEXT NOT NULL, payload TEXT NOT NULL,"
+                    " created_at REAL NOT NULL, PRIMARY KEY (kind, key))"
+                )
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Geocode disk cache unavailable, using memory only: {e}")
+                self._disk_disabled = True
+        return self._conn
+
+    def _disk_get_many(self, kind: str, keys: List[str]) -> Dict[str, Tuple[Any, float]]:
+        """Unexpired disk entries among keys, in one query, as {key: (value, remaining ttl)}."""
+        with self._lock:
+            conn = self._connection()
+            if conn is None or not keys:
+                return {}
+            try:
+                rows = conn.execute(
+                    "SELECT key, payload, created_at FROM geocode_cache"
+                    f" WHERE kind = ? AND key IN ({', '.join('?' * len(keys))})",
+                    (kind, *keys),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Geocode disk cache read failed: {e}")
+                return {}
+        now = time.time()
+        found = {}
+        for key, payload, created_at in rows:
+            remaining = self.ttl - (now - created_at)
+            if remaining > 0:
+                found[key] = (json.loads(payload), remaining)
+        return found
+
+    def _put(self, kind: str, key: str, value: Any):
+        self.memory.set((kind, key), value, self.ttl)
+        if self._disk_disabled:
+            return
+        self._writes.put((kind, key, json.dumps(value), time.time()))
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="geocode-cache-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while batch[-1] is not None and len(batch) < GEOCODE_WRITE_BATCH:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            if rows:
+                with self._lock:
+                    conn = self._connection()
+                    try:
+                        if conn is not None:
+                            conn.executemany(
+                                "INSERT OR REPLACE INTO geocode_cache (kind, key, payload, created_at)"
+                                " VALUES (?, ?, ?, ?)",
+                                rows,
+                            )
+                            conn.commit()
+                    except sqlite3.Error as e:
+                        logger.warning(f"Geocode disk cache write failed: {e}")
+            for _ in batch:
+                self._writes.task_done()
+            if batch[-1] is None:
+                return
+
+    def flush(self):
+        """Wait until every queued write has reached the disk tier."""
+        self._writes.join()
+
+    # Lookups are split in three steps so the disk step can run in a worker thread:
+    # a memory step on the caller's thread, one disk query, then a memory step again.
+
+    def _forward_from_memory(self, key: str):
+        """(exact hit or None, {prefix: results} found in memory, keys to read from disk)."""
+        exact = self.memory.get(("forward", key))
+        if exact is not None:
+            return exact, {}, []
+        found, missing = {}, [key]
+        for end in range(len(key) - 1, GEOCODE_PREFIX_MIN_CHARS - 1, -1):
+            shorter = self.memory.get(("forward", key[:end]), record_stats=False)
+            if shorter is None:
+                missing.append(key[:end])
+            else:
+                found[key[:end]] = shorter
+        return None, found, missing
+
+    def _forward_result(self, key: str, found: Dict[str, Any], disk: Dict[str, Tuple[Any, float]]):
+        for disk_key, (value, remaining) in disk.items():
+            self.memory.set(("forward", disk_key), value, remaining)
+            found[disk_key] = value
+        if key in disk:
+            self.disk_hits += 1
+            return disk[key][0]
+
+        words = key.split()
+        for end in range(len(key) - 1, GEOCODE_PREFIX_MIN_CHARS - 1, -1):
+            shorter = found.get(key[:end])
+            if not shorter:
+                continue
+            matching = [
+                r for r in shorter
+                if all(
+                    any(part.startswith(word) for part in normalize_geocode_query(r.get("place_name", "")).split())
+                    for word in words
+                )
+            ]
+            if matching:
+                self.prefix_hits += 1
+                return matching
+        return None
+
+    def get_forward(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached forward results for a query, exact or narrowed from a shorter cached query."""
+        key = normalize_geocode_query(query)
+        if not key:
+            return None
+        exact, found, missing = self._forward_from_memory(key)
+        if exact is not None:
+            return exact
+        return self._forward_result(key, found, self._disk_get_many("forward", missing))
+
+    async def get_forward_async(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        """get_forward for async handlers: the disk query runs in a worker thread."""
+        key = normalize_geocode_query(query)
+        if not key:
+            return None
+        exact, found, missing = self._forward_from_memory(key)
+        if exact is not None:
+            return exact
+        disk = await run_in_threadpool(self._disk_get_many, "forward", missing)
+        return self._forward_result(key, found, disk)
+
+    def put_forward(self, query: str, results: List[Dict[str, Any]]):
+        key = normalize_geocode_query(query)
+        if key:
+            self._put("forward", key, results)
+
+    @staticmethod
+    def _reverse_key(lon: float, lat: float) -> str:
+        return f"{round(lon, GEOCODE_REVERSE_DECIMALS)},{round(lat, GEOCODE_REVERSE_DECIMALS)}"
+
+    def _reverse_result(self, key: str, disk: Dict[str, Tuple[Any, float]]) -> Optional[Dict[str, Any]]:
+        if key not in disk:
+            return None
+        value, remaining = disk[key]
+        self.memory.set(("reverse", key), value, remaining)
+        self.disk_hits += 1
+        return value
+
+    def get_reverse(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        key = self._reverse_key(lon, lat)
+        value = self.memory.get(("reverse", key))
+        if value is not None:
+            return value
+        return self._reverse_result(key, self._disk_get_many("reverse", [key]))
+
+    async def get_reverse_async(self, lon: float, lat: float) -> Optional[Dict[str, Any]]:
+        """get_reverse for async handlers: the disk query runs in a worker thread."""
+        key = self._reverse_key(lon, lat)
+        value = self.memory.get(("reverse", key))
+        if value is not None:
+            return value
+        return self._reverse_result(key, await run_in_threadpool(self._disk_get_many, "reverse", [key]))
+
+    def put_reverse(self, lon: float, lat: float, result: Dict[str, Any]):
+        self._put("reverse", self._reverse_key(lon, lat), result)
+
+    def warm(self, limit: Optional[int] = None) -> int:
+        """Load the most recent unexpired disk entries into memory; returns how many were loaded."""
+        limit = self.memory.max_entries if limit is None else limit
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return 0
+            try:
+                rows = conn.execute(
+                    "SELECT kind, key, payload, created_at FROM geocode_cache"
+                    " WHERE created_at > ? ORDER BY created_at DESC LIMIT ?",
+                    (time.time() - self.ttl, limit),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Geocode cache warm-up failed: {e}")
+                return 0
+        now = time.time()
+        # Oldest first so the newest entries end up most recently used
+        for kind, key, payload, created_at in reversed(rows):
+            self.memory.set((kind, key), json.loads(payload), self.ttl - (now - created_at))
+        logger.info(f"Geocode cache warmed with {len(rows)} entries")
+        return len(rows)
+
+    def close(self):
+        """Write out queued entries, stop the writer thread and close the SQLite file."""
+        writer = self._writer
+        if writer is not None and writer.is_alive():
+            self._writes.put(None)
+            writer.join()
+        self._writer = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.memory.stats(), "disk_hits": self.disk_hits, "prefix_hits": self.prefix_hits}
+
+
+geocode_cache = GeocodeCache(GEOCODE_CACHE_PATH)
+
+
+# =====================================================
+# REQUEST COALESCING
+# =====================================================
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key starts the
+    upstream request and later callers await the same task instead of issuing
+    their own. The result (or exception) is shared by all of them.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.deduplicated = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.deduplicated += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded so one caller disconnecting does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers already received it
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._inflight), "deduplicated": self.deduplicated}
+
+
+directions_flight = SingleFlight()
+isochrone_flight = SingleFlight()
+
+
+# =====================================================
+# RATE LIMITING & RETRIES
+# =====================================================
+
+# Requests per minute allowed per Mapbox API (defaults are Mapbox's standard account quotas)
+MAPBOX_RATE_LIMITS = {
+    "directions": float(os.getenv("MAPBOX_DIRECTIONS_RPM", "300")),
+    "isochrone": float(os.getenv("MAPBOX_ISOCHRONE_RPM", "300")),
+    "matrix": float(os.getenv("MAPBOX_MATRIX_RPM", "60")),
+    "geocoding": float(os.getenv("MAPBOX_GEOCODING_RPM", "600")),
+}
+# Longest a caller queues for a token before being told to retry later
+RATE_LIMIT_MAX_WAIT_S = float(os.getenv("MAPBOX_RATE_LIMIT_MAX_WAIT", "10"))
+
+# Retries for idempotent GETs after 429/5xx responses or transport errors
+MAPBOX_MAX_RETRIES = int(os.getenv("MAPBOX_MAX_RETRIES", "3"))
+RETRY_BASE_DELAY_S = 0.5
+RETRY_MAX_DELAY_S = 8.0
+# Seconds one mapbox_get may spend waiting between retries; a Retry-After
+# longer than what is left returns the response instead of sleeping
+MAPBOX_RETRY_BUDGET_S = float(os.getenv("MAPBOX_RETRY_BUDGET", "20"))
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate_per_minute` requests with bursts up to `burst`.
+
+    When the bucket is empty a caller reserves the next token (the level goes
+    negative) and sleeps until it is due, so waiting callers are served in
+    arrival order without a lock.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None,
+                 max_wait: float = RATE_LIMIT_MAX_WAIT_S):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1, int(rate_per_minute // 6)))
+        self.max_wait = max_wait
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self.throttled = 0
+        self.rejected = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it (raises 429 if too long)."""
+        self._refill(time.monotonic())
+        wait = max(0.0, (1.0 - self._tokens) / self.rate)
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Map service is experiencing high traffic. Please try again in a moment.",
+                headers={"Retry-After": str(int(wait) + 1)},
+            )
+        self._tokens -= 1.0
+        if wait > 0:
+            self.throttled += 1
+        return wait
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def defer(self, seconds: float):
+        """Withhold tokens for `seconds`, e.g. after Mapbox answered with Retry-After."""
+        self._refill(time.monotonic())
+        self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rate_per_minute": self.rate * 60.0,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+
+rate_limiters: Dict[str, TokenBucket] = {api: TokenBucket(rpm) for api, rpm in MAPBOX_RATE_LIMITS.items()}
+retry_counts: Dict[str, int] = {api: 0 for api in MAPBOX_RATE_LIMITS}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(RETRY_MAX_DELAY_S, RETRY_BASE_DELAY_S * (2 ** attempt)))
+
+
+async def mapbox_get(api: str, url: str, params: Dict[str, Any], timeout: Optional[float] = None) -> httpx.Response:
+    """
+    Rate-limited GET against a Mapbox API through the shared client.
+
+    Retries up to MAPBOX_MAX_RETRIES times on 429/5xx responses, timeouts and
+    connection errors, sleeping for Retry-After when Mapbox sends one and for a
+    jittered exponential backoff otherwise. A Retry-After is honored in full:
+    the API's token bucket is held back for that long, and when it exceeds
+    what is left of MAPBOX_RETRY_BUDGET_S the response is returned at once
+    instead of retried. The last response is returned (or the last transport
+    error raised) so callers keep their own error handling.
+    """
+    limiter = rate_limiters[api]
+    client = get_http_client()
+    kwargs = {"params": params}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+
+    started = time.monotonic()
+    for attempt in range(MAPBOX_MAX_RETRIES + 1):
+        await limiter.acquire()
+        last_attempt = attempt == MAPBOX_MAX_RETRIES
+        try:
+            response = await client.get(url, **kwargs)
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            if last_attempt:
+                raise
+            delay = _backoff_delay(attempt)
+            logger.warning(f"Mapbox {api} request failed ({type(e).__name__}); retrying in {delay:.2f}s")
+        else:
+            if response.status_code not in RETRYABLE_STATUS_CODES or last_attempt:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                limiter.defer(retry_after)
+                remaining = MAPBOX_RETRY_BUDGET_S - (time.monotonic() - started)
+                if retry_after > remaining:
+                    logger.warning(
+                        f"Mapbox {api} returned {response.status_code} with Retry-After {retry_after:.0f}s;"
+                        f" more than the {max(remaining, 0.0):.1f}s retry budget left, not retrying"
+                    )
+                    return response
+                delay = retry_after
+            else:
+                delay = _backoff_delay(attempt)
+            logger.warning(f"Mapbox {api} returned {response.status_code}; retrying in {delay:.2f}s")
+        retry_counts[api] += 1
+        await asyncio.sleep(delay)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the Mapbox response caches, request coalescing and rate limiting."""
+    return {
+        "directions": directions_cache.stats(),
+        "geocoding": geocode_cache.stats(),
+        "coalesced": {"directions": directions_flight.stats(), "isochrone": isochrone_flight.stats()},
+        "rate_limits": {
+            api: {**limiter.stats(), "retries": retry_counts[api]} for api, limiter in rate_limiters.items()
+        },
+    }
+
+
+# =====================================================
+# LOCAL ROUTING BACKEND
+# =====================================================
+
+# "mapbox": always call Mapbox; "local": always route on the in-process graph;
+# "auto": Mapbox when a token is configured, otherwise the local graph if one is loaded
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "auto").lower()
+
+_local_router = None
+
+
+def set_local_router(router):
+    """Register the offline router (local_routing.LocalRouter) for the current road network."""
+    global _local_router
+    _local_router = router
+
+
+def get_local_router():
+    return _local_router
+
+
+def _use_local_router(token: Optional[str]) -> bool:
+    if ROUTING_BACKEND == "mapbox":
+        return False
+    if ROUTING_BACKEND == "local":
+        return True
+    return not token and _local_router is not None
+
+
 # =====================================================
 # ERROR HANDLING UTILITIES
 # =====================================================
@@ -78,7 +736,8 @@ async def get_diversion_routes(
     avoid_polygon: Optional[Dict[str, Any]] = None,
     alternatives: int = 3,
     profile: str = "driving-traffic",
-    include_streets: bool = True
+    include_streets: bool = True,
+    avoid_zones: Optional[AvoidanceZones] = None
 ) -> Dict[str, Any]:
     """
     Calculate alternative routes with street-level precision and traffic awareness.
@@ -88,6 +747,7 @@ async def get_diversion_routes(
         origin: (longitude, latitude) tuple for start point
         destination: (longitude, latitude) tuple for end point
         avoid_polygon: GeoJSON polygon representing construction zone to avoid
+        avoid_zones: Prebuilt AvoidanceZones (e.g. all active construction zones); used instead of avoid_polygon
         alternatives: Number of alternative routes to request (max 3 for Mapbox)
         profile: Routing profile ("driving-traffic", "driving", "walking")
         include_streets: If True, include local streets in routing (not just highways)
@@ -107,7 +767,10 @@ async def get_diversion_routes(
     
     # Check if token is available
     token = MAPBOX_ACCESS_TOKEN or os.getenv("MAPBOX_ACCESS_TOKEN")
-    if not token:
+    use_local = _use_local_router(token)
+    if use_local and _local_router is None:
+        raise HTTPException(status_code=503, detail="Local routing needs a road network. Upload one first.")
+    if not token and not use_local:
         logger.error("MAPBOX_ACCESS_TOKEN is not available for routing")
         raise HTTPException(status_code=503, detail="Mapbox service not configured. Please set MAPBOX_ACCESS_TOKEN.")
     
@@ -122,12 +785,31 @@ async def get_diversion_routes(
     
     # Select routing profile
     profile = profile if profile in ROUTING_PROFILES else "driving-traffic"
+    
+    if avoid_zones is None and avoid_polygon:
+        avoid_zones = AvoidanceZones.from_geojson([avoid_polygon])
+    if avoid_zones is not None and len(avoid_zones) == 0:
+        avoid_zones = None
+    
+    if use_local:
+        logger.info("Routing on the local road graph")
+        return await run_in_threadpool(_local_router.route, origin, destination, alternatives, profile, avoid_zones)
+    
+    # Mapbox cannot exclude a polygon, so ask for every alternative and drop the ones entering a zone
+    requested = max(alternatives, 3) if avoid_zones is not None else alternatives
     directions_endpoint = f"{BASE_DIRECTIONS_ENDPOINT}/{ROUTING_PROFILES[profile]}"
     
+    # Serve repeated origin/destination pairs from the cache
+    cache_key = (_snap_to_grid(origin), _snap_to_grid(destination), profile, requested, include_streets)
+    cached = directions_cache.get(cache_key)
+    if cached is not None:
+        logger.info("Diversion routes served from cache")
+        return await _avoid_zones(_copy_route_result(cached), avoid_zones, origin, destination, alternatives, profile)
+    
     # Build query parameters for street-level precision
     params = {
         "access_token": token,
-        "alternatives": "true" if alternatives > 1 else "false",
+        "alternatives": "true" if requested > 1 else "false",
         "geometries": "geojson",  # Return GeoJSON LineString
         "steps": "true",  # Include turn-by-turn instructions for street accuracy
         "banner_instructions": "true",  # Include banner (signage) instructions
@@ -140,24 +822,18 @@ async def get_diversion_routes(
     # Add roundabout information for navigation precision
     params["roundabout_exits"] = "true"
     
-    # Add avoidance polygon if provided
-    # Note: Mapbox Directions API doesn't directly support polygon avoidance
-    # We'll use this in post-processing or recommend Matrix API for complex avoidance
-    if avoid_polygon:
-        logger.info("Avoidance polygon provided - will filter routes post-request")
-    
     # Use selected profile endpoint
     url = f"{directions_endpoint}/{coordinates}"
     
-    try:
-        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-            response = await client.get(url, params=params)
-            
+    async def fetch():
+        try:
+            response = await mapbox_get("directions", url, params)
+        
             if response.status_code != 200:
                 handle_mapbox_error(response.status_code, response.text)
-            
+        
             data = response.json()
-            
+        
             # Parse and structure the response for NavDrishti frontend with street-level details
             routes = []
             for idx, route in enumerate(data.get("routes", [])):
@@ -167,24 +843,24 @@ async def get_diversion_routes(
                     "road_classes": set(),
                     "instructions": []
                 }
-                
+            
                 for leg in route.get("legs", []):
                     for step in leg.get("steps", []):
                         # Count turns for routing complexity
                         if step.get("maneuver", {}).get("type"):
                             street_info["turn_count"] += 1
-                        
+                    
                         # Collect road classes (local road, secondary, tertiary, etc.)
                         if step.get("roads"):
                             for road in step.get("roads", []):
                                 if isinstance(road, dict) and "class" in road:
                                     street_info["road_classes"].add(road["class"])
-                        
+                    
                         # Extract turn-by-turn instructions for street navigation
                         instruction = step.get("maneuver", {}).get("instruction")
                         if instruction:
                             street_info["instructions"].append(instruction)
-                
+            
                 parsed_route = {
                     "id": f"route-{idx + 1}",
                     "duration_seconds": route.get("duration", 0),
@@ -201,21 +877,58 @@ async def get_diversion_routes(
                     "profile": profile,
                 }
                 routes.append(parsed_route)
-            
+        
             logger.info(f"Successfully retrieved {len(routes)} diversion routes")
-            
-            return {
+        
+            result = {
                 "success": True,
                 "routes": routes,
                 "waypoints": data.get("waypoints", []),
             }
-            
-    except httpx.TimeoutException:
-        logger.error("Mapbox Directions API timeout")
-        raise HTTPException(status_code=504, detail="Map service timeout. Please try again.")
-    except httpx.RequestError as e:
-        logger.error(f"Network error calling Mapbox: {str(e)}")
-        raise HTTPException(status_code=503, detail="Unable to reach map service. Check network connectivity.")
+            directions_cache.set(cache_key, result, DIRECTIONS_CACHE_TTL.get(profile, 0))
+            return result
+        
+        except httpx.TimeoutException:
+            logger.error("Mapbox Directions API timeout")
+            raise HTTPException(status_code=504, detail="Map service timeout. Please try again.")
+        except httpx.RequestError as e:
+            logger.error(f"Network error calling Mapbox: {str(e)}")
+            raise HTTPException(status_code=503, detail="Unable to reach map service. Check network connectivity.")
+    
+    # Identical concurrent requests share one upstream call
+    result = await directions_flight.do(cache_key, fetch)
+    return await _avoid_zones(_copy_route_result(result), avoid_zones, origin, destination, alternatives, profile)
+
+
+async def _avoid_zones(
+    result: Dict[str, Any],
+    avoid_zones: Optional[AvoidanceZones],
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    alternatives: int,
+    profile: str
+) -> Dict[str, Any]:
+    """
+    Drop Mapbox routes that enter an avoidance zone. If none is left, fall back to
+    the local router (which masks zone edges before searching) when one is loaded.
+    """
+    if avoid_zones is None:
+        return result
+    
+    clear, excluded = avoid_zones.filter_routes(result["routes"])
+    if excluded:
+        logger.info(f"Excluded {excluded} of {len(result['routes'])} routes entering construction zones")
+    if not clear:
+        if _local_router is not None:
+            logger.info("No Mapbox route avoids the zones; routing on the local road graph")
+            return await run_in_threadpool(
+                _local_router.route, origin, destination, alternatives, profile, avoid_zones
+            )
+        raise HTTPException(status_code=404, detail="No route found that avoids the construction zone.")
+    
+    result["routes"] = clear[:max(1, alternatives)]
+    result["avoidance"] = {"zones": len(avoid_zones), "excluded_routes": excluded}
+    return result
 
 
 async def calculate_impact_isochrone(
@@ -266,32 +979,38 @@ async def calculate_impact_isochrone(
         "denoise": "1.0",  # Smooth polygons for cleaner visualization
     }
     
-    try:
-        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-            response = await client.get(url, params=params)
-            
+    async def fetch():
+        try:
+            response = await mapbox_get("isochrone", url, params)
+        
             if response.status_code != 200:
                 handle_mapbox_error(response.status_code, response.text)
-            
+        
             data = response.json()
-            
+        
             # Mapbox returns a FeatureCollection with Polygon features
             # Each feature has a 'contour' property indicating the time interval
             logger.info(f"Successfully retrieved {len(data.get('features', []))} isochrone polygons")
-            
-            return {
-                "success": True,
-                "isochrones": data,  # GeoJSON FeatureCollection
-                "center": center_point,
-                "intervals_minutes": time_intervals,
-            }
-            
-    except httpx.TimeoutException:
-        logger.error("Mapbox Isochrone API timeout")
-        raise HTTPException(status_code=504, detail="Isochrone calculation timeout. Try fewer intervals.")
-    except httpx.RequestError as e:
-        logger.error(f"Network error calling Mapbox: {str(e)}")
-        raise HTTPException(status_code=503, detail="Unable to reach map service.")
+        
+            return data
+        
+        except httpx.TimeoutException:
+            logger.error("Mapbox Isochrone API timeout")
+            raise HTTPException(status_code=504, detail="Isochrone calculation timeout. Try fewer intervals.")
+        except httpx.RequestError as e:
+            logger.error(f"Network error calling Mapbox: {str(e)}")
+            raise HTTPException(status_code=503, detail="Unable to reach map service.")
+    
+    # Identical concurrent requests share one upstream call
+    flight_key = (round(center_point[0], 6), round(center_point[1], 6), contours_minutes)
+    data = await isochrone_flight.do(flight_key, fetch)
+    
+    return {
+        "success": True,
+        "isochrones": data,  # GeoJSON FeatureCollection
+        "center": center_point,
+        "intervals_minutes": time_intervals,
+    }
 
 
 async def get_traffic_matrix(
@@ -348,28 +1067,27 @@ async def get_traffic_matrix(
     }
     
     try:
-        async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT) as client:
-            response = await client.get(url, params=params)
-            
-            if response.status_code != 200:
-                handle_mapbox_error(response.status_code, response.text)
-            
-            data = response.json()
-            
-            # Parse matrix results
-            # data["durations"] is a 2D array: durations[origin_index][destination_index]
-            # data["distances"] is a 2D array: distances[origin_index][destination_index]
-            
-            logger.info(f"Successfully calculated traffic matrix")
-            
-            return {
-                "success": True,
-                "durations_seconds": data.get("durations", []),
-                "distances_meters": data.get("distances", []),
-                "sources": data.get("sources", []),
-                "destinations": data.get("destinations", []),
-            }
-            
+        response = await mapbox_get("matrix", url, params)
+        
+        if response.status_code != 200:
+            handle_mapbox_error(response.status_code, response.text)
+        
+        data = response.json()
+        
+        # Parse matrix results
+        # data["durations"] is a 2D array: durations[origin_index][destination_index]
+        # data["distances"] is a 2D array: distances[origin_index][destination_index]
+        
+        logger.info(f"Successfully calculated traffic matrix")
+        
+        return {
+            "success": True,
+            "durations_seconds": data.get("durations", []),
+            "distances_meters": data.get("distances", []),
+            "sources": data.get("sources", []),
+            "destinations": data.get("destinations", []),
+        }
+        
     except httpx.TimeoutException:
         logger.error("Mapbox Matrix API timeout")
         raise HTTPException(status_code=504, detail="Matrix calculation timeout. Reduce number of points.")
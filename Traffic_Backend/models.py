@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Enum as SQLEnum, CheckConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, JSON, Enum as SQLEnum, CheckConstraint, Index, PrimaryKeyConstraint
+from sqlalchemy import and_, case, event, func, inspect, or_, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.orm import relationship, declared_attr
+from datetime import datetime, timedelta
 import enum
+import uuid
 
 Base = declarative_base()
 
@@ -65,14 +68,28 @@ class Project(Base):
     road_segment_id = Column(Integer, ForeignKey('road_network.id'))
     road_segment = relationship('RoadNetwork')
 
+def new_geometry_version() -> str:
+    return uuid.uuid4().hex
+
+
 class RoadNetwork(Base):
     __tablename__ = 'road_network'
     id = Column(Integer, primary_key=True)
     name = Column(String(128))
     geometry = Column(Text)  # WKT or GeoJSON
+    # Changes whenever geometry does; readers compare it instead of the geometry text
+    geometry_version = Column(String(32), default=new_geometry_version)
     base_capacity = Column(Integer)
     roughness_index = Column(Float)
 
+
+@event.listens_for(RoadNetwork, 'before_update')
+def _bump_geometry_version(mapper, connection, target):
+    # ORM updates only; Core updates of geometry must set geometry_version themselves
+    if inspect(target).attrs.geometry.history.has_changes():
+        target.geometry_version = new_geometry_version()
+
+
 class TrafficDynamics(Base):
     __tablename__ = 'traffic_dynamics'
     id = Column(Integer, primary_key=True)
@@ -84,6 +101,225 @@ class TrafficDynamics(Base):
     average_speed = Column(Float)
     road_segment = relationship('RoadNetwork')
 
+    # Readers filter on a segment plus a time range, or on a time range alone
+    __table_args__ = (
+        Index('ix_traffic_dynamics_segment_timestamp', 'road_segment_id', 'timestamp'),
+        Index('ix_traffic_dynamics_timestamp', 'timestamp'),
+    )
+
+
+class TrafficLatest(Base):
+    """Newest TrafficDynamics reading of each road segment, upserted on every insert"""
+    __tablename__ = 'traffic_latest'
+    road_segment_id = Column(Integer, ForeignKey('road_network.id'), primary_key=True)
+    traffic_dynamics_id = Column(Integer, ForeignKey('traffic_dynamics.id'))
+    timestamp = Column(DateTime)
+    flow_entropy = Column(Float)
+    congestion_state = Column(String(32))
+    vehicle_count = Column(Integer)
+    average_speed = Column(Float)
+    road_segment = relationship('RoadNetwork')
+
+
+_LATEST_READING_COLUMNS = ('timestamp', 'flow_entropy', 'congestion_state', 'vehicle_count', 'average_speed')
+
+
+def _dialect_insert(connection, table):
+    """INSERT construct with the dialect's upsert clause, or None when the dialect has none."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        return None
+    return insert(table)
+
+
+def _upsert(connection, table, key, values, changes, where=None):
+    """
+    Insert a row, or apply changes to the row already holding key, in one
+    atomic statement (INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE).
+
+    Args:
+        key: Primary key columns and values of the row
+        values: Other column values of a new row
+        changes: (column name, expression) pairs applied to an existing row, in order
+            (MySQL evaluates its assignments left to right)
+        where: Condition an existing row must meet to be changed
+
+    On dialects without an upsert clause the UPDATE and INSERT are separate
+    statements; an INSERT that loses a race to a concurrent one falls back to
+    the UPDATE instead of failing the transaction.
+    """
+    stmt = _dialect_insert(connection, table)
+    if stmt is not None:
+        stmt = stmt.values(**key, **values)
+        if connection.dialect.name in ('mysql', 'mariadb'):
+            if where is not None:
+                changes = [(name, case((where, expr), else_=table.c[name])) for name, expr in changes]
+            connection.execute(stmt.on_duplicate_key_update(changes))
+        else:
+            connection.execute(stmt.on_conflict_do_update(index_elements=list(key), set_=dict(changes), where=where))
+        return
+
+    row = and_(*(table.c[name] == value for name, value in key.items()))
+    update = table.update().where(row, *([where] if where is not None else [])).values(dict(changes))
+    if connection.execute(update).rowcount:
+        return
+    if connection.execute(select(*(table.c[name] for name in key)).where(row)).first() is not None:
+        # The row exists but does not meet where
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(table.insert().values(**key, **values))
+    except IntegrityError:
+        # A concurrent transaction inserted the row first
+        connection.execute(update)
+
+
+def upsert_traffic_latest(connection, reading):
+    """
+    Make a TrafficDynamics reading its segment's traffic_latest row, unless a
+    newer reading is already there (late, out-of-order observations are ignored).
+    """
+    if reading.road_segment_id is None or reading.timestamp is None:
+        return
+    latest = TrafficLatest.__table__
+    values = {name: getattr(reading, name) for name in _LATEST_READING_COLUMNS}
+    values['traffic_dynamics_id'] = reading.id
+    # timestamp last: on MySQL the where condition reads the row as earlier assignments left it
+    changes = sorted(values.items(), key=lambda item: item[0] == 'timestamp')
+    _upsert(
+        connection, latest, {'road_segment_id': reading.road_segment_id}, values, changes,
+        where=or_(latest.c.timestamp.is_(None), latest.c.timestamp <= reading.timestamp),
+    )
+
+
+@event.listens_for(TrafficDynamics, 'after_insert')
+def _track_latest_reading(mapper, connection, target):
+    # ORM inserts only; Core/bulk inserts into traffic_dynamics must call
+    # upsert_traffic_latest or rebuild_traffic_latest themselves
+    upsert_traffic_latest(connection, target)
+
+
+def rebuild_traffic_latest(connection):
+    """Refill traffic_latest from the full history (after bulk loads or for existing databases)."""
+    td = TrafficDynamics.__table__
+    newest = select(
+        td.c.road_segment_id, func.max(td.c.timestamp).label('timestamp')
+    ).group_by(td.c.road_segment_id).subquery()
+    # Highest id wins when a segment has several readings at its newest timestamp
+    picked = select(func.max(td.c.id).label('id')).join(
+        newest, and_(td.c.road_segment_id == newest.c.road_segment_id, td.c.timestamp == newest.c.timestamp)
+    ).group_by(td.c.road_segment_id).subquery()
+
+    columns = ['road_segment_id', 'traffic_dynamics_id', *_LATEST_READING_COLUMNS]
+    rows = select(td.c.road_segment_id, td.c.id, *(td.c[name] for name in _LATEST_READING_COLUMNS)).join(
+        picked, td.c.id == picked.c.id
+    )
+    connection.execute(TrafficLatest.__table__.delete())
+    connection.execute(TrafficLatest.__table__.insert().from_select(columns, rows))
+
+
+
+class TrafficRollupColumns:
+    """Per-segment aggregates of TrafficDynamics readings over fixed-width time buckets"""
+    bucket_seconds = None
+
+    @declared_attr
+    def road_segment_id(cls):
+        return Column(Integer, ForeignKey('road_network.id'), nullable=False)
+
+    bucket_start = Column(DateTime, nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    # Sums and counts over non-NULL values, so averages and variances match the raw rows
+    speed_count = Column(Integer, nullable=False, default=0)
+    speed_sum = Column(Float(precision=53), nullable=False, default=0.0)  # double precision on MySQL
+    speed_sq_sum = Column(Float(precision=53), nullable=False, default=0.0)
+    vehicle_samples = Column(Integer, nullable=False, default=0)
+    vehicle_sum = Column(Integer, nullable=False, default=0)
+    entropy_samples = Column(Integer, nullable=False, default=0)
+    entropy_sum = Column(Float(precision=53), nullable=False, default=0.0)
+
+    @declared_attr
+    def __table_args__(cls):
+        # Segment-first key for per-segment ranges, plus bucket_start for city-wide ranges
+        return (
+            PrimaryKeyConstraint('road_segment_id', 'bucket_start'),
+            Index(f'ix_{cls.__tablename__}_bucket_start', 'bucket_start'),
+        )
+
+
+class TrafficRollup1m(TrafficRollupColumns, Base):
+    __tablename__ = 'traffic_rollup_1m'
+    bucket_seconds = 60
+
+
+class TrafficRollup15m(TrafficRollupColumns, Base):
+    __tablename__ = 'traffic_rollup_15m'
+    bucket_seconds = 15 * 60
+
+
+class TrafficRollup1h(TrafficRollupColumns, Base):
+    __tablename__ = 'traffic_rollup_1h'
+    bucket_seconds = 60 * 60
+
+
+# Finest first
+TRAFFIC_ROLLUPS = (TrafficRollup1m, TrafficRollup15m, TrafficRollup1h)
+
+ROLLUP_SUM_COLUMNS = (
+    'sample_count', 'speed_count', 'speed_sum', 'speed_sq_sum',
+    'vehicle_samples', 'vehicle_sum', 'entropy_samples', 'entropy_sum',
+)
+
+
+def rollup_bucket_start(timestamp, bucket_seconds):
+    """Start of the bucket holding timestamp (buckets are aligned to midnight)."""
+    midnight = timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    offset = int((timestamp - midnight).total_seconds())
+    return midnight + timedelta(seconds=offset - offset % bucket_seconds)
+
+
+def rollup_increments(reading):
+    """What one TrafficDynamics reading adds to each of ROLLUP_SUM_COLUMNS."""
+    speed, vehicles, entropy = reading.average_speed, reading.vehicle_count, reading.flow_entropy
+    return {
+        'sample_count': 1,
+        'speed_count': int(speed is not None),
+        'speed_sum': speed or 0.0,
+        'speed_sq_sum': speed * speed if speed is not None else 0.0,
+        'vehicle_samples': int(vehicles is not None),
+        'vehicle_sum': vehicles or 0,
+        'entropy_samples': int(entropy is not None),
+        'entropy_sum': entropy or 0.0,
+    }
+
+
+def upsert_traffic_rollups(connection, reading):
+    """Add a TrafficDynamics reading to its bucket in every rollup table."""
+    if reading.road_segment_id is None or reading.timestamp is None:
+        return
+    increments = rollup_increments(reading)
+    for rollup in TRAFFIC_ROLLUPS:
+        table = rollup.__table__
+        bucket_start = rollup_bucket_start(reading.timestamp, rollup.bucket_seconds)
+        _upsert(
+            connection, table,
+            {'road_segment_id': reading.road_segment_id, 'bucket_start': bucket_start},
+            increments,
+            [(name, table.c[name] + value) for name, value in increments.items()],
+        )
+
+
+@event.listens_for(TrafficDynamics, 'after_insert')
+def _track_rollups(mapper, connection, target):
+    # ORM inserts only, like _track_latest_reading; see traffic_rollups.rebuild_traffic_rollups
+    upsert_traffic_rollups(connection, target)
+
 class DamageCluster(Base):
     __tablename__ = 'damage_clusters'
     id = Column(Integer, primary_key=True)
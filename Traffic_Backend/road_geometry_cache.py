@@ -0,0 +1,82 @@
+"""
+Process-wide cache of parsed RoadNetwork geometries.
+
+RoadNetwork.geometry is GeoJSON stored as text. The cache keeps, per segment
+id, the coordinates parsed from it, stamped with the row's geometry_version.
+Readers select only the version and fetch and parse the geometry text of the
+segments whose version no longer matches (the row was re-seeded or edited,
+possibly by another process). ORM updates and deletes in this process drop
+entries eagerly.
+"""
+
+import json
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import event
+
+import Traffic_Backend.models as models
+
+
+class CachedGeometry(NamedTuple):
+    version: str  # RoadNetwork.geometry_version the entry was parsed at
+    coordinates: List[Any]
+
+
+class RoadGeometryCache:
+    """Parsed geometries keyed by road segment id."""
+
+    def __init__(self):
+        self._entries: Dict[int, CachedGeometry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, segment_id: int, version: Optional[str]) -> Optional[CachedGeometry]:
+        """Cached geometry of a segment if it was parsed at this version, else None."""
+        entry = self._entries.get(segment_id)
+        if entry is not None and version is not None and entry.version == version:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, segment_id: int, version: Optional[str], geometry_text: str) -> CachedGeometry:
+        """
+        Parse a segment's geometry text and cache it under version.
+        Raises ValueError (json.JSONDecodeError) for malformed geometry.
+        """
+        entry = CachedGeometry(version, json.loads(geometry_text).get("coordinates", []))
+        with self._lock:
+            self._entries[segment_id] = entry
+        return entry
+
+    def invalidate(self, segment_id: Optional[int] = None):
+        """Drop one segment's entry, or every entry when segment_id is None."""
+        with self._lock:
+            if segment_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(segment_id, None)
+
+    def retain(self, segment_ids: Iterable[int]):
+        """Drop entries of segments that are no longer in the table."""
+        keep = set(segment_ids)
+        with self._lock:
+            for segment_id in [s for s in self._entries if s not in keep]:
+                del self._entries[segment_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+road_geometry_cache = RoadGeometryCache()
+
+
+@event.listens_for(models.RoadNetwork, "after_update")
+@event.listens_for(models.RoadNetwork, "after_delete")
+def _invalidate_road_geometry(mapper, connection, target):
+    road_geometry_cache.invalidate(target.id)
@@ -0,0 +1,503 @@
+"""
+Road network spatial utilities for the in-process road graph.
+
+Holds the structures built once when a road network GeoJSON is uploaded and
+reused by every request afterwards (snapping GPS points onto road segments,
+building the routing graph and its compact array-backed form).
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import networkx as nx
+import shapely
+from scipy.spatial import cKDTree
+from shapely.strtree import STRtree
+
+# Decimal places of the rounded (lon, lat) coordinates used as graph node ids
+NODE_ID_DECIMALS = 6
+
+# Mean Earth radius in meters (haversine distances)
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lon1, lat1, lon2, lat2):
+    """Great-circle distance in meters between (lon, lat) points; accepts scalars or arrays."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(a, dtype=float)) for a in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+@dataclass
+class SnapResult:
+    """
+    Columnar result of snapping many GPS points onto the road network.
+    Index i of every array refers to input point i.
+
+    Attributes:
+        snapped_lon (np.ndarray): Longitude of the nearest point on the road (NaN if outside tolerance).
+        snapped_lat (np.ndarray): Latitude of the nearest point on the road (NaN if outside tolerance).
+        distance (np.ndarray): Distance in degrees to the nearest road segment.
+        road_segment_id (np.ndarray): Segment id (GeoDataFrame index label) or None if outside tolerance.
+        within_tolerance (np.ndarray): Boolean mask of points that were snapped.
+    """
+    snapped_lon: np.ndarray
+    snapped_lat: np.ndarray
+    distance: np.ndarray
+    road_segment_id: np.ndarray
+    within_tolerance: np.ndarray
+
+
+class RoadSegmentIndex:
+    """
+    STRtree spatial index over the LineStrings of a road network GeoDataFrame.
+
+    Built once per uploaded network; answers nearest-segment queries for whole
+    arrays of points in a single vectorized call instead of scanning every
+    segment per point.
+    """
+
+    def __init__(self, road_network):
+        geometries = np.asarray(road_network.geometry.values, dtype=object)
+        # Only LineStrings take part in snapping (type id 1)
+        line_mask = shapely.get_type_id(geometries) == 1
+        self.geometries = geometries[line_mask]
+        self.segment_ids = np.asarray(road_network.index)[line_mask]
+        self.tree = STRtree(self.geometries)
+
+    def __len__(self):
+        return len(self.geometries)
+
+    def snap(self, lons, lats, tolerance: float) -> SnapResult:
+        """
+        Snap arrays of (lon, lat) coordinates to their nearest road segment.
+
+        Args:
+            lons: Array-like of longitudes
+            lats: Array-like of latitudes
+            tolerance: Maximum distance in degrees for a point to count as snapped
+
+        Returns:
+            SnapResult with one entry per input point
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        n = len(lons)
+
+        snapped_lon = np.full(n, np.nan)
+        snapped_lat = np.full(n, np.nan)
+        distance = np.full(n, np.inf)
+        road_segment_id = np.full(n, None, dtype=object)
+
+        if n and len(self.geometries):
+            points = shapely.points(lons, lats)
+            (point_idx, tree_idx), dists = self.tree.query_nearest(
+                points, return_distance=True, all_matches=False
+            )
+            # First coordinate of the shortest line lies on the road segment
+            nearest = shapely.get_coordinates(
+                shapely.shortest_line(self.geometries[tree_idx], points[point_idx])
+            )[::2]
+            snapped_lon[point_idx] = nearest[:, 0]
+            snapped_lat[point_idx] = nearest[:, 1]
+            distance[point_idx] = dists
+            road_segment_id[point_idx] = self.segment_ids[tree_idx]
+
+        within_tolerance = distance <= tolerance
+        snapped_lon[~within_tolerance] = np.nan
+        snapped_lat[~within_tolerance] = np.nan
+        road_segment_id[~within_tolerance] = None
+
+        return SnapResult(
+            snapped_lon=snapped_lon,
+            snapped_lat=snapped_lat,
+            distance=distance,
+            road_segment_id=road_segment_id,
+            within_tolerance=within_tolerance,
+        )
+
+
+@dataclass
+class RoadEdgeArrays:
+    """
+    Columnar view of every edge (consecutive coordinate pair) of a road network.
+
+    Attributes:
+        node_ids (np.ndarray): Rounded (lon, lat) node id per unique node, shape (n, 2), in first-seen order.
+        node_coords (np.ndarray): Original (lon, lat) coordinate of each node's first occurrence, shape (n, 2).
+        edge_start (np.ndarray): Index into node_ids of each edge's start node.
+        edge_end (np.ndarray): Index into node_ids of each edge's end node.
+        start_coords (np.ndarray): Original (lon, lat) start coordinate of each edge.
+        end_coords (np.ndarray): Original (lon, lat) end coordinate of each edge.
+        length (np.ndarray): Euclidean edge length in degrees.
+        segment_id (np.ndarray): GeoDataFrame index label of the segment each edge belongs to.
+        segment_row (np.ndarray): Row position in the GeoDataFrame of the segment each edge belongs to.
+    """
+    node_ids: np.ndarray
+    node_coords: np.ndarray
+    edge_start: np.ndarray
+    edge_end: np.ndarray
+    start_coords: np.ndarray
+    end_coords: np.ndarray
+    length: np.ndarray
+    segment_id: np.ndarray
+    segment_row: np.ndarray
+
+
+def round_node_coordinates(coords: np.ndarray, decimals: int = NODE_ID_DECIMALS) -> np.ndarray:
+    """
+    Round coordinates exactly like Python's round(), which the node ids have always used.
+    np.round can differ from round() right at .5 ties, so those few values go through round().
+    """
+    rounded = np.round(coords, decimals)
+    scaled = coords * 10.0 ** decimals
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-3
+    if near_tie.any():
+        rounded[near_tie] = [round(value, decimals) for value in coords[near_tie].tolist()]
+    return rounded
+
+
+def extract_road_edges(road_network) -> RoadEdgeArrays:
+    """
+    Pull all LineString coordinates of a road network out in one call and
+    derive nodes and edges with array operations.
+
+    Args:
+        road_network: GeoDataFrame containing LineString geometries
+
+    Returns:
+        RoadEdgeArrays describing the network's nodes and directed edges
+    """
+    geometries = np.asarray(road_network.geometry.values, dtype=object)
+    line_mask = shapely.get_type_id(geometries) == 1
+    lines = geometries[line_mask]
+    line_segment_ids = np.asarray(road_network.index)[line_mask]
+    line_rows = np.flatnonzero(line_mask)
+
+    coords, line_of_coord = shapely.get_coordinates(lines, return_index=True)
+
+    # An edge joins coordinate k to k+1 whenever both belong to the same LineString
+    edge_start_coord = np.flatnonzero(line_of_coord[:-1] == line_of_coord[1:])
+    edge_end_coord = edge_start_coord + 1
+
+    # Dedupe rounded coordinates into node ids, keeping first-seen order
+    rounded = round_node_coordinates(coords)
+    unique_ids, first_index, inverse = np.unique(
+        rounded, axis=0, return_index=True, return_inverse=True
+    )
+    inverse = inverse.reshape(-1)
+    order = np.argsort(first_index, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    node_of_coord = rank[inverse]
+
+    start_coords = coords[edge_start_coord]
+    end_coords = coords[edge_end_coord]
+
+    return RoadEdgeArrays(
+        node_ids=unique_ids[order],
+        node_coords=coords[first_index[order]],
+        edge_start=node_of_coord[edge_start_coord],
+        edge_end=node_of_coord[edge_end_coord],
+        start_coords=start_coords,
+        end_coords=end_coords,
+        length=np.hypot(end_coords[:, 0] - start_coords[:, 0], end_coords[:, 1] - start_coords[:, 1]),
+        segment_id=line_segment_ids[line_of_coord[edge_start_coord]],
+        segment_row=line_rows[line_of_coord[edge_start_coord]],
+    )
+
+
+def build_road_graph(road_network, include_geometry: bool = True) -> nx.DiGraph:
+    """
+    Build the NetworkX DiGraph of a road network in bulk.
+
+    Nodes are keyed by rounded (lon, lat) tuples with 'lat'/'lon' attributes;
+    each consecutive coordinate pair becomes an edge with 'length' (degrees),
+    'length_m' (haversine meters between the node ids, the routing weight),
+    'segment_id' and, optionally, a two-point 'geometry' LineString.
+
+    Args:
+        road_network: GeoDataFrame containing LineString geometries
+        include_geometry: If False, skip the per-edge LineString objects to save memory
+
+    Returns:
+        NetworkX DiGraph representing the road network
+    """
+    edges = extract_road_edges(road_network)
+
+    node_keys = [tuple(node) for node in edges.node_ids.tolist()]
+    G = nx.DiGraph()
+    G.add_nodes_from(
+        (key, {'lat': lat, 'lon': lon})
+        for key, (lon, lat) in zip(node_keys, edges.node_coords.tolist())
+    )
+
+    lengths = edges.length.tolist()
+    # Measured between the rounded node ids so a haversine A* heuristic stays consistent
+    start_ids = edges.node_ids[edges.edge_start]
+    end_ids = edges.node_ids[edges.edge_end]
+    lengths_m = haversine_m(start_ids[:, 0], start_ids[:, 1], end_ids[:, 0], end_ids[:, 1]).tolist()
+    segment_ids = edges.segment_id.tolist()
+    if include_geometry:
+        geometries = shapely.linestrings(np.stack([edges.start_coords, edges.end_coords], axis=1))
+        edge_attrs = (
+            {'length': length, 'length_m': length_m, 'segment_id': segment_id, 'geometry': geometry}
+            for length, length_m, segment_id, geometry in zip(lengths, lengths_m, segment_ids, geometries)
+        )
+    else:
+        edge_attrs = (
+            {'length': length, 'length_m': length_m, 'segment_id': segment_id}
+            for length, length_m, segment_id in zip(lengths, lengths_m, segment_ids)
+        )
+
+    G.add_edges_from(
+        (node_keys[u], node_keys[v], attrs)
+        for u, v, attrs in zip(edges.edge_start.tolist(), edges.edge_end.tolist(), edge_attrs)
+    )
+    return G
+
+
+class _CSRAdjacency:
+    """
+    Read-only node -> {neighbor: edge data} mapping over CSR arrays, shaped like
+    NetworkX's adjacency dicts for callers that read edge data by node key
+    (RoutePath, path_cost, local_routing). The per-node dicts are built on lookup
+    and never stored; the searches use CSRRoadGraph.neighbors instead.
+    """
+
+    def __init__(self, csr, indptr, neighbors, edges=None):
+        self._csr = csr
+        self._indptr = indptr
+        self._neighbors = neighbors
+        # Edge array positions per entry (the transpose); None when entries are the edges themselves
+        self._edges = edges
+
+    def __contains__(self, key) -> bool:
+        return key in self._csr
+
+    def __getitem__(self, key) -> dict:
+        csr = self._csr
+        node = csr.node_index(key)
+        lo, hi = int(self._indptr[node]), int(self._indptr[node + 1])
+        edges = self._edges[lo:hi] if self._edges is not None else slice(lo, hi)
+        keys = csr.node_keys
+        adjacency = {}
+        for v, length_m, segment_id in zip(
+            self._neighbors[lo:hi].tolist(),
+            csr.length[edges].tolist(),
+            csr.segment_ids[csr.segment_row[edges]].tolist(),
+        ):
+            other = keys[v]
+            adjacency[other] = {
+                'length': math.hypot(other[0] - key[0], other[1] - key[1]),
+                'length_m': length_m,
+                'segment_id': segment_id,
+            }
+        return adjacency
+
+
+class CSRRoadGraph:
+    """
+    Compact compressed-sparse-row form of the directed road graph, the graph
+    the routing endpoints search.
+
+    Node i has outgoing edges indices[indptr[i]:indptr[i+1]]; the edge arrays
+    (length, weight, segment_row) are aligned with indices. rev_indptr/rev_source/
+    rev_edge list the same edges grouped by target node for backward searches.
+    Node i corresponds to the NetworkX node keyed by tuple(node_coords[i]), and
+    succ/pred/__getitem__ expose the edges under those keys the way a NetworkX
+    DiGraph does, at a few dozen bytes per edge instead of a dict of attributes.
+
+    Attributes:
+        indptr (np.ndarray): int32 row pointer, shape (num_nodes + 1,)
+        indices (np.ndarray): int32 target node of each edge
+        length (np.ndarray): float64 edge length in meters (haversine between the rounded node ids,
+            the same value build_road_graph stores as 'length_m')
+        weight (np.ndarray): float64 routing cost per edge (defaults to length)
+        segment_row (np.ndarray): int32 row of the source road segment in the GeoDataFrame
+        node_coords (np.ndarray): float64 rounded (lon, lat) node id coordinates, shape (num_nodes, 2)
+        segment_ids (np.ndarray): GeoDataFrame index labels, looked up through segment_row
+        node_tree (cKDTree): KD-tree over node_coords for nearest-node lookups (None when empty)
+    """
+
+    # Edge data name -> edge array holding it, for the weights neighbors() can read
+    EDGE_COSTS = {'length_m': 'length', 'weight': 'weight'}
+
+    def __init__(self, indptr, indices, length, weight, segment_row, node_coords, segment_ids):
+        self.indptr = indptr
+        self.indices = indices
+        self.length = length
+        self.weight = weight
+        self.segment_row = segment_row
+        self.node_coords = node_coords
+        self.segment_ids = segment_ids
+        # Built with the graph, so a reloaded network always gets a fresh tree
+        self.node_tree = cKDTree(node_coords) if len(node_coords) else None
+
+        # Edges grouped by target node (the transpose), for searches that run backwards
+        sources = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(indptr))
+        self.rev_edge = np.argsort(indices, kind="stable").astype(np.int32)
+        self.rev_source = sources[self.rev_edge]
+        self.rev_indptr = np.zeros(self.num_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(indices, minlength=self.num_nodes), out=self.rev_indptr[1:])
+
+        # Node keys and their index, built on first keyed access
+        self._node_keys = None
+        self._node_index = None
+        # memoryviews of the arrays neighbors() walks, keyed by attribute name
+        self._views = {}
+        self.succ = _CSRAdjacency(self, indptr, indices)
+        self.pred = _CSRAdjacency(self, self.rev_indptr, self.rev_source, self.rev_edge)
+
+    @classmethod
+    def from_road_network(cls, road_network) -> "CSRRoadGraph":
+        """
+        Build the CSR graph from a road network GeoDataFrame.
+        Mirrors build_road_graph: same node ids, LineString direction only, edge
+        lengths measured between the rounded node ids, and the last occurrence
+        wins when two segments share the same node pair.
+        """
+        edges = extract_road_edges(road_network)
+        num_nodes = len(edges.node_ids)
+
+        # Keep the last occurrence of each (u, v) pair; np.unique also sorts edges by source node
+        pair = edges.edge_start.astype(np.int64) * num_nodes + edges.edge_end
+        _, last_from_end = np.unique(pair[::-1], return_index=True)
+        keep = len(pair) - 1 - last_from_end
+
+        sources = edges.edge_start[keep]
+        indptr = np.zeros(num_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+
+        start = edges.node_ids[sources]
+        end = edges.node_ids[edges.edge_end[keep]]
+        length = haversine_m(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+
+        return cls(
+            indptr=indptr,
+            indices=edges.edge_end[keep].astype(np.int32),
+            length=length,
+            weight=length.copy(),
+            segment_row=edges.segment_row[keep].astype(np.int32),
+            node_coords=edges.node_ids,
+            segment_ids=np.asarray(road_network.index),
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.indices)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the graph arrays in bytes."""
+        return sum(a.nbytes for a in (
+            self.indptr, self.indices, self.length, self.weight, self.segment_row, self.node_coords,
+            self.rev_indptr, self.rev_source, self.rev_edge,
+        ))
+
+    def nearest_nodes(self, lons, lats):
+        """
+        Nearest graph node for each (lon, lat) point, by Euclidean distance in degrees.
+
+        Returns:
+            Tuple of (node index array, distance array); indices are -1 when the graph is empty.
+        """
+        points = np.column_stack([np.asarray(lons, dtype=float), np.asarray(lats, dtype=float)])
+        if self.node_tree is None or len(points) == 0:
+            return np.full(len(points), -1, dtype=np.int64), np.full(len(points), np.inf)
+        distances, nodes = self.node_tree.query(points)
+        return nodes.astype(np.int64), distances
+
+    def edge_range(self, node: int) -> range:
+        """Positions in the edge arrays of the outgoing edges of node."""
+        return range(self.indptr[node], self.indptr[node + 1])
+
+    def _view(self, name: str) -> memoryview:
+        """
+        memoryview of an edge array; indexing it gives plain Python numbers without
+        the per-element NumPy scalar of array[i]. Rebuilt if the attribute is reassigned.
+        """
+        array = getattr(self, name)
+        cached = self._views.get(name)
+        if cached is None or cached[0] is not array:
+            cached = (array, memoryview(np.ascontiguousarray(array)))
+            self._views[name] = cached
+        return cached[1]
+
+    def neighbors(self, node: int, weight: str = 'length_m', reverse: bool = False):
+        """
+        Yield (neighbor, cost, edge) for each edge leaving node, or entering it when
+        reverse is True, read straight off indptr/indices (rev_indptr/rev_source) and
+        the cost array; edge is the position in the edge arrays. weight is a key of
+        EDGE_COSTS.
+        """
+        cost = self._view(self.EDGE_COSTS[weight])
+        if reverse:
+            indptr, sources, edges = self._view('rev_indptr'), self._view('rev_source'), self._view('rev_edge')
+            for position in range(indptr[node], indptr[node + 1]):
+                edge = edges[position]
+                yield sources[position], cost[edge], edge
+        else:
+            indptr, indices = self._view('indptr'), self._view('indices')
+            for edge in range(indptr[node], indptr[node + 1]):
+                yield indices[edge], cost[edge], edge
+
+    def node_key(self, node: int) -> tuple:
+        """NetworkX node id (rounded lon, lat) of a CSR node index."""
+        lon, lat = self.node_coords[node].tolist()
+        return (lon, lat)
+
+    def edge_segment_id(self, edge: int):
+        """GeoDataFrame index label of the road segment an edge belongs to."""
+        segment_id = self.segment_ids[self.segment_row[edge]]
+        # Plain Python value; object arrays (ids with gaps) already hold one
+        return segment_id.item() if isinstance(segment_id, np.generic) else segment_id
+
+    # NetworkX-style access by (lon, lat) node key, used by road_routing and local_routing
+
+    @property
+    def node_keys(self) -> list:
+        """(lon, lat) key of every node, in node index order."""
+        if self._node_keys is None:
+            self._node_keys = [(lon, lat) for lon, lat in self.node_coords.tolist()]
+        return self._node_keys
+
+    def node_index(self, key) -> int:
+        """CSR node index of a (lon, lat) node key (KeyError when it is not a node)."""
+        if self._node_index is None:
+            self._node_index = {k: i for i, k in enumerate(self.node_keys)}
+        return self._node_index[key]
+
+    def __contains__(self, key) -> bool:
+        try:
+            self.node_index(key)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return self.num_nodes
+
+    def __getitem__(self, key) -> dict:
+        """Successors of a node key as {neighbor key: edge data}, like DiGraph[u]."""
+        return self.succ[key]
+
+    def nodes(self) -> list:
+        return list(self.node_keys)
+
+    def number_of_nodes(self) -> int:
+        return self.num_nodes
+
+    def number_of_edges(self) -> int:
+        return self.num_edges
+
+    def edges(self) -> list:
+        """Every edge as a (u, v) pair of node keys, in edge array order."""
+        keys = self.node_keys
+        sources = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr)).tolist()
+        return [(keys[u], keys[v]) for u, v in zip(sources, self.indices.tolist())]
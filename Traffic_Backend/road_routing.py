@@ -0,0 +1,438 @@
+"""
+Path search over the in-process road graph.
+
+Shortest-path and k-shortest-paths queries used by the route endpoints. The
+searches run on a NetworkX DiGraph or on the CSRRoadGraph the endpoints route
+on. Every search runs under a SearchBudget so a single request cannot explore
+an unbounded part of a dense city network.
+"""
+
+import heapq
+import math
+import time
+from dataclasses import dataclass
+from itertools import count
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import networkx as nx
+
+from Traffic_Backend.road_graph import EARTH_RADIUS_M
+
+
+class BudgetExceeded(Exception):
+    """Raised inside a search when its SearchBudget runs out."""
+
+
+class SearchBudget:
+    """
+    Wall-clock and node-expansion limits shared by all searches of one request.
+
+    Args:
+        time_limit_s: Seconds the searches may run in total (None for no limit)
+        max_expansions: Nodes the searches may settle in total (None for no limit)
+    """
+
+    def __init__(self, time_limit_s: Optional[float] = None, max_expansions: Optional[int] = None):
+        self.deadline = time.perf_counter() + time_limit_s if time_limit_s is not None else None
+        self.max_expansions = max_expansions
+        self.expansions = 0
+
+    def expand(self):
+        """Count one settled node; raise BudgetExceeded once either limit is passed."""
+        self.expansions += 1
+        if self.max_expansions is not None and self.expansions > self.max_expansions:
+            raise BudgetExceeded(f"expansion budget of {self.max_expansions} exceeded")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise BudgetExceeded("time budget exceeded")
+
+
+def node_haversine_m(u: Tuple[float, float], v: Tuple[float, float]) -> float:
+    """
+    Great-circle distance in meters between two (lon, lat) node ids.
+    A consistent A* heuristic for the 'length_m' edge weight: the scalar form of
+    road_graph.haversine_m, which computes 'length_m' (math is far cheaper than
+    NumPy per call, and A* calls this on every push).
+    """
+    lon1, lat1, lon2, lat2 = map(math.radians, (u[0], u[1], v[0], v[1]))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+
+class _KeyedSearchSpace:
+    """
+    The view the searches take of a graph they walk by node key through its
+    adjacency dicts: a NetworkX DiGraph, or a CSRRoadGraph for a weight that is
+    not one of its edge arrays.
+    """
+
+    def __init__(self, graph, weight: str):
+        self.graph = graph
+        self.weight = weight
+        if isinstance(graph, nx.DiGraph):
+            # The raw dicts; the public views add a wrapper object per lookup
+            self._succ, self._pred = graph._succ, graph._pred
+        else:
+            self._succ, self._pred = graph.succ, graph.pred
+
+    def node(self, key):
+        return key
+
+    def path_keys(self, path: list) -> list:
+        return path
+
+    def nodes(self, keys):
+        return keys
+
+    def edges(self, pairs):
+        return pairs
+
+    def heuristic(self, heuristic):
+        return heuristic
+
+    def neighbors(self, u, reverse: bool = False):
+        """Yield (neighbor, cost, None) for the edges leaving u (entering it when reverse)."""
+        weight = self.weight
+        for v, data in (self._pred if reverse else self._succ)[u].items():
+            yield v, data.get(weight, 0), None
+
+    def edge_cost(self, u, v) -> float:
+        return self._succ[u][v].get(self.weight, 0)
+
+
+class _CSRSearchSpace:
+    """
+    The view the searches take of a CSRRoadGraph: nodes are CSR node indices and
+    edges come straight off its arrays through CSRRoadGraph.neighbors, so no
+    per-node dict is built. Node keys are translated only at the search boundaries.
+    """
+
+    def __init__(self, graph, weight: str):
+        self.graph = graph
+        self.weight = weight
+        self.keys = graph.node_keys
+
+    def node(self, key) -> int:
+        return self.graph.node_index(key)
+
+    def path_keys(self, path: list) -> list:
+        keys = self.keys
+        return [keys[node] for node in path]
+
+    def nodes(self, keys) -> set:
+        graph = self.graph
+        return {graph.node_index(key) for key in keys if key in graph}
+
+    def edges(self, pairs) -> set:
+        graph = self.graph
+        return {
+            (graph.node_index(u), graph.node_index(v))
+            for u, v in pairs
+            if u in graph and v in graph
+        }
+
+    def heuristic(self, heuristic):
+        if heuristic is None:
+            return None
+        keys = self.keys
+        return lambda u, v: heuristic(keys[u], keys[v])
+
+    def neighbors(self, u: int, reverse: bool = False):
+        """Yield (neighbor, cost, edge) for the edges leaving u (entering it when reverse)."""
+        return self.graph.neighbors(u, self.weight, reverse)
+
+    def edge_cost(self, u: int, v: int) -> float:
+        for w, cost, _ in self.graph.neighbors(u, self.weight):
+            if w == v:
+                return cost
+        raise KeyError((self.keys[u], self.keys[v]))
+
+
+def _search_space(graph, weight: str):
+    """The search view of graph for the given edge weight."""
+    # A CSRRoadGraph names the edge arrays it can be searched on directly
+    if weight in getattr(graph, 'EDGE_COSTS', ()):
+        return _CSRSearchSpace(graph, weight)
+    return _KeyedSearchSpace(graph, weight)
+
+
+def path_cost(graph, path: List[Hashable], weight: str = 'length') -> float:
+    """Sum of the edge weights along a node path."""
+    return sum(graph[u][v].get(weight, 0) for u, v in zip(path[:-1], path[1:]))
+
+
+@dataclass
+class RoutePath:
+    """
+    A path found on the road graph with its edge data read out of the graph once.
+
+    Attributes:
+        nodes (list): Node ids along the path
+        cost (float): Total of the routing weight the search minimized
+        cumulative_length (np.ndarray): Prefix sums of edge 'length' (degrees), starting at 0, one per node
+        edge_attrs (dict): Per-edge arrays of 'length', 'length_m' and 'segment_id', aligned with consecutive node pairs
+    """
+    nodes: List[Hashable]
+    cost: float
+    cumulative_length: np.ndarray
+    edge_attrs: Dict[str, np.ndarray]
+
+    @classmethod
+    def from_nodes(cls, graph: nx.DiGraph, nodes: List[Hashable], cost: Optional[float] = None) -> "RoutePath":
+        """Collect the edge attributes of a node path in one pass over the graph."""
+        edges = [graph[u][v] for u, v in zip(nodes[:-1], nodes[1:])]
+        edge_attrs = {
+            name: np.array([data.get(name, 0.0) for data in edges], dtype=float)
+            for name in ('length', 'length_m')
+        }
+        edge_attrs['segment_id'] = np.array([data.get('segment_id') for data in edges], dtype=object)
+        cumulative_length = np.concatenate(([0.0], np.cumsum(edge_attrs['length'])))
+        if cost is None:
+            cost = float(cumulative_length[-1])
+        return cls(nodes=list(nodes), cost=cost, cumulative_length=cumulative_length, edge_attrs=edge_attrs)
+
+    @property
+    def length(self) -> float:
+        """Total edge 'length' in degrees."""
+        return float(self.cumulative_length[-1])
+
+    @property
+    def num_segments(self) -> int:
+        return len(self.nodes) - 1
+
+
+def _dijkstra(space, source, target, budget, ignored_nodes, ignored_edges, heuristic):
+    """dijkstra_path on the nodes of a search space."""
+    dist = {source: 0.0}
+    parent = {source: None}
+    settled = set()
+    tie = count()
+    heap = [(0.0, next(tie), source)]
+
+    while heap:
+        _, _, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        d = dist[u]
+        settled.add(u)
+        if budget is not None:
+            budget.expand()
+        if u == target:
+            path = [u]
+            while parent[path[-1]] is not None:
+                path.append(parent[path[-1]])
+            path.reverse()
+            return d, path
+        for v, cost, _ in space.neighbors(u):
+            if v in settled or v in ignored_nodes or (u, v) in ignored_edges:
+                continue
+            nd = d + cost
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                parent[v] = u
+                key = nd + heuristic(v, target) if heuristic is not None else nd
+                heapq.heappush(heap, (key, next(tie), v))
+    return None
+
+
+def dijkstra_path(
+    graph: nx.DiGraph,
+    source: Hashable,
+    target: Hashable,
+    weight: str = 'length',
+    budget: Optional[SearchBudget] = None,
+    ignored_nodes=frozenset(),
+    ignored_edges=frozenset(),
+    heuristic: Optional[Callable[[Hashable, Hashable], float]] = None,
+) -> Optional[Tuple[float, List[Hashable]]]:
+    """
+    Single-pair Dijkstra that can skip nodes and edges (the spur search of Yen's algorithm).
+    With a consistent heuristic(u, v) lower bound it runs as A*.
+
+    Returns:
+        (cost, path) or None when target is unreachable
+    """
+    if source in ignored_nodes or target in ignored_nodes:
+        return None
+    if source not in graph or target not in graph:
+        return None
+
+    space = _search_space(graph, weight)
+    result = _dijkstra(
+        space, space.node(source), space.node(target), budget,
+        space.nodes(ignored_nodes), space.edges(ignored_edges), space.heuristic(heuristic),
+    )
+    if result is None:
+        return None
+    return result[0], space.path_keys(result[1])
+
+
+def _bidirectional_astar(space, source, target, heuristic, budget, ignored_edges):
+    """bidirectional_astar_path on the nodes of a search space, for source != target."""
+    def potential(v):
+        return (heuristic(v, target) - heuristic(source, v)) / 2
+
+    signs = (1, -1)
+    dists = ({source: 0.0}, {target: 0.0})
+    parents = ({source: None}, {target: None})
+    settled = (set(), set())
+    tie = count()
+    heaps = ([(potential(source), next(tie), source)], [(-potential(target), next(tie), target)])
+    best, meet = float('inf'), None
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        _, _, u = heapq.heappop(heaps[side])
+        if u in settled[side]:
+            continue
+        settled[side].add(u)
+        if budget is not None:
+            budget.expand()
+
+        dist, other = dists[side], dists[1 - side]
+        du = dist[u]
+        for v, cost, _ in space.neighbors(u, reverse=side == 1):
+            if ignored_edges and ((u, v) if side == 0 else (v, u)) in ignored_edges:
+                continue
+            nd = du + cost
+            if nd < dist.get(v, float('inf')):
+                dist[v] = nd
+                parents[side][v] = u
+                heapq.heappush(heaps[side], (nd + signs[side] * potential(v), next(tie), v))
+            if v in other and dist[v] + other[v] < best:
+                best, meet = dist[v] + other[v], v
+
+    if meet is None:
+        return None
+    path = [meet]
+    while parents[0][path[-1]] is not None:
+        path.append(parents[0][path[-1]])
+    path.reverse()
+    while parents[1][path[-1]] is not None:
+        path.append(parents[1][path[-1]])
+    return best, path
+
+
+def bidirectional_astar_path(
+    graph: nx.DiGraph,
+    source: Hashable,
+    target: Hashable,
+    weight: str = 'length_m',
+    heuristic: Callable[[Hashable, Hashable], float] = node_haversine_m,
+    budget: Optional[SearchBudget] = None,
+    ignored_edges=frozenset(),
+) -> Optional[Tuple[float, List[Hashable]]]:
+    """
+    Point-to-point shortest path by bidirectional A*.
+
+    Both searches use the average potential (h(v, target) - h(source, v)) / 2,
+    which keeps reduced edge costs non-negative for a consistent heuristic, so
+    the search can stop once the two frontier keys add up to the best meeting
+    cost found. Edges in ignored_edges, given as (u, v), are never taken.
+
+    Returns:
+        (cost, path) or None when target is unreachable
+    """
+    if source not in graph or target not in graph:
+        return None
+    if source == target:
+        return 0.0, [source]
+
+    space = _search_space(graph, weight)
+    result = _bidirectional_astar(
+        space, space.node(source), space.node(target), space.heuristic(heuristic), budget,
+        space.edges(ignored_edges),
+    )
+    if result is None:
+        return None
+    return result[0], space.path_keys(result[1])
+
+
+class _EdgeUnion:
+    """Membership view over two edge sets, so a large blocked set is not copied per spur search."""
+
+    def __init__(self, first, second):
+        self.first, self.second = first, second
+
+    def __contains__(self, edge) -> bool:
+        return edge in self.first or edge in self.second
+
+
+def k_shortest_paths(
+    graph: nx.DiGraph,
+    source: Hashable,
+    target: Hashable,
+    k: int = 3,
+    weight: str = 'length',
+    budget: Optional[SearchBudget] = None,
+    heuristic: Optional[Callable[[Hashable, Hashable], float]] = None,
+    ignored_edges=frozenset(),
+) -> List[Tuple[float, List[Hashable]]]:
+    """
+    Up to k loopless shortest paths in increasing cost order (Yen's algorithm).
+
+    Stops as soon as k paths are found. When the budget runs out the paths
+    found so far are returned, so the result may hold fewer than k entries.
+    With a heuristic, the first path comes from bidirectional A* and the spur
+    searches run as A*. No path uses an edge in ignored_edges.
+
+    Returns:
+        List of (cost, path) tuples
+    """
+    if k <= 0 or source not in graph or target not in graph:
+        return []
+
+    # Every search below runs on the space's nodes; keys come back only in the result
+    space = _search_space(graph, weight)
+    source, target = space.node(source), space.node(target)
+    ignored_edges = space.edges(ignored_edges)
+    heuristic = space.heuristic(heuristic)
+
+    accepted: List[Tuple[float, List[Hashable]]] = []
+    try:
+        if source == target:
+            first = 0.0, [source]
+        elif heuristic is not None:
+            first = _bidirectional_astar(space, source, target, heuristic, budget, ignored_edges)
+        else:
+            first = _dijkstra(space, source, target, budget, frozenset(), ignored_edges, None)
+        if first is None:
+            return []
+        accepted.append(first)
+
+        candidates = []
+        seen = {tuple(first[1])}
+        tie = count()
+        while len(accepted) < k:
+            _, last_path = accepted[-1]
+            for i in range(len(last_path) - 1):
+                spur_node = last_path[i]
+                root = last_path[:i + 1]
+                # Edges leaving the root that an accepted path already takes
+                taken_edges = {
+                    (path[i], path[i + 1])
+                    for _, path in accepted
+                    if len(path) > i + 1 and path[:i + 1] == root
+                }
+                spur = _dijkstra(
+                    space, spur_node, target, budget,
+                    set(root[:-1]), _EdgeUnion(taken_edges, ignored_edges), heuristic,
+                )
+                if spur is None:
+                    continue
+                candidate = root[:-1] + spur[1]
+                key = tuple(candidate)
+                if key in seen:
+                    continue
+                seen.add(key)
+                cost = sum(space.edge_cost(u, v) for u, v in zip(candidate[:-1], candidate[1:]))
+                heapq.heappush(candidates, (cost, next(tie), candidate))
+            if not candidates:
+                break
+            cost, _, path = heapq.heappop(candidates)
+            accepted.append((cost, path))
+    except BudgetExceeded:
+        pass
+    return [(cost, space.path_keys(path)) for cost, path in accepted]
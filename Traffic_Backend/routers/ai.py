@@ -145,10 +145,13 @@ async def detect_anomalies(
     Detect traffic anomalies using Isolation Forest
     """
     try:
-        # Get recent traffic data
+        # Get recent traffic data (only the columns used, read through the timestamp index)
         cutoff = datetime.now() - timedelta(hours=hours)
         query = db.query(
-            TrafficDynamics,
+            TrafficDynamics.timestamp,
+            TrafficDynamics.average_speed,
+            TrafficDynamics.vehicle_count,
+            TrafficDynamics.road_segment_id,
             RoadNetwork.name
         ).join(
             RoadNetwork,
@@ -163,18 +166,21 @@ async def detect_anomalies(
         # Prepare data
         current_data = pd.DataFrame([
             {
-                'timestamp': td.timestamp,
-                'average_speed': td.average_speed or 0,
-                'vehicle_count': td.vehicle_count or 0,
-                'road_segment_id': td.road_segment_id,
-                'road_name': name
+                'timestamp': row.timestamp,
+                'average_speed': row.average_speed or 0,
+                'vehicle_count': row.vehicle_count or 0,
+                'road_segment_id': row.road_segment_id,
+                'road_name': row.name
             }
-            for td, name in query
+            for row in query
         ])
         
         # Get historical data for training anomaly detector
         historical_cutoff = datetime.now() - timedelta(days=30)
-        historical_query = db.query(TrafficDynamics).filter(
+        historical_query = db.query(
+            TrafficDynamics.average_speed,
+            TrafficDynamics.vehicle_count
+        ).filter(
             TrafficDynamics.timestamp >= historical_cutoff,
             TrafficDynamics.timestamp < cutoff
         ).all()
@@ -183,10 +189,10 @@ async def detect_anomalies(
         if historical_query:
             historical_data = pd.DataFrame([
                 {
-                    'average_speed': td.average_speed or 0,
-                    'vehicle_count': td.vehicle_count or 0
+                    'average_speed': row.average_speed or 0,
+                    'vehicle_count': row.vehicle_count or 0
                 }
-                for td in historical_query
+                for row in historical_query
             ])
         
         # Detect anomalies
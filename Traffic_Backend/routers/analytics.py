@@ -2,20 +2,32 @@
 Analytics Router
 Provides traffic analytics, historical trends, and statistical insights
 """
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, Integer
+from sqlalchemy import func, and_
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import Iterator, List, Optional, Dict
 from datetime import datetime, timedelta
+import csv
+import io
+import json
 import random
+import zlib
 
 from Traffic_Backend.db_config import get_db
-from Traffic_Backend.models import TrafficDynamics, RoadNetwork
+from Traffic_Backend.models import TrafficDynamics, RoadNetwork, TrafficRollup1h
+from Traffic_Backend.time_buckets import hour_bucket, hour_of_day, parse_hour_bucket
+from Traffic_Backend.traffic_rollups import rollup_for, rollup_window_start
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
+def _ratio(total, count):
+    """Average from a rollup sum and its sample count (None when there are no samples)."""
+    return total / count if count else None
+
+
 # Mock data generators for when database is empty
 def _generate_mock_traffic_trends(hours: int) -> List:
     """Generate mock traffic trend data"""
@@ -110,7 +122,7 @@ def get_traffic_trends(
     cutoff = datetime.now() - timedelta(hours=hours)
     
     query = db.query(
-        TrafficDynamics.timestamp,
+        hour_bucket(TrafficDynamics.timestamp).label('hour'),
         func.avg(TrafficDynamics.average_speed).label('avg_speed'),
         func.sum(TrafficDynamics.vehicle_count).label('vehicle_count'),
         TrafficDynamics.congestion_state
@@ -120,9 +132,9 @@ def get_traffic_trends(
         query = query.filter(TrafficDynamics.road_segment_id == road_segment_id)
     
     query = query.group_by(
-        func.strftime('%Y-%m-%d %H:00:00', TrafficDynamics.timestamp),
+        'hour',
         TrafficDynamics.congestion_state
-    ).order_by(TrafficDynamics.timestamp)
+    ).order_by('hour', TrafficDynamics.congestion_state)
     
     results = query.all()
     
@@ -132,7 +144,7 @@ def get_traffic_trends(
     
     return [
         {
-            "timestamp": row.timestamp,
+            "timestamp": parse_hour_bucket(row.hour),
             "avg_speed": round(row.avg_speed, 2),
             "vehicle_count": row.vehicle_count or 0,
             "congestion_state": row.congestion_state
@@ -149,16 +161,20 @@ def get_speed_profiles(
 ):
     """Get average speed profiles by hour of day"""
     cutoff = datetime.now() - timedelta(days=days)
+    # Per-hour results: read the coarsest rollup whose buckets nest in an hour
+    rollup = rollup_for(cutoff, group_seconds=3600)
     
     query = db.query(
-        func.cast(func.strftime('%H', TrafficDynamics.timestamp), Integer).label('hour'),
-        func.avg(TrafficDynamics.average_speed).label('avg_speed'),
-        func.avg(TrafficDynamics.vehicle_count).label('vehicle_count'),
-        func.count(TrafficDynamics.id).label('sample_size')
-    ).filter(TrafficDynamics.timestamp >= cutoff)
+        hour_of_day(rollup.bucket_start).label('hour'),
+        func.sum(rollup.speed_sum).label('speed_sum'),
+        func.sum(rollup.speed_count).label('speed_count'),
+        func.sum(rollup.vehicle_sum).label('vehicle_sum'),
+        func.sum(rollup.vehicle_samples).label('vehicle_samples'),
+        func.sum(rollup.sample_count).label('sample_size')
+    ).filter(rollup.bucket_start >= rollup_window_start(rollup, cutoff))
     
     if road_segment_id:
-        query = query.filter(TrafficDynamics.road_segment_id == road_segment_id)
+        query = query.filter(rollup.road_segment_id == road_segment_id)
     
     query = query.group_by('hour').order_by('hour')
     
@@ -168,15 +184,17 @@ def get_speed_profiles(
     if not results or len(results) == 0:
         return _generate_mock_speed_profiles()
     
-    return [
-        {
+    profiles = []
+    for row in results:
+        avg_speed = _ratio(row.speed_sum, row.speed_count)
+        vehicle_count = _ratio(row.vehicle_sum, row.vehicle_samples)
+        profiles.append({
             "hour": row.hour,
-            "avg_speed": round(row.avg_speed, 2) if row.avg_speed else 0,
-            "vehicle_count": int(row.vehicle_count) if row.vehicle_count else 0,
+            "avg_speed": round(avg_speed, 2) if avg_speed else 0,
+            "vehicle_count": int(vehicle_count) if vehicle_count else 0,
             "sample_size": row.sample_size
-        }
-        for row in results
-    ]
+        })
+    return profiles
 
 
 @router.get("/congestion-heatmap", response_model=List[CongestionHeatmap])
@@ -187,30 +205,35 @@ def get_congestion_heatmap(
 ):
     """Get congestion heatmap data for map visualization"""
     cutoff = datetime.now() - timedelta(hours=hours)
+    rollup = rollup_for(cutoff)
     
     # Calculate congestion score based on vehicle count and speed
     # Note: RoadNetwork doesn't have centroid_lat/lon, using dummy values for now
     query = db.query(
-        TrafficDynamics.road_segment_id,
+        rollup.road_segment_id,
         RoadNetwork.name,
-        func.avg(TrafficDynamics.vehicle_count).label('avg_vehicle_count'),
-        func.avg(TrafficDynamics.average_speed).label('avg_speed')
+        func.sum(rollup.vehicle_sum).label('vehicle_sum'),
+        func.sum(rollup.vehicle_samples).label('vehicle_samples'),
+        func.sum(rollup.speed_sum).label('speed_sum'),
+        func.sum(rollup.speed_count).label('speed_count')
     ).join(
-        RoadNetwork, TrafficDynamics.road_segment_id == RoadNetwork.id
+        RoadNetwork, rollup.road_segment_id == RoadNetwork.id
     ).filter(
-        TrafficDynamics.timestamp >= cutoff
+        rollup.bucket_start >= rollup_window_start(rollup, cutoff)
     ).group_by(
-        TrafficDynamics.road_segment_id
+        rollup.road_segment_id, RoadNetwork.name
     ).all()
     
     heatmap_data = []
     for row in query:
+        avg_vehicle_count = _ratio(row.vehicle_sum, row.vehicle_samples)
+        avg_speed = _ratio(row.speed_sum, row.speed_count)
         # Congestion score calculation:
         # Higher vehicle count = more congestion
         # Lower speed = more congestion
         # Normalized to 0-100 scale
-        vehicle_factor = min((row.avg_vehicle_count or 0) / 50, 1.0)  # Normalize to 0-1
-        speed_factor = 1 - min((row.avg_speed or 0) / 80, 1.0)  # Invert and normalize
+        vehicle_factor = min((avg_vehicle_count or 0) / 50, 1.0)  # Normalize to 0-1
+        speed_factor = 1 - min((avg_speed or 0) / 80, 1.0)  # Invert and normalize
         congestion_score = ((vehicle_factor * 0.6) + (speed_factor * 0.4)) * 100
         
         if congestion_score >= min_congestion:
@@ -221,7 +244,7 @@ def get_congestion_heatmap(
                     lat=23.0225,  # Default Ahmedabad center (will use real data later)
                     lon=72.5714,
                     congestion_score=round(congestion_score, 2),
-                    avg_vehicle_count=int(row.avg_vehicle_count or 0)
+                    avg_vehicle_count=int(avg_vehicle_count or 0)
                 )
             )
     
@@ -234,9 +257,16 @@ def get_congestion_heatmap(
 @router.get("/summary")
 def get_analytics_summary(db: Session = Depends(get_db)):
     """Get overall analytics summary"""
+    # All-time figures come from the hourly rollup, which outlives raw-data retention
+    rollup = TrafficRollup1h
     total_segments = db.query(func.count(RoadNetwork.id)).scalar() or 0
-    total_records = db.query(func.count(TrafficDynamics.id)).scalar() or 0
-    avg_speed = db.query(func.avg(TrafficDynamics.average_speed)).scalar()
+    totals = db.query(
+        func.sum(rollup.sample_count).label('sample_count'),
+        func.sum(rollup.speed_sum).label('speed_sum'),
+        func.sum(rollup.speed_count).label('speed_count')
+    ).one()
+    total_records = totals.sample_count or 0
+    avg_speed = _ratio(totals.speed_sum, totals.speed_count)
     
     # If no data, return mock summary
     if total_records == 0:
@@ -249,22 +279,23 @@ def get_analytics_summary(db: Session = Depends(get_db)):
         }
     
     # Most congested segment (highest vehicle count)
+    avg_count = func.sum(rollup.vehicle_sum) * 1.0 / func.sum(rollup.vehicle_samples)
     most_congested = db.query(
         RoadNetwork.name,
-        func.avg(TrafficDynamics.vehicle_count).label('avg_count')
+        avg_count.label('avg_count')
     ).join(
-        TrafficDynamics, RoadNetwork.id == TrafficDynamics.road_segment_id
+        rollup, RoadNetwork.id == rollup.road_segment_id
     ).group_by(
-        RoadNetwork.id
+        RoadNetwork.id, RoadNetwork.name
     ).order_by(
-        func.avg(TrafficDynamics.vehicle_count).desc()
+        avg_count.desc()
     ).first()
     
     # Peak hour (most traffic)
     peak_hour_result = db.query(
-        func.cast(func.strftime('%H', TrafficDynamics.timestamp), int).label('hour'),
-        func.sum(TrafficDynamics.vehicle_count).label('total_count')
-    ).group_by('hour').order_by(func.sum(TrafficDynamics.vehicle_count).desc()).first()
+        hour_of_day(rollup.bucket_start).label('hour'),
+        func.sum(rollup.vehicle_sum).label('total_count')
+    ).group_by('hour').order_by(func.sum(rollup.vehicle_sum).desc()).first()
     
     return {
         "total_road_segments": total_segments,
@@ -275,54 +306,114 @@ def get_analytics_summary(db: Session = Depends(get_db)):
     }
 
 
+# Rows fetched per round-trip and written per response chunk by the export
+EXPORT_BATCH_ROWS = 1000
+
+_EXPORT_CSV_HEADER = ["timestamp", "road_name", "vehicle_count", "avg_speed_kmh", "congestion_state", "flow_entropy"]
+
+
+def _export_record(row) -> Dict:
+    return {
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+        "road_name": row.name,
+        "vehicle_count": row.vehicle_count,
+        "avg_speed_kmh": row.average_speed,
+        "congestion_state": row.congestion_state,
+        "flow_entropy": row.flow_entropy
+    }
+
+
+def _export_chunks(rows, format: str) -> Iterator[str]:
+    """Serialize export rows EXPORT_BATCH_ROWS at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if format == "csv":
+        writer.writerow(_EXPORT_CSV_HEADER)
+    elif format == "json":
+        buffer.write('{"data": [')
+    
+    count = 0
+    for row in rows:
+        if format == "csv":
+            writer.writerow([row.timestamp, row.name, row.vehicle_count, row.average_speed,
+                             row.congestion_state, row.flow_entropy])
+        elif format == "ndjson":
+            buffer.write(json.dumps(_export_record(row)) + "\n")
+        else:
+            buffer.write((", " if count else "") + json.dumps(_export_record(row)))
+        count += 1
+        if count % EXPORT_BATCH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if format == "json":
+        buffer.write(f'], "total_records": {count}}}')
+    yield buffer.getvalue()
+
+
+def _gzip_chunks(chunks: Iterator[str]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _accepts_gzip(request: Request) -> bool:
+    """Whether Accept-Encoding allows gzip (listed, and not with q=0)."""
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() == "gzip":
+            quality = params.strip().partition("q=")[2]
+            try:
+                return float(quality or 1) > 0
+            except ValueError:
+                return True
+    return False
+
+
 @router.get("/export/traffic-data")
 def export_traffic_data(
+    request: Request,
     hours: int = Query(24, ge=1, le=168),
-    format: str = Query("csv", regex="^(csv|json)$"),
+    format: str = Query("csv", pattern="^(csv|json|ndjson)$"),
     db: Session = Depends(get_db)
 ):
-    """Export traffic data in CSV or JSON format"""
+    """
+    Export traffic data in CSV, JSON or NDJSON format.
+    
+    Rows are streamed from a server-side cursor EXPORT_BATCH_ROWS at a time and
+    gzip-compressed when the client accepts it, so memory use does not depend
+    on the time window.
+    """
     cutoff = datetime.now() - timedelta(hours=hours)
+    # The stream outlives this call, so it reads through its own session on the same database
+    bind = db.get_bind()
     
-    query = db.query(
-        TrafficDynamics.timestamp,
-        RoadNetwork.name,
-        TrafficDynamics.vehicle_count,
-        TrafficDynamics.average_speed,
-        TrafficDynamics.congestion_state,
-        TrafficDynamics.flow_entropy
-    ).join(
-        RoadNetwork, TrafficDynamics.road_segment_id == RoadNetwork.id
-    ).filter(
-        TrafficDynamics.timestamp >= cutoff
-    ).order_by(TrafficDynamics.timestamp).all()
+    def rows():
+        with Session(bind=bind) as export_db:
+            yield from export_db.query(
+                TrafficDynamics.timestamp,
+                RoadNetwork.name,
+                TrafficDynamics.vehicle_count,
+                TrafficDynamics.average_speed,
+                TrafficDynamics.congestion_state,
+                TrafficDynamics.flow_entropy
+            ).join(
+                RoadNetwork, TrafficDynamics.road_segment_id == RoadNetwork.id
+            ).filter(
+                TrafficDynamics.timestamp >= cutoff
+            ).order_by(TrafficDynamics.timestamp).yield_per(EXPORT_BATCH_ROWS)
     
+    media_types = {"csv": "text/csv", "json": "application/json", "ndjson": "application/x-ndjson"}
+    headers = {"Vary": "Accept-Encoding"}
     if format == "csv":
-        # Generate CSV
-        csv_lines = ["timestamp,road_name,vehicle_count,avg_speed_kmh,congestion_state,flow_entropy"]
-        for row in query:
-            csv_lines.append(
-                f"{row.timestamp},{row.name},{row.vehicle_count},{row.average_speed},"
-                f"{row.congestion_state},{row.flow_entropy}"
-            )
-        
-        from fastapi.responses import Response
-        return Response(
-            content="\n".join(csv_lines),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=traffic_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-        )
-    else:
-        # JSON format
-        data = [
-            {
-                "timestamp": row.timestamp.isoformat(),
-                "road_name": row.name,
-                "vehicle_count": row.vehicle_count,
-                "avg_speed_kmh": row.average_speed,
-                "congestion_state": row.congestion_state,
-                "flow_entropy": row.flow_entropy
-            }
-            for row in query
-        ]
-        return {"data": data, "total_records": len(data)}
+        headers["Content-Disposition"] = f"attachment; filename=traffic_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    
+    body = _export_chunks(rows(), format)
+    if _accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+        body = _gzip_chunks(body)
+    return StreamingResponse(body, media_type=media_types[format], headers=headers)
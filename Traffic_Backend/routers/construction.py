@@ -11,7 +11,7 @@ from typing import List, Optional, Dict, Any
 from datetime import date
 import logging
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, or_
 
 # Import our Mapbox service module
 import sys
@@ -24,6 +24,7 @@ from mapbox_service import (
     validate_geojson_polygon
 )
 from db_config import get_db
+from zone_avoidance import AvoidanceZones
 
 logger = logging.getLogger("construction_router")
 
@@ -183,11 +184,39 @@ async def analyze_construction_impact(
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+def _load_avoidance_zones(
+    db: Session,
+    construction_zone_id: Optional[int],
+    avoid_polygon: Optional[Dict[str, Any]]
+) -> Optional[AvoidanceZones]:
+    """
+    Zones a diversion must stay out of: every active construction project,
+    the requested project (whatever its status) and an ad-hoc polygon.
+    """
+    from models import ConstructionProject
+    
+    condition = ConstructionProject.status == 'active'
+    if construction_zone_id is not None:
+        condition = or_(condition, ConstructionProject.id == construction_zone_id)
+    rows = db.query(ConstructionProject.id, ConstructionProject.zone_geojson).filter(condition).all()
+    
+    if construction_zone_id is not None and all(row.id != construction_zone_id for row in rows):
+        raise HTTPException(status_code=404, detail=f"Construction project {construction_zone_id} not found")
+    
+    polygons = [row.zone_geojson for row in rows]
+    if avoid_polygon:
+        polygons.append(avoid_polygon)
+    return AvoidanceZones.from_geojson(polygons) if polygons else None
+
+
 @router.post("/diversion-routes")
-async def calculate_diversion_routes(request: DiversionRouteRequest):
+async def calculate_diversion_routes(request: DiversionRouteRequest, db: Session = Depends(get_db)):
     """
     Calculate alternative routes avoiding construction zone.
     
+    Routes entering any active construction zone, the zone of
+    construction_zone_id or avoid_polygon are excluded.
+    
     Government Use Case:
     - Traffic controller selects origin and destination
     - System finds 3 best alternative routes
@@ -196,12 +225,15 @@ async def calculate_diversion_routes(request: DiversionRouteRequest):
     logger.info(f"Calculating diversion routes from {request.origin} to {request.destination}")
     
     try:
+        avoid_zones = _load_avoidance_zones(db, request.construction_zone_id, request.avoid_polygon)
+        
         # Call Mapbox service to get alternative routes
         routes_data = await get_diversion_routes(
             origin=tuple(request.origin),
             destination=tuple(request.destination),
             avoid_polygon=request.avoid_polygon,
-            alternatives=3
+            alternatives=3,
+            avoid_zones=avoid_zones
         )
         
         # Enhance response with traffic analysis
@@ -217,7 +249,8 @@ async def calculate_diversion_routes(request: DiversionRouteRequest):
             "analysis": {
                 "total_alternatives": len(enhanced_routes),
                 "fastest_route_id": enhanced_routes[0]["id"] if enhanced_routes else None,
-                "shortest_route_id": min(enhanced_routes, key=lambda r: r["distance_km"])["id"] if enhanced_routes else None
+                "shortest_route_id": min(enhanced_routes, key=lambda r: r["distance_km"])["id"] if enhanced_routes else None,
+                "zones_avoided": len(avoid_zones) if avoid_zones is not None else 0
             }
         }
         
@@ -5,10 +5,14 @@ from shapely.geometry import LineString, Point
 import Traffic_Backend.models as models
 from Traffic_Backend.db_config import SessionLocal
 from Traffic_Backend.auth import require_role
+from Traffic_Backend.road_routing import (
+    BudgetExceeded, RoutePath, SearchBudget, bidirectional_astar_path, k_shortest_paths, node_haversine_m,
+)
 from sqlalchemy.orm import Session
 import networkx as nx
 import random
 import os
+import time
 import httpx
 import json
 from urllib.parse import quote
@@ -16,10 +20,28 @@ import sys
 
 # Import centralized Mapbox service
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
-from mapbox_service import get_diversion_routes
+from mapbox_service import get_diversion_routes, get_http_client, get_cache_stats, geocode_cache, mapbox_get, get_local_router
 
 router = APIRouter(prefix="/routes", tags=["routes"])
 
+# Edge attribute minimized by routing on the in-process graph (haversine meters)
+ROUTING_WEIGHT = 'length_m'
+
+# Per-request limits for alternative-route search on the in-process graph
+ALTERNATIVES_TIME_BUDGET_S = 0.5
+ALTERNATIVES_MAX_EXPANSIONS = 200_000
+
+# Per-request limits for a single shortest-path query
+SHORTEST_PATH_TIME_BUDGET_S = 0.5
+SHORTEST_PATH_MAX_EXPANSIONS = 500_000
+
+# Origin/destination pairs accepted by one /routes/distances request
+ROUTE_DISTANCES_MAX_PAIRS = 1000
+
+# Seconds all A* searches of one /routes/distances request may take together
+# (without a contraction hierarchy); pairs left when it runs out are null
+ROUTE_DISTANCES_TIME_BUDGET_S = 5.0
+
 
 def get_db():
     db = SessionLocal()
@@ -109,6 +131,23 @@ class AlternativeRoute(BaseModel):
     rank: int
 
 
+class ShortestRouteResponse(BaseModel):
+    distance_km: float
+    num_segments: int
+    coordinates: List[List[float]]  # [lon, lat] of each graph node along the route
+
+
+class ODPair(BaseModel):
+    start_lon: float
+    start_lat: float
+    end_lon: float
+    end_lat: float
+
+
+class RouteDistancesRequest(BaseModel):
+    pairs: List[ODPair]
+
+
 class RecommendationResponse(BaseModel):
     route_id: int
     recommended_alternative_id: Optional[int]
@@ -116,8 +155,13 @@ class RecommendationResponse(BaseModel):
     recommendation_justification: str
 
 
-def _find_nearest_node(point: tuple, graph: nx.DiGraph) -> Optional[tuple]:
-    """Find nearest graph node to a (lon, lat) coordinate."""
+def _find_nearest_node(point: tuple, graph: nx.DiGraph, csr=None) -> Optional[tuple]:
+    """Find nearest graph node to a (lon, lat) coordinate.
+
+    Uses the KD-tree of the compact CSR graph when it is available.
+    """
+    if csr is not None:
+        return _find_nearest_nodes([point], graph, csr)[0]
     if not graph or len(graph.nodes()) == 0:
         return None
     min_dist = float('inf')
@@ -131,32 +175,68 @@ def _find_nearest_node(point: tuple, graph: nx.DiGraph) -> Optional[tuple]:
     return nearest
 
 
-def _find_alternatives(start_node: tuple, end_node: tuple, graph: nx.DiGraph, k: int = 3) -> List[List[tuple]]:
-    """Find k shortest paths between start and end nodes."""
-    if not graph or start_node not in graph.nodes() or end_node not in graph.nodes():
+def _find_nearest_nodes(points: List[tuple], graph: nx.DiGraph, csr=None) -> List[Optional[tuple]]:
+    """Find the nearest graph node for many (lon, lat) coordinates in one KD-tree query."""
+    if csr is None and hasattr(graph, "nearest_nodes"):
+        # The routing graph is itself a CSRRoadGraph
+        csr = graph
+    if csr is None:
+        return [_find_nearest_node(point, graph) for point in points]
+    if not points:
         return []
-    try:
-        # Get k shortest simple paths
-        paths = list(nx.all_simple_paths(graph, start_node, end_node, cutoff=20))
-        # Sort by path length and return top k
-        paths.sort(key=lambda p: sum(graph[p[i]][p[i+1]].get('length', 0) for i in range(len(p)-1)))
-        return paths[:k]
-    except (nx.NetworkXNoPath, nx.NodeNotFound):
+    lons, lats = zip(*points)
+    nodes, _ = csr.nearest_nodes(lons, lats)
+    return [csr.node_key(int(n)) if n >= 0 else None for n in nodes]
+
+
+def _resolve_od_pairs(pairs: List[tuple], graph: nx.DiGraph, csr=None) -> List[tuple]:
+    """
+    Resolve (origin, destination) coordinate pairs to (start_node, end_node) pairs.
+    All origins and destinations are looked up in a single batch.
+    """
+    points = [p for pair in pairs for p in pair]
+    nodes = _find_nearest_nodes(points, graph, csr)
+    return list(zip(nodes[0::2], nodes[1::2]))
+
+
+def _find_alternatives(start_node: tuple, end_node: tuple, graph: nx.DiGraph, k: int = 3) -> List[RoutePath]:
+    """
+    Find up to k shortest loopless paths between start and end nodes.
+
+    The first path comes from bidirectional A* with a haversine bound; the rest
+    from Yen's spur searches. The search is bounded by ALTERNATIVES_TIME_BUDGET_S
+    and ALTERNATIVES_MAX_EXPANSIONS; if the budget runs out, the paths found so
+    far are returned.
+    """
+    if not graph or start_node not in graph or end_node not in graph:
         return []
+    budget = SearchBudget(ALTERNATIVES_TIME_BUDGET_S, ALTERNATIVES_MAX_EXPANSIONS)
+    paths = k_shortest_paths(
+        graph, start_node, end_node, k=k, weight=ROUTING_WEIGHT, budget=budget, heuristic=node_haversine_m
+    )
+    return [RoutePath.from_nodes(graph, path, cost) for cost, path in paths]
 
 
-def _score_alternative(path: List[tuple], graph: nx.DiGraph, db: Session) -> float:
+def _score_alternative(route: RoutePath, db: Session) -> float:
     """Score an alternative route based on length and traffic."""
-    if len(path) < 2:
+    if route.num_segments < 1:
         return 0.0
-    # Calculate path length
-    path_length = sum(graph[path[i]][path[i+1]].get('length', 0) for i in range(len(path)-1))
     # For now, score is inverse of length (shorter is better)
     # Future: incorporate traffic data from DB
-    score = 1.0 / (1.0 + path_length)
+    score = 1.0 / (1.0 + route.length)
     return score
 
 
+def _build_alternatives(routes: List[RoutePath], db: Session) -> List[AlternativeRoute]:
+    """Serialize found routes as ranked AlternativeRoute entries."""
+    alternatives = []
+    for idx, route in enumerate(routes):
+        approx_km = round(route.length * 111, 4)
+        score = _score_alternative(route, db)
+        alternatives.append(AlternativeRoute(route_id=idx, length_km=approx_km, num_segments=route.num_segments, suitability_score=score, rank=idx+1))
+    return alternatives
+
+
 @router.post("/analyze", response_model=RouteAnalysisResponse)
 def analyze_route(payload: RouteAnalyzeRequest, db: Session = Depends(get_db)):
     """
@@ -269,6 +349,103 @@ def _estimate_traffic_counts(distance_km: float, road_props: RoadProperties) ->
     )
 
 
+@router.get("/shortest", response_model=ShortestRouteResponse)
+def shortest_route(start_lon: float, start_lat: float, end_lon: float, end_lat: float):
+    """
+    Shortest route on the uploaded road network.
+    Served from the contraction hierarchy when one was built, otherwise by bidirectional A*.
+    """
+    from Traffic_Backend.main import road_network_csr, road_network_ch
+
+    if road_network_csr is None or road_network_csr.num_nodes == 0:
+        raise HTTPException(status_code=400, detail="Road network not loaded")
+
+    if road_network_ch is not None:
+        nodes, _ = road_network_csr.nearest_nodes([start_lon, end_lon], [start_lat, end_lat])
+        result = road_network_ch.shortest_path(int(nodes[0]), int(nodes[1]))
+        if result is None:
+            raise HTTPException(status_code=404, detail="No route between start and end coordinates")
+        cost_m, path = result
+        coordinates = road_network_csr.node_coords[path].tolist()
+    else:
+        [(start_node, end_node)] = _resolve_od_pairs(
+            [((start_lon, start_lat), (end_lon, end_lat))], road_network_csr
+        )
+
+        if not start_node or not end_node:
+            raise HTTPException(status_code=400, detail="Could not locate start or end coordinate on road network")
+
+        budget = SearchBudget(SHORTEST_PATH_TIME_BUDGET_S, SHORTEST_PATH_MAX_EXPANSIONS)
+        try:
+            result = bidirectional_astar_path(road_network_csr, start_node, end_node, weight=ROUTING_WEIGHT, budget=budget)
+        except BudgetExceeded:
+            raise HTTPException(status_code=504, detail="Route search exceeded its time budget")
+
+        if result is None:
+            raise HTTPException(status_code=404, detail="No route between start and end coordinates")
+        cost_m, path = result
+        coordinates = [[lon, lat] for lon, lat in path]
+
+    return ShortestRouteResponse(
+        distance_km=round(cost_m / 1000, 4),
+        num_segments=len(path) - 1,
+        coordinates=coordinates,
+    )
+
+
+@router.post("/distances")
+def route_distances(request: RouteDistancesRequest):
+    """
+    Road-network distances for many origin/destination pairs in one call.
+    Each entry is null when the pair is unreachable. Without a contraction
+    hierarchy, pairs are searched one by one under ROUTE_DISTANCES_TIME_BUDGET_S
+    for the whole request: a pair whose search ran out of budget, and every pair
+    after the request budget is spent, is null and "complete" is false.
+    """
+    from Traffic_Backend.main import road_network_csr, road_network_ch
+
+    if road_network_csr is None or road_network_csr.num_nodes == 0:
+        raise HTTPException(status_code=400, detail="Road network not loaded")
+
+    if len(request.pairs) > ROUTE_DISTANCES_MAX_PAIRS:
+        raise HTTPException(status_code=400, detail=f"Maximum {ROUTE_DISTANCES_MAX_PAIRS} pairs allowed")
+
+    distances_m = []
+    complete = True
+    if road_network_ch is not None:
+        lons = [lon for p in request.pairs for lon in (p.start_lon, p.end_lon)]
+        lats = [lat for p in request.pairs for lat in (p.start_lat, p.end_lat)]
+        nodes, _ = road_network_csr.nearest_nodes(lons, lats)
+        nodes = nodes.tolist()
+        for start, end in zip(nodes[0::2], nodes[1::2]):
+            distances_m.append(road_network_ch.distance(start, end) if start >= 0 and end >= 0 else None)
+    else:
+        od_nodes = _resolve_od_pairs(
+            [((p.start_lon, p.start_lat), (p.end_lon, p.end_lat)) for p in request.pairs],
+            road_network_csr
+        )
+        deadline = time.perf_counter() + ROUTE_DISTANCES_TIME_BUDGET_S
+        for start_node, end_node in od_nodes:
+            remaining_s = deadline - time.perf_counter()
+            if remaining_s <= 0:
+                distances_m.append(None)
+                complete = False
+                continue
+            budget = SearchBudget(min(SHORTEST_PATH_TIME_BUDGET_S, remaining_s), SHORTEST_PATH_MAX_EXPANSIONS)
+            try:
+                result = bidirectional_astar_path(road_network_csr, start_node, end_node, weight=ROUTING_WEIGHT, budget=budget)
+            except BudgetExceeded:
+                result = None
+                complete = False
+            distances_m.append(result[0] if result is not None else None)
+
+    return {
+        "distances_km": [round(d / 1000, 4) if d is not None else None for d in distances_m],
+        "contraction_hierarchy": road_network_ch is not None,
+        "complete": complete
+    }
+
+
 @router.get("/{route_id}/metrics")
 def route_metrics(route_id: int, db: Session = Depends(get_db)):
     segment = db.query(models.RoadNetwork).filter(models.RoadNetwork.id == route_id).first()
@@ -296,31 +473,27 @@ def route_metrics(route_id: int, db: Session = Depends(get_db)):
 def route_alternatives(route_id: int, start_lon: float, start_lat: float, end_lon: float, end_lat: float, db: Session = Depends(get_db)):
     """Get alternative routes between start and end coordinates."""
     # Import here to avoid circular imports
-    from Traffic_Backend.main import road_network_graph
+    from Traffic_Backend.main import road_network_csr
     
-    if road_network_graph is None or len(road_network_graph.nodes()) == 0:
+    if road_network_csr is None or road_network_csr.num_nodes == 0:
         raise HTTPException(status_code=400, detail="Road network not loaded")
 
-    # Find nearest nodes
-    start_node = _find_nearest_node((start_lon, start_lat), road_network_graph)
-    end_node = _find_nearest_node((end_lon, end_lat), road_network_graph)
+    # Find nearest nodes (one KD-tree query for both ends)
+    [(start_node, end_node)] = _resolve_od_pairs(
+        [((start_lon, start_lat), (end_lon, end_lat))], road_network_csr
+    )
     
     if not start_node or not end_node:
         raise HTTPException(status_code=400, detail="Could not locate start or end coordinate on road network")
 
     # Find alternative paths
-    paths = _find_alternatives(start_node, end_node, road_network_graph, k=3)
+    routes = _find_alternatives(start_node, end_node, road_network_csr, k=3)
     
-    if not paths:
+    if not routes:
         return {"route_id": route_id, "alternatives": []}
 
     # Score and rank alternatives
-    alternatives = []
-    for idx, path in enumerate(paths):
-        path_length = sum(road_network_graph[path[i]][path[i+1]].get('length', 0) for i in range(len(path)-1))
-        approx_km = round(path_length * 111, 4)
-        score = _score_alternative(path, road_network_graph, db)
-        alternatives.append(AlternativeRoute(route_id=idx, length_km=approx_km, num_segments=len(path)-1, suitability_score=score, rank=idx+1))
+    alternatives = _build_alternatives(routes, db)
 
     return {"route_id": route_id, "alternatives": alternatives}
 
@@ -328,28 +501,24 @@ def route_alternatives(route_id: int, start_lon: float, start_lat: float, end_lo
 @router.post("/{route_id}/recommend", response_model=RecommendationResponse)
 def route_recommend(route_id: int, start_lon: float, start_lat: float, end_lon: float, end_lat: float, db: Session = Depends(get_db)):
     """Get recommended alternative route based on suitability scoring."""
-    from Traffic_Backend.main import road_network_graph
+    from Traffic_Backend.main import road_network_csr
     
-    if road_network_graph is None or len(road_network_graph.nodes()) == 0:
+    if road_network_csr is None or road_network_csr.num_nodes == 0:
         raise HTTPException(status_code=400, detail="Road network not loaded")
 
-    start_node = _find_nearest_node((start_lon, start_lat), road_network_graph)
-    end_node = _find_nearest_node((end_lon, end_lat), road_network_graph)
+    [(start_node, end_node)] = _resolve_od_pairs(
+        [((start_lon, start_lat), (end_lon, end_lat))], road_network_csr
+    )
     
     if not start_node or not end_node:
         raise HTTPException(status_code=400, detail="Could not locate start or end coordinate on road network")
 
-    paths = _find_alternatives(start_node, end_node, road_network_graph, k=3)
+    routes = _find_alternatives(start_node, end_node, road_network_csr, k=3)
     
-    if not paths:
+    if not routes:
         return RecommendationResponse(route_id=route_id, recommended_alternative_id=None, all_alternatives=[], recommendation_justification="No alternative routes found")
 
-    alternatives = []
-    for idx, path in enumerate(paths):
-        path_length = sum(road_network_graph[path[i]][path[i+1]].get('length', 0) for i in range(len(path)-1))
-        approx_km = round(path_length * 111, 4)
-        score = _score_alternative(path, road_network_graph, db)
-        alternatives.append(AlternativeRoute(route_id=idx, length_km=approx_km, num_segments=len(path)-1, suitability_score=score, rank=idx+1))
+    alternatives = _build_alternatives(routes, db)
 
     # Recommend the highest-scoring alternative
     best_alt = max(alternatives, key=lambda a: a.suitability_score)
@@ -369,6 +538,10 @@ async def geocode_forward(query: str):
     Returns:
         List of matching locations with coordinates
     """
+    cached = await geocode_cache.get_forward_async(query)
+    if cached is not None:
+        return {"query": query, "results": cached}
+
     mapbox_token = os.getenv("MAPBOX_ACCESS_TOKEN")
     if not mapbox_token:
         return {"error": "Mapbox token not configured", "results": []}
@@ -385,30 +558,30 @@ async def geocode_forward(query: str):
             "types": "place,locality,neighborhood,address,poi"
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, params=params)
-            if response.status_code != 200:
-                # Surface Mapbox error details to aid debugging
-                return {
-                    "error": f"Geocoding failed: status {response.status_code}",
-                    "details": response.text,
-                    "results": []
-                }
-            data = response.json()
-            
-            results = []
-            for feature in data.get("features", []):
-                coords = feature["geometry"]["coordinates"]
-                results.append({
-                    "place_name": feature["place_name"],
-                    "lon": coords[0],
-                    "lat": coords[1],
-                    "type": feature.get("place_type", ["unknown"])[0],
-                    "relevance": feature.get("relevance", 0)
-                })
-            
-            return {"query": query, "results": results}
-    
+        response = await mapbox_get("geocoding", url, params, timeout=10.0)
+        if response.status_code != 200:
+            # Surface Mapbox error details to aid debugging
+            return {
+                "error": f"Geocoding failed: status {response.status_code}",
+                "details": response.text,
+                "results": []
+            }
+        data = response.json()
+        
+        results = []
+        for feature in data.get("features", []):
+            coords = feature["geometry"]["coordinates"]
+            results.append({
+                "place_name": feature["place_name"],
+                "lon": coords[0],
+                "lat": coords[1],
+                "type": feature.get("place_type", ["unknown"])[0],
+                "relevance": feature.get("relevance", 0)
+            })
+        
+        geocode_cache.put_forward(query, results)
+        return {"query": query, "results": results}
+
     except httpx.HTTPError as e:
         return {"error": f"Geocoding failed: {str(e)}", "results": []}
 
@@ -425,6 +598,10 @@ async def geocode_reverse(lon: float, lat: float):
     Returns:
         Address information for the location
     """
+    cached = await geocode_cache.get_reverse_async(lon, lat)
+    if cached is not None:
+        return {"address": cached["address"], "lon": lon, "lat": lat, **({"type": cached["type"]} if "type" in cached else {})}
+
     mapbox_token = os.getenv("MAPBOX_ACCESS_TOKEN")
     if not mapbox_token:
         return {"error": "Mapbox token not configured", "address": "Unknown"}
@@ -436,31 +613,39 @@ async def geocode_reverse(lon: float, lat: float):
             "types": "address,place,locality,neighborhood"
         }
         
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(url, params=params)
-            if response.status_code != 200:
-                return {
-                    "error": f"Reverse geocoding failed: status {response.status_code}",
-                    "details": response.text,
-                    "address": "Unknown"
-                }
-            data = response.json()
-            
-            if data.get("features"):
-                feature = data["features"][0]
-                return {
-                    "address": feature["place_name"],
-                    "lon": lon,
-                    "lat": lat,
-                    "type": feature.get("place_type", ["unknown"])[0]
-                }
-            else:
-                return {"address": "Unknown location", "lon": lon, "lat": lat}
-    
+        response = await mapbox_get("geocoding", url, params, timeout=10.0)
+        if response.status_code != 200:
+            return {
+                "error": f"Reverse geocoding failed: status {response.status_code}",
+                "details": response.text,
+                "address": "Unknown"
+            }
+        data = response.json()
+        
+        if data.get("features"):
+            feature = data["features"][0]
+            place_type = feature.get("place_type", ["unknown"])[0]
+            geocode_cache.put_reverse(lon, lat, {"address": feature["place_name"], "type": place_type})
+            return {
+                "address": feature["place_name"],
+                "lon": lon,
+                "lat": lat,
+                "type": place_type
+            }
+        else:
+            geocode_cache.put_reverse(lon, lat, {"address": "Unknown location"})
+            return {"address": "Unknown location", "lon": lon, "lat": lat}
+
     except httpx.HTTPError as e:
         return {"error": f"Reverse geocoding failed: {str(e)}", "address": "Unknown"}
 
 
+@router.get("/cache-stats")
+def mapbox_cache_stats():
+    """Hit/miss counters of the Mapbox response caches."""
+    return get_cache_stats()
+
+
 @router.get("/isochrone")
 async def get_isochrone(
     lon: float,
@@ -494,19 +679,18 @@ async def get_isochrone(
             "access_token": mapbox_token
         }
         
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(url, params=params)
-            if response.status_code != 200:
-                return {"error": f"Isochrone failed: status {response.status_code}", "details": response.text}
-            data = response.json()
-            
-            return {
-                "isochrone": data,
-                "center": {"lon": lon, "lat": lat},
-                "minutes": contours_minutes,
-                "profile": profile
-            }
-    
+        response = await mapbox_get("isochrone", url, params, timeout=15.0)
+        if response.status_code != 200:
+            return {"error": f"Isochrone failed: status {response.status_code}", "details": response.text}
+        data = response.json()
+        
+        return {
+            "isochrone": data,
+            "center": {"lon": lon, "lat": lat},
+            "minutes": contours_minutes,
+            "profile": profile
+        }
+
     except httpx.HTTPError as e:
         return {"error": f"Isochrone failed: {str(e)}"}
 
@@ -538,19 +722,18 @@ async def get_travel_matrix(request: MatrixRequest):
             "access_token": mapbox_token
         }
         
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(url, params=params)
-            if response.status_code != 200:
-                return {"error": f"Matrix API failed: status {response.status_code}", "details": response.text}
-            data = response.json()
-            
-            return {
-                "durations": data.get("durations", []),  # seconds
-                "distances": data.get("distances", []),  # meters
-                "sources": request.coordinates,
-                "destinations": request.coordinates
-            }
-    
+        response = await mapbox_get("matrix", url, params, timeout=20.0)
+        if response.status_code != 200:
+            return {"error": f"Matrix API failed: status {response.status_code}", "details": response.text}
+        data = response.json()
+        
+        return {
+            "durations": data.get("durations", []),  # seconds
+            "distances": data.get("distances", []),  # meters
+            "sources": request.coordinates,
+            "destinations": request.coordinates
+        }
+
     except httpx.HTTPError as e:
         return {"error": f"Matrix API failed: {str(e)}"}
 
@@ -588,24 +771,24 @@ async def map_match_gps(request: MapMatchingRequest):
             # Format: timestamp1;timestamp2;...
             params["timestamps"] = ";".join(request.timestamps)
         
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(url, params=params)
-            if response.status_code != 200:
-                return {"error": f"Map matching failed: status {response.status_code}", "details": response.text}
-            data = response.json()
-            
-            if data.get("matchings"):
-                matching = data["matchings"][0]
-                return {
-                    "matched_route": matching["geometry"],
-                    "distance": matching["distance"],  # meters
-                    "duration": matching["duration"],  # seconds
-                    "confidence": matching.get("confidence", 0),
-                    "speeds": matching.get("legs", [{}])[0].get("annotation", {}).get("speed", [])
-                }
-            else:
-                return {"error": "No matching found"}
-    
+        client = get_http_client()
+        response = await client.get(url, params=params, timeout=20.0)
+        if response.status_code != 200:
+            return {"error": f"Map matching failed: status {response.status_code}", "details": response.text}
+        data = response.json()
+        
+        if data.get("matchings"):
+            matching = data["matchings"][0]
+            return {
+                "matched_route": matching["geometry"],
+                "distance": matching["distance"],  # meters
+                "duration": matching["duration"],  # seconds
+                "confidence": matching.get("confidence", 0),
+                "speeds": matching.get("legs", [{}])[0].get("annotation", {}).get("speed", [])
+            }
+        else:
+            return {"error": "No matching found"}
+
     except httpx.HTTPError as e:
         return {"error": f"Map matching failed: {str(e)}"}
 
@@ -625,9 +808,9 @@ async def recommend_routes(payload: RouteAnalyzeRequest, db: Session = Depends(g
     # Check if Mapbox token is available
     mapbox_token = os.getenv('MAPBOX_ACCESS_TOKEN')
     
-    if not mapbox_token:
-        # Fallback to mock if no Mapbox token
-        print("[routes.recommend] No MAPBOX_ACCESS_TOKEN found, using mock data")
+    if not mapbox_token and get_local_router() is None:
+        # Fallback to mock if neither Mapbox nor a local road network is available
+        print("[routes.recommend] No MAPBOX_ACCESS_TOKEN or local road network found, using mock data")
         return _generate_mock_alternatives(payload)
     
     try:
@@ -760,54 +943,54 @@ async def optimize_route(request: OptimizationRequest):
             "overview": "full"
         }
         
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(url, params=params)
-            if response.status_code != 200:
-                return {"error": f"Optimization failed: status {response.status_code}", "details": response.text}
-            data = response.json()
-            
-            if "trips" not in data or not data["trips"]:
-                return {"error": "No optimal route found"}
-            
-            trip = data["trips"][0]
-            
-            # Extract optimized order
-            waypoint_order = [wp["waypoint_index"] for wp in data.get("waypoints", [])]
-            optimized_stops = [request.coordinates[i] for i in waypoint_order]
-            
-            # Calculate savings vs unoptimized
-            duration = trip["duration"]  # seconds
-            distance = trip["distance"]  # meters
-            
-            return {
-                "optimized_route": {
-                    "geometry": trip["geometry"],
-                    "distance_km": round(distance / 1000, 2),
-                    "duration_min": round(duration / 60, 1),
-                    "stops": [
-                        {
-                            "order": i + 1,
-                            "name": stop.name or f"Stop {i + 1}",
-                            "lon": stop.lon,
-                            "lat": stop.lat
-                        }
-                        for i, stop in enumerate(optimized_stops)
-                    ]
-                },
-                "original_order": [
-                    {"name": stop.name or f"Stop {i + 1}", "lon": stop.lon, "lat": stop.lat}
-                    for i, stop in enumerate(request.coordinates)
-                ],
-                "waypoint_order": waypoint_order,
-                "summary": {
-                    "total_distance_km": round(distance / 1000, 2),
-                    "total_duration_min": round(duration / 60, 1),
-                    "num_stops": len(request.coordinates),
-                    "profile": request.profile,
-                    "roundtrip": request.roundtrip
-                }
+        client = get_http_client()
+        response = await client.get(url, params=params, timeout=15.0)
+        if response.status_code != 200:
+            return {"error": f"Optimization failed: status {response.status_code}", "details": response.text}
+        data = response.json()
+        
+        if "trips" not in data or not data["trips"]:
+            return {"error": "No optimal route found"}
+        
+        trip = data["trips"][0]
+        
+        # Extract optimized order
+        waypoint_order = [wp["waypoint_index"] for wp in data.get("waypoints", [])]
+        optimized_stops = [request.coordinates[i] for i in waypoint_order]
+        
+        # Calculate savings vs unoptimized
+        duration = trip["duration"]  # seconds
+        distance = trip["distance"]  # meters
+        
+        return {
+            "optimized_route": {
+                "geometry": trip["geometry"],
+                "distance_km": round(distance / 1000, 2),
+                "duration_min": round(duration / 60, 1),
+                "stops": [
+                    {
+                        "order": i + 1,
+                        "name": stop.name or f"Stop {i + 1}",
+                        "lon": stop.lon,
+                        "lat": stop.lat
+                    }
+                    for i, stop in enumerate(optimized_stops)
+                ]
+            },
+            "original_order": [
+                {"name": stop.name or f"Stop {i + 1}", "lon": stop.lon, "lat": stop.lat}
+                for i, stop in enumerate(request.coordinates)
+            ],
+            "waypoint_order": waypoint_order,
+            "summary": {
+                "total_distance_km": round(distance / 1000, 2),
+                "total_duration_min": round(duration / 60, 1),
+                "num_stops": len(request.coordinates),
+                "profile": request.profile,
+                "roundtrip": request.roundtrip
             }
-    
+        }
+
     except httpx.HTTPError as e:
         return {"error": f"Optimization failed: {str(e)}"}
     except Exception as e:
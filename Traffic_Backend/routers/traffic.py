@@ -1,15 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from typing import List, Optional
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 import random
+import logging
+import time
 import Traffic_Backend.models as models
+from Traffic_Backend.diagnostics import get_diagnostics_logger
+from Traffic_Backend.road_geometry_cache import road_geometry_cache
 from Traffic_Backend.db_config import SessionLocal
 from Traffic_Backend.auth import require_role, get_current_user
 
 router = APIRouter(prefix="/traffic", tags=["traffic"])
 
+logger = logging.getLogger("traffic_live")
+# Level-gated, queued diagnostics for the dashboard's most-polled endpoint (see diagnostics.py)
+diag = get_diagnostics_logger("traffic_live")
+
+# Seconds between warnings about segments /traffic/live had to skip; the same
+# broken rows fail on every poll, so the count in between is folded into the next one
+SEGMENT_ERROR_LOG_INTERVAL_S = 60.0
+_segment_errors = {"logged_at": None, "suppressed": 0}
+
+
+def _log_segment_errors(errors: List[tuple], total: int):
+    """Warn about segments skipped by one request, at most once per SEGMENT_ERROR_LOG_INTERVAL_S."""
+    now = time.monotonic()
+    logged_at = _segment_errors["logged_at"]
+    if logged_at is not None and now - logged_at < SEGMENT_ERROR_LOG_INTERVAL_S:
+        _segment_errors["suppressed"] += len(errors)
+        return
+    segment_id, error = errors[0]
+    suppressed = _segment_errors["suppressed"]
+    logger.warning(
+        "Skipped %d of %d segments in /traffic/live (first: segment %s: %s)%s",
+        len(errors), total, segment_id, error,
+        f"; {suppressed} more skipped since the last warning" if suppressed else "",
+    )
+    _segment_errors.update(logged_at=now, suppressed=0)
+
 
 def get_db():
     db = SessionLocal()
@@ -27,8 +57,8 @@ class TrafficThreshold(BaseModel):
 
 @router.get("/live/{route_id}")
 def traffic_live(route_id: int, db: Session = Depends(get_db)):
-    # Return the latest TrafficDynamics entry for route
-    entry = db.query(models.TrafficDynamics).filter(models.TrafficDynamics.road_segment_id == route_id).order_by(models.TrafficDynamics.timestamp.desc()).first()
+    # Latest reading of the route, kept in traffic_latest as readings are inserted
+    entry = db.get(models.TrafficLatest, route_id)
     if not entry:
         raise HTTPException(status_code=404, detail="No live data for this route")
     return {
@@ -86,199 +116,141 @@ def traffic_live_all(db: Session = Depends(get_db)):
     """
     Returns live traffic data for all segments with congestion levels.
     Generates mock data for Ahmedabad area if no real data exists.
+    
+    The latest reading of every segment and its road are read in one joined
+    query over traffic_latest, so neither the number of round-trips nor the
+    cost of the query grows with the network's traffic history.
+    Road geometries are parsed once and served from road_geometry_cache; the
+    query selects only each road's geometry_version, and geometry text is
+    fetched for the roads whose version changed since they were cached.
     """
     import json
-    import logging
-    from sqlalchemy import func
     
-    # Log to file for debugging
-    logger = logging.getLogger("traffic_live")
-    with open("traffic_endpoint_debug.log", "a") as f:
-        f.write(f"\n=== /live endpoint called at {datetime.now()} ===\n")
-        f.write(f"DB Engine URL: {db.bind.url}\n")
-        f.write(f"models.TrafficDynamics: {models.TrafficDynamics}\n")
-        f.write(f"models.TrafficDynamics.__tablename__: {models.TrafficDynamics.__tablename__}\n")
+    diag.debug("/live called; engine=%r table=%s", db.bind.url, models.TrafficLatest.__tablename__)
     
     try:
-        # First check if we have any traffic data at all
-        traffic_count = db.query(models.TrafficDynamics).count()
-        logger.info(f"DEBUG: Total TrafficDynamics records in DB: {traffic_count}")
-        with open("traffic_endpoint_debug.log", "a") as f:
-            f.write(f"Traffic count: {traffic_count}\n")
-            f.write(f"Query result type: {type(traffic_count)}\n")
-        
-        if traffic_count == 0:
-            logger.info("DEBUG: No traffic data, using mock")
-            with open("traffic_endpoint_debug.log", "a") as f:
-                f.write(f"No traffic data, returning mock\n")
-            mock_segments = _generate_mock_traffic_segments()
-            return {"segments": mock_segments, "timestamp": datetime.now().isoformat(), "mock": True}
-        
-        # Get latest traffic data for each road segment
-        with open("traffic_endpoint_debug.log", "a") as f:
-            f.write(f"Executing subquery...\n")
+        rows = _latest_traffic_with_roads(db).all()
+        diag.debug("Retrieved %d latest traffic entries", len(rows))
         
-        subquery = db.query(
-            models.TrafficDynamics.road_segment_id,
-            func.max(models.TrafficDynamics.timestamp).label('max_timestamp')
-        ).group_by(models.TrafficDynamics.road_segment_id).subquery()
-        
-        entries = db.query(models.TrafficDynamics).join(
-            subquery,
-            (models.TrafficDynamics.road_segment_id == subquery.c.road_segment_id) &
-            (models.TrafficDynamics.timestamp == subquery.c.max_timestamp)
-        ).all()
-        
-        logger.info(f"DEBUG: Retrieved {len(entries)} latest traffic entries")
-        with open("traffic_endpoint_debug.log", "a") as f:
-            f.write(f"Retrieved {len(entries)} entries\n")
-        
-        if not entries:
-            logger.info("DEBUG: Query returned 0 entries, using mock")
-            with open("traffic_endpoint_debug.log", "a") as f:
-                f.write(f"Entries is empty, returning mock\n")
+        if not rows:
+            diag.debug("No traffic data, returning mock")
             mock_segments = _generate_mock_traffic_segments()
             return {"segments": mock_segments, "timestamp": datetime.now().isoformat(), "mock": True}
         
-        # Return real data if available
-        with open("traffic_endpoint_debug.log", "a") as f:
-            f.write(f"Processing {len(entries)} entries\n")
-        
+        errors = []
+        geometries = _road_geometries(db, rows, errors)
         segments = []
-        for entry in entries:
+        for row in rows:
+            geometry = geometries.get(row.road_segment_id)
+            if geometry is None:
+                continue
+            if not geometry.coordinates:
+                diag.debug("Road %s has empty coordinates", row.road_segment_id)
+                continue
             try:
-                segment = db.query(models.RoadNetwork).filter(models.RoadNetwork.id == entry.road_segment_id).first()
-                if segment and segment.geometry:
-                    # Parse geometry JSON
-                    geom = json.loads(segment.geometry)
-                    coordinates = geom.get("coordinates", [])
-                    
-                    if not coordinates:
-                        logger.debug(f"DEBUG: Road {entry.road_segment_id} has empty coordinates")
-                        with open("traffic_endpoint_debug.log", "a") as f:
-                            f.write(f"Road {entry.road_segment_id} has empty coordinates\n")
-                        continue
-                    
-                    # Calculate congestion level (0.0 to 1.0) based on multiple factors
-                    congestion = 0.5  # default
-                    
-                    # Factor 1: Speed-based (lower speed = higher congestion)
-                    if entry.average_speed:
-                        speed_factor = max(0.0, min(1.0, 1.0 - (entry.average_speed / 80.0)))
-                    else:
-                        speed_factor = 0.5
-                    
-                    # Factor 2: Capacity-based (vehicle count vs base capacity)
-                    if segment.base_capacity and entry.vehicle_count:
-                        capacity_factor = min(1.0, entry.vehicle_count / segment.base_capacity)
-                    else:
-                        capacity_factor = 0.5
-                    
-                    # Factor 3: Congestion state
-                    state_map = {"free-flow": 0.2, "moderate": 0.5, "congested": 0.8, "heavy": 0.95}
-                    state_factor = state_map.get(entry.congestion_state, 0.5)
-                    
-                    # Weighted average: speed (40%), capacity (30%), state (30%)
-                    congestion = (speed_factor * 0.4 + capacity_factor * 0.3 + state_factor * 0.3)
-                    congestion = max(0.0, min(1.0, congestion))
-                    
-                    segments.append({
-                        "segment_id": f"seg_{entry.road_segment_id}",
-                        "name": segment.name or f"Road {entry.road_segment_id}",
-                        "coordinates": coordinates,
-                        "congestion_level": round(congestion, 2),
-                        "speed_kmh": round(entry.average_speed or 30, 1),
-                        "vehicle_count": entry.vehicle_count or 0,
-                        "timestamp": entry.timestamp.isoformat() if entry.timestamp else datetime.now().isoformat()
-                    })
-                    logger.debug(f"DEBUG: Added road {segment.name} with {len(coordinates)} points")
+                segments.append({
+                    "segment_id": f"seg_{row.road_segment_id}",
+                    "name": row.name or f"Road {row.road_segment_id}",
+                    "congestion_level": round(_congestion_level(row), 2),
+                    "speed_kmh": round(row.average_speed or 30, 1),
+                    "vehicle_count": row.vehicle_count or 0,
+                    "timestamp": row.timestamp.isoformat() if row.timestamp else datetime.now().isoformat(),
+                    "coordinates": geometry.coordinates,
+                })
             except Exception as segment_error:
-                logger.error(f"DEBUG: Error processing entry {entry.road_segment_id}: {segment_error}")
-                with open("traffic_endpoint_debug.log", "a") as f:
-                    f.write(f"Error processing entry {entry.road_segment_id}: {segment_error}\n")
+                diag.debug("Error processing entry %s: %s", row.road_segment_id, segment_error)
+                errors.append((row.road_segment_id, segment_error))
                 continue
         
-        logger.info(f"DEBUG: Returning {len(segments)} real traffic segments")
-        with open("traffic_endpoint_debug.log", "a") as f:
-            f.write(f"Returning {len(segments)} real segments\n")
+        if errors:
+            _log_segment_errors(errors, len(rows))
+        if len(road_geometry_cache) > len(rows):
+            road_geometry_cache.retain(row.road_segment_id for row in rows)
+        diag.debug("Returning %d real traffic segments", len(segments))
         
         if segments:
-            with open("traffic_endpoint_debug.log", "a") as f:
-                f.write(f"Returning real data response\n")
-            return {"segments": segments, "timestamp": datetime.now().isoformat()}
+            # Serialized directly: the cached coordinate lists need no jsonable_encoder pass
+            body = json.dumps({"segments": segments, "timestamp": datetime.now().isoformat()})
+            return Response(content=body, media_type="application/json")
         else:
-            logger.info("DEBUG: No valid segments built, using mock")
-            with open("traffic_endpoint_debug.log", "a") as f:
-                f.write(f"No valid segments, returning mock\n")
+            diag.debug("No valid segments, returning mock")
             mock_segments = _generate_mock_traffic_segments()
             return {"segments": mock_segments, "timestamp": datetime.now().isoformat(), "mock": True}
     
     except Exception as e:
-        logger.error(f"DEBUG: Exception in traffic_live_all: {e}")
-        with open("traffic_endpoint_debug.log", "a") as f:
-            f.write(f"EXCEPTION: {e}\n")
-        import traceback
-        logger.error(traceback.format_exc())
-        with open("traffic_endpoint_debug.log", "a") as f:
-            f.write(f"Traceback:\n{traceback.format_exc()}\n")
+        logger.exception(f"Exception in traffic_live_all: {e}")
         # Fallback to mock
         mock_segments = _generate_mock_traffic_segments()
         return {"segments": mock_segments, "timestamp": datetime.now().isoformat(), "mock": True}
-        # Return real data if available
-        segments = []
-        for entry in entries:
-            segment = db.query(models.RoadNetwork).filter(models.RoadNetwork.id == entry.road_segment_id).first()
-            if segment and segment.geometry:
-                try:
-                    # Parse geometry JSON
-                    geom = json.loads(segment.geometry)
-                    coordinates = geom.get("coordinates", [])
-                    
-                    if not coordinates:
-                        continue
-                    
-                    # Calculate congestion level (0.0 to 1.0) based on multiple factors
-                    congestion = 0.5  # default
-                    
-                    # Factor 1: Speed-based (lower speed = higher congestion)
-                    if entry.average_speed:
-                        speed_factor = max(0.0, min(1.0, 1.0 - (entry.average_speed / 80.0)))
-                    else:
-                        speed_factor = 0.5
-                    
-                    # Factor 2: Capacity-based (vehicle count vs base capacity)
-                    if segment.base_capacity and entry.vehicle_count:
-                        capacity_factor = min(1.0, entry.vehicle_count / segment.base_capacity)
-                    else:
-                        capacity_factor = 0.5
-                    
-                    # Factor 3: Congestion state
-                    state_map = {"free-flow": 0.2, "moderate": 0.5, "congested": 0.8, "heavy": 0.95}
-                    state_factor = state_map.get(entry.congestion_state, 0.5)
-                    
-                    # Weighted average: speed (40%), capacity (30%), state (30%)
-                    congestion = (speed_factor * 0.4 + capacity_factor * 0.3 + state_factor * 0.3)
-                    congestion = max(0.0, min(1.0, congestion))
-                    
-                    segments.append({
-                        "segment_id": f"seg_{entry.road_segment_id}",
-                        "name": segment.name or f"Road {entry.road_segment_id}",
-                        "coordinates": coordinates,
-                        "congestion_level": round(congestion, 2),
-                        "speed_kmh": round(entry.average_speed or 30, 1),
-                        "vehicle_count": entry.vehicle_count or 0,
-                        "timestamp": entry.timestamp.isoformat() if entry.timestamp else datetime.now().isoformat()
-                    })
-                except (json.JSONDecodeError, KeyError, TypeError) as e:
-                    # Skip segments with invalid geometry
-                    continue
-        
-        if segments:
-            return {"segments": segments, "timestamp": datetime.now().isoformat()}
+
+
+def _latest_traffic_with_roads(db: Session):
+    """
+    Query of the latest reading of every segment (the traffic_latest table, one
+    row per segment) joined with its RoadNetwork row (segments without geometry
+    are left out). Only the road's geometry_version is selected, not the geometry.
+    """
+    return db.query(
+        models.TrafficLatest.road_segment_id,
+        models.TrafficLatest.timestamp,
+        models.TrafficLatest.vehicle_count,
+        models.TrafficLatest.average_speed,
+        models.TrafficLatest.congestion_state,
+        models.RoadNetwork.name,
+        models.RoadNetwork.geometry_version,
+        models.RoadNetwork.base_capacity,
+    ).join(
+        models.RoadNetwork, models.RoadNetwork.id == models.TrafficLatest.road_segment_id
+    ).filter(models.RoadNetwork.geometry.isnot(None))
+
+
+def _road_geometries(db: Session, rows, errors: List[tuple]) -> dict:
+    """
+    Parsed geometry of every row's road, by segment id. Roads missing from
+    road_geometry_cache or cached at another geometry_version are fetched in
+    one query and parsed; malformed geometries are added to errors and left out.
+    """
+    geometries, stale = {}, []
+    for row in rows:
+        geometry = road_geometry_cache.get(row.road_segment_id, row.geometry_version)
+        if geometry is None:
+            stale.append(row.road_segment_id)
+        else:
+            geometries[row.road_segment_id] = geometry
+    if stale:
+        fetched = db.query(
+            models.RoadNetwork.id, models.RoadNetwork.geometry_version, models.RoadNetwork.geometry
+        ).filter(models.RoadNetwork.id.in_(stale))
+        for segment_id, version, text in fetched:
+            try:
+                geometries[segment_id] = road_geometry_cache.put(segment_id, version, text)
+            except Exception as segment_error:
+                diag.debug("Error parsing geometry of %s: %s", segment_id, segment_error)
+                errors.append((segment_id, segment_error))
+    return geometries
+
+
+def _congestion_level(row) -> float:
+    """Congestion level (0.0 to 1.0) of a segment from its latest speed, load and state."""
+    # Factor 1: Speed-based (lower speed = higher congestion)
+    if row.average_speed:
+        speed_factor = max(0.0, min(1.0, 1.0 - (row.average_speed / 80.0)))
+    else:
+        speed_factor = 0.5
+    
+    # Factor 2: Capacity-based (vehicle count vs base capacity)
+    if row.base_capacity and row.vehicle_count:
+        capacity_factor = min(1.0, row.vehicle_count / row.base_capacity)
+    else:
+        capacity_factor = 0.5
+    
+    # Factor 3: Congestion state
+    state_map = {"free-flow": 0.2, "moderate": 0.5, "congested": 0.8, "heavy": 0.95}
+    state_factor = state_map.get(row.congestion_state, 0.5)
     
-    # Generate mock traffic data for Ahmedabad area
-    mock_segments = _generate_mock_traffic_segments()
-    return {"segments": mock_segments, "timestamp": datetime.now().isoformat(), "mock": True}
+    # Weighted average: speed (40%), capacity (30%), state (30%)
+    congestion = (speed_factor * 0.4 + capacity_factor * 0.3 + state_factor * 0.3)
+    return max(0.0, min(1.0, congestion))
 
 
 def _generate_mock_traffic_segments():
@@ -0,0 +1,118 @@
+"""
+Pytest tests for the /analytics/export/traffic-data endpoint.
+Tests the CSV, JSON and NDJSON streams, gzip negotiation and batch-wise serialization.
+"""
+
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Traffic_Backend.db_config import get_db
+from Traffic_Backend.main import app
+from Traffic_Backend.models import Base, RoadNetwork, TrafficDynamics
+from Traffic_Backend.routers import analytics
+
+START = datetime.now().replace(microsecond=0) - timedelta(hours=2)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Client over an in-memory database holding 7 readings, exported in batches of 3."""
+    monkeypatch.setattr(analytics, "EXPORT_BATCH_ROWS", 3)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add(RoadNetwork(id=1, name="Ashram Road, North"))
+    db.execute(insert(TrafficDynamics), [
+        {"road_segment_id": 1, "timestamp": START + timedelta(minutes=i), "vehicle_count": i,
+         "average_speed": 30.0 + i, "congestion_state": "moderate", "flow_entropy": None if i == 0 else 0.5}
+        for i in range(7)
+    ])
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+
+
+class TestTrafficDataExport:
+    """Test suite for GET /analytics/export/traffic-data."""
+
+    def test_csv(self, client):
+        """CSV rows are quoted where needed, in time order, with empty cells for NULLs."""
+        response = client.get("/analytics/export/traffic-data?format=csv")
+
+        assert response.headers["content-type"].startswith("text/csv")
+        assert "attachment" in response.headers["content-disposition"]
+        rows = list(csv.reader(io.StringIO(response.text)))
+        assert rows[0] == analytics._EXPORT_CSV_HEADER
+        assert len(rows) == 8
+        assert rows[1] == [str(START), "Ashram Road, North", "0", "30.0", "moderate", ""]
+        assert rows[7][2] == "6"
+
+    def test_json_keeps_response_shape(self, client):
+        """JSON streams the same document the endpoint used to build in memory."""
+        body = client.get("/analytics/export/traffic-data?format=json").json()
+
+        assert body["total_records"] == 7
+        assert [r["vehicle_count"] for r in body["data"]] == list(range(7))
+        assert body["data"][0] == {
+            "timestamp": START.isoformat(), "road_name": "Ashram Road, North", "vehicle_count": 0,
+            "avg_speed_kmh": 30.0, "congestion_state": "moderate", "flow_entropy": None,
+        }
+
+    def test_ndjson(self, client):
+        """NDJSON has one record per line."""
+        response = client.get("/analytics/export/traffic-data?format=ndjson")
+
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = response.text.splitlines()
+        assert len(lines) == 7
+        assert json.loads(lines[3])["vehicle_count"] == 3
+
+    def test_gzip_when_accepted(self, client):
+        """The stream is gzip-encoded only when the client accepts gzip."""
+        with client.stream("GET", "/analytics/export/traffic-data?format=ndjson",
+                           headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["content-encoding"] == "gzip"
+        assert len(gzip.decompress(raw).decode().splitlines()) == 7
+
+        plain = client.get("/analytics/export/traffic-data", headers={"Accept-Encoding": "gzip;q=0, identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.text.startswith("timestamp,")
+
+    def test_rows_are_serialized_batch_by_batch(self, monkeypatch):
+        """A chunk is emitted after every EXPORT_BATCH_ROWS rows, before later rows are read."""
+        monkeypatch.setattr(analytics, "EXPORT_BATCH_ROWS", 2)
+        pulled = []
+
+        def rows():
+            for i in range(5):
+                pulled.append(i)
+                yield SimpleNamespace(timestamp=START, name="Road", vehicle_count=i, average_speed=1.0,
+                                      congestion_state="low", flow_entropy=0.1)
+
+        chunks = analytics._export_chunks(rows(), "ndjson")
+
+        assert len(next(chunks).splitlines()) == 2
+        assert pulled == [0, 1]
+        assert [len(c.splitlines()) for c in chunks] == [2, 1]
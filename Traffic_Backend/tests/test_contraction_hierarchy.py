@@ -0,0 +1,125 @@
+"""
+Pytest unit tests for contraction_hierarchy module.
+Tests that hierarchy queries match plain Dijkstra on the CSR graph and that
+the persisted hierarchy is reused for the same network.
+"""
+
+import os
+import sys
+
+import pytest
+import numpy as np
+import networkx as nx
+import geopandas as gpd
+from shapely.geometry import LineString
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from road_graph import CSRRoadGraph
+from road_routing import bidirectional_astar_path
+from contraction_hierarchy import ContractionHierarchy, network_hash
+
+
+def create_grid_network(size=12, seed=0):
+    """Helper to create a street grid where about a third of the streets are one-way."""
+    rng = np.random.default_rng(seed)
+    step = 0.001
+    lines = []
+    for r in range(size):
+        for c in range(size):
+            p = (72.50 + c * step, 23.00 + r * step)
+            neighbors = []
+            if c + 1 < size:
+                neighbors.append((p[0] + step, p[1]))
+            if r + 1 < size:
+                neighbors.append((p[0], p[1] + step))
+            for q in neighbors:
+                lines.append(LineString([p, q]))
+                if rng.random() < 0.7:
+                    lines.append(LineString([q, p]))
+    return gpd.GeoDataFrame(geometry=lines)
+
+
+def csr_to_networkx(csr):
+    """Helper to view a CSR graph as a weighted NetworkX DiGraph over node indices."""
+    G = nx.DiGraph()
+    G.add_nodes_from(range(csr.num_nodes))
+    for u in range(csr.num_nodes):
+        for e in csr.edge_range(u):
+            G.add_edge(u, int(csr.indices[e]), weight=float(csr.weight[e]))
+    return G
+
+
+class TestContractionHierarchy:
+    """Test suite for ContractionHierarchy build and queries."""
+
+    def test_queries_match_dijkstra(self):
+        """Distances and unpacked paths agree with Dijkstra on the original graph."""
+        csr = CSRRoadGraph.from_road_network(create_grid_network())
+        G = csr_to_networkx(csr)
+        ch = ContractionHierarchy.build(csr)
+
+        rng = np.random.default_rng(5)
+        for s, t in rng.integers(0, csr.num_nodes, size=(100, 2)).tolist():
+            try:
+                expected = nx.dijkstra_path_length(G, s, t, weight='weight')
+            except nx.NetworkXNoPath:
+                assert ch.distance(s, t) is None
+                assert ch.shortest_path(s, t) is None
+                continue
+            cost, path = ch.shortest_path(s, t)
+            assert cost == pytest.approx(expected, rel=1e-6)
+            assert ch.distance(s, t) == pytest.approx(expected, rel=1e-6)
+            assert path[0] == s and path[-1] == t
+            assert nx.path_weight(G, path, weight='weight') == pytest.approx(expected, rel=1e-6)
+
+    def test_distances_match_astar_on_the_routing_graph(self):
+        """Hierarchy distances equal bidirectional A* over the same CSR graph's 'length_m'."""
+        csr = CSRRoadGraph.from_road_network(create_grid_network(size=8))
+        ch = ContractionHierarchy.build(csr)
+
+        rng = np.random.default_rng(9)
+        for s, t in rng.integers(0, csr.num_nodes, size=(50, 2)).tolist():
+            result = bidirectional_astar_path(csr, csr.node_key(s), csr.node_key(t))
+            if result is None:
+                assert ch.distance(s, t) is None
+            else:
+                assert ch.distance(s, t) == pytest.approx(result[0], rel=1e-12)
+
+    def test_one_way_street_is_respected(self):
+        """A single one-way segment is routable in its direction only."""
+        network = gpd.GeoDataFrame(geometry=[LineString([(72.52, 23.03), (72.53, 23.03)])])
+        ch = ContractionHierarchy.build(CSRRoadGraph.from_road_network(network))
+
+        assert ch.shortest_path(0, 1)[1] == [0, 1]
+        assert ch.distance(1, 0) is None
+        assert ch.shortest_path(1, 1) == (0.0, [1])
+
+    def test_save_and_load_round_trip(self, tmp_path):
+        """A loaded hierarchy answers queries exactly like the one that was saved."""
+        csr = CSRRoadGraph.from_road_network(create_grid_network(size=6))
+        ch = ContractionHierarchy.build(csr)
+        path = str(tmp_path / "ch.npz")
+
+        ch.save(path)
+        loaded = ContractionHierarchy.load(path)
+
+        assert loaded.network_hash == ch.network_hash
+        assert np.array_equal(loaded.rank, ch.rank)
+        for s, t in [(0, csr.num_nodes - 1), (3, 17), (20, 1)]:
+            assert loaded.shortest_path(s, t) == ch.shortest_path(s, t)
+
+    def test_load_or_build_reuses_cache_by_network_hash(self, tmp_path):
+        """The same network is built once; a different network gets its own file."""
+        csr = CSRRoadGraph.from_road_network(create_grid_network(size=5))
+        other = CSRRoadGraph.from_road_network(create_grid_network(size=5, seed=1))
+
+        first = ContractionHierarchy.load_or_build(csr, str(tmp_path))
+        files = os.listdir(tmp_path)
+        second = ContractionHierarchy.load_or_build(csr, str(tmp_path))
+        ContractionHierarchy.load_or_build(other, str(tmp_path))
+
+        assert files == [f"ch_{network_hash(csr)}.npz"]
+        assert second.network_hash == first.network_hash
+        assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,131 @@
+"""
+Pytest tests for the /ingest-damaged-roads endpoint.
+Tests the JSON and NDJSON responses, chunked streaming ingestion into the on-disk
+store and evidence lookups over both, on a small road network loaded into the service.
+"""
+
+import json
+import os
+
+import geopandas as gpd
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from shapely.geometry import LineString
+
+from Traffic_Backend import auth, main
+from Traffic_Backend.main import app
+from Traffic_Backend.road_graph import RoadSegmentIndex
+
+CSV = (
+    "Latitude,Longitude,Severity,Image_URL\n"
+    "23.03002,72.52500,80,http://img/1.jpg\n"
+    "23.04001,72.53500,60,http://img/2.jpg\n"
+    "23.10000,72.60000,40,\n"
+    "23.04500,72.54001,90,http://img/4.jpg\n"
+    "23.05000,72.54500,20,http://img/5.jpg\n"
+)
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    """Client with an admin user and a three-segment road network loaded."""
+    monkeypatch.setattr(main, "DAMAGED_ROADS_STORE_DIR", str(tmp_path))
+    network = gpd.GeoDataFrame({"name": ["A", "B", "C"]}, geometry=[
+        LineString([(72.5200, 23.0300), (72.5300, 23.0300)]),
+        LineString([(72.5300, 23.0400), (72.5400, 23.0400)]),
+        LineString([(72.5400, 23.0400), (72.5400, 23.0500), (72.5500, 23.0500)]),
+    ])
+    monkeypatch.setattr(main, "road_network_gdf", network)
+    monkeypatch.setattr(main, "road_network_index", RoadSegmentIndex(network))
+    monkeypatch.setattr(main, "damaged_roads_df", None)
+    monkeypatch.setattr(main, "damaged_roads_store_path", None)
+    app.dependency_overrides[auth.get_current_user] = lambda: {"username": "admin", "roles": ["admin"]}
+    yield TestClient(app)
+    app.dependency_overrides.pop(auth.get_current_user, None)
+
+
+def ingest(client, csv_text=CSV, **params):
+    """Helper to upload a damaged-roads CSV."""
+    return client.post("/ingest-damaged-roads", params=params,
+                       files={"file": ("damaged.csv", csv_text.encode(), "text/csv")})
+
+
+class TestIngestResponses:
+    """Test suite for the JSON and NDJSON result formats."""
+
+    def test_ndjson_lines_match_json_results(self, client):
+        """Every NDJSON line is the same record the JSON response returns for that point."""
+        results = ingest(client).json()["results"]
+
+        response = ingest(client, format="ndjson")
+
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines == results
+        assert "warning" not in lines[0]
+        assert lines[2]["road_segment_id"] is None and "warning" in lines[2]
+
+    def test_ndjson_is_snapped_chunk_by_chunk(self, client):
+        """Each chunk of input rows becomes one chunk of output lines."""
+        df = main._normalize_damaged_roads_columns(main.pd.read_csv(main.io.StringIO(CSV)))
+
+        chunks = list(main._iter_snapped_ndjson(df, main.road_network_index, chunk_rows=2))
+
+        assert [len(chunk.splitlines()) for chunk in chunks] == [2, 2, 1]
+
+
+class TestStreamingIngestion:
+    """Test suite for stream=true ingestion into the on-disk store."""
+
+    def test_store_matches_in_memory_results(self, client):
+        """Chunked ingestion stores the same snapped points the in-memory path returns."""
+        in_memory = ingest(client).json()
+
+        summary = ingest(client, stream="true", chunksize=2).json()
+
+        assert summary["results_stored"] is True
+        assert (summary["successfully_snapped"], summary["outside_tolerance"]) == \
+            (in_memory["successfully_snapped"], in_memory["outside_tolerance"])
+        stored = pd.read_csv(main.damaged_roads_store_path)
+        assert main.damaged_roads_df is None
+        expected = pd.DataFrame(in_memory["results"])
+        for column in ("original_lat", "original_lon", "snapped_lat", "snapped_lon", "distance"):
+            assert stored[column].tolist() == pytest.approx(expected[column].tolist(), nan_ok=True)
+        assert stored["road_segment_id"].astype("Int64").tolist() == \
+            pd.array(expected["road_segment_id"], dtype="Int64").tolist()
+        assert stored["evidence_image_url"].iloc[0] == "http://img/1.jpg"
+
+    def test_failed_upload_keeps_previous_store(self, client):
+        """A chunk that fails to parse discards the partial file and leaves the published store alone."""
+        ingest(client, stream="true", chunksize=2)
+        store_path = main.damaged_roads_store_path
+        with open(store_path) as f:
+            published = f.read()
+
+        response = ingest(client, CSV + "not-a-number,72.5,10,\n", stream="true", chunksize=2)
+
+        assert response.status_code == 400
+        assert main.damaged_roads_store_path == store_path
+        with open(store_path) as f:
+            assert f.read() == published
+        assert [name for name in os.listdir(main.DAMAGED_ROADS_STORE_DIR) if name.endswith(".part")] == []
+
+    def test_evidence_images_read_from_store(self, client):
+        """Cluster evidence is the same whether the upload was kept in memory or streamed to disk."""
+        params = {"lat": 23.045, "lon": 72.54, "radius_degrees": 0.01}
+        ingest(client)
+        from_memory = client.get("/cluster-evidence-images", params=params).json()
+
+        ingest(client, stream="true", chunksize=2)
+        from_store = client.get("/cluster-evidence-images", params=params).json()
+
+        assert from_memory["total_images"] == 3
+        assert from_store == from_memory
+
+    def test_stream_rejects_ndjson(self, client):
+        """stream=true only returns a summary, so asking for NDJSON results is an error."""
+        response = ingest(client, stream="true", format="ndjson")
+
+        assert response.status_code == 400
+        assert "format=ndjson" in response.json()["detail"]
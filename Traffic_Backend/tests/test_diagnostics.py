@@ -0,0 +1,87 @@
+"""
+Pytest unit tests for diagnostics module.
+Tests the level gate, the queued file writer and its size cap.
+"""
+
+import logging
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from Traffic_Backend import diagnostics
+from Traffic_Backend.main import app
+
+
+@pytest.fixture(autouse=True)
+def stopped_diagnostics():
+    diagnostics.stop_diagnostics()
+    yield
+    diagnostics.stop_diagnostics()
+
+
+class TestDiagnostics:
+    """Test suite for start/stop and record delivery."""
+
+    def test_disabled_by_default(self, tmp_path):
+        """Without a level nothing is enabled and no file is created."""
+        path = tmp_path / "diag.log"
+
+        assert diagnostics.start_diagnostics(level="", path=str(path)) is False
+        diagnostics.get_diagnostics_logger("test").error("not recorded")
+
+        assert not diagnostics.get_diagnostics_logger("test").isEnabledFor(logging.CRITICAL)
+        assert not path.exists()
+
+    def test_unknown_level_stays_disabled(self, tmp_path):
+        """A misspelt level does not turn diagnostics on."""
+        assert diagnostics.start_diagnostics(level="VERBOSE", path=str(tmp_path / "diag.log")) is False
+
+    def test_records_reach_file_after_stop(self, tmp_path):
+        """Records at or above the level are written by the listener; lower ones are skipped."""
+        path = tmp_path / "diag.log"
+        log = diagnostics.get_diagnostics_logger("test")
+
+        assert diagnostics.start_diagnostics(level="INFO", path=str(path))
+        log.debug("below level")
+        log.info("segment count %d", 42)
+        diagnostics.stop_diagnostics()
+
+        content = path.read_text()
+        assert "segment count 42" in content
+        assert "below level" not in content
+        assert not log.isEnabledFor(logging.CRITICAL)
+
+    def test_file_is_size_capped(self, tmp_path, monkeypatch):
+        """The file rotates at DIAGNOSTICS_MAX_BYTES and keeps DIAGNOSTICS_BACKUP_COUNT backups."""
+        monkeypatch.setattr(diagnostics, "DIAGNOSTICS_MAX_BYTES", 2000)
+        monkeypatch.setattr(diagnostics, "DIAGNOSTICS_BACKUP_COUNT", 2)
+        path = tmp_path / "diag.log"
+        log = diagnostics.get_diagnostics_logger("test")
+
+        diagnostics.start_diagnostics(level="DEBUG", path=str(path))
+        for i in range(500):
+            log.debug("poll %d %s", i, "x" * 50)
+        diagnostics.stop_diagnostics()
+
+        files = sorted(os.listdir(tmp_path))
+        assert files == ["diag.log", "diag.log.1", "diag.log.2"]
+        assert all(os.path.getsize(tmp_path / f) <= 2000 for f in files)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """A full queue discards records and counts them."""
+        handler = diagnostics.DroppingQueueHandler(diagnostics.queue.Queue(1))
+        record = logging.LogRecord("test", logging.INFO, __file__, 1, "msg", None, None)
+
+        handler.enqueue(record)
+        handler.enqueue(record)
+
+        assert handler.dropped == 1
+
+    def test_traffic_live_writes_no_file_when_disabled(self, tmp_path, monkeypatch):
+        """The dashboard endpoint leaves the working directory untouched by default."""
+        monkeypatch.chdir(tmp_path)
+
+        TestClient(app).get("/traffic/live")
+
+        assert os.listdir(tmp_path) == []
@@ -0,0 +1,244 @@
+"""
+Pytest unit tests for local_routing module.
+Tests the offline router behind get_diversion_routes on small hand-built road networks.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+import pytest
+import geopandas as gpd
+from fastapi import HTTPException
+from shapely.geometry import LineString
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mapbox_service
+from road_graph import build_road_graph, CSRRoadGraph
+from zone_avoidance import AvoidanceZones
+from Traffic_Backend.local_routing import LocalRouter, load_segment_speeds, road_network_ids
+from Traffic_Backend.models import Base, RoadNetwork, TrafficDynamics
+
+START = (72.50, 23.00)
+END = (72.51, 23.00)
+
+
+def create_two_route_network():
+    """Helper to create a direct road (segment 101) and a longer bypass (segment 102) between START and END."""
+    return gpd.GeoDataFrame(
+        geometry=[LineString([START, END]), LineString([START, (72.505, 23.003), END])],
+        index=[101, 102],
+    )
+
+
+def create_router(speeds=None):
+    """Helper to build a LocalRouter over the two-route network with fixed segment speeds."""
+    network = create_two_route_network()
+    loader = (lambda: speeds) if speeds is not None else None
+    return LocalRouter(build_road_graph(network), CSRRoadGraph.from_road_network(network), speed_loader=loader)
+
+
+class TestLocalRouter:
+    """Test suite for LocalRouter."""
+
+    def test_response_matches_directions_shape(self):
+        """Routes carry the fields the Mapbox parser produces, with road-following geometry."""
+        result = create_router().route(START, END, alternatives=3)
+
+        assert result["success"] and result["engine"] == "local"
+        assert len(result["routes"]) == 2
+        direct = result["routes"][0]
+        assert direct["id"] == "route-1"
+        assert direct["geometry"]["coordinates"] == [list(START), list(END)]
+        assert direct["distance_km"] == pytest.approx(1.02, abs=0.01)
+        # 30 km/h default speed
+        assert direct["duration_seconds"] == pytest.approx(direct["distance_meters"] / (30 / 3.6))
+        assert set(direct) >= {"duration_minutes", "legs", "turn_count", "road_classes", "turn_instructions", "profile"}
+
+    def test_routes_on_csr_graph_alone(self):
+        """A router over just the CSR graph answers exactly like one over the DiGraph."""
+        network = create_two_route_network()
+
+        result = LocalRouter(CSRRoadGraph.from_road_network(network)).route(START, END, alternatives=3)
+
+        assert result == create_router().route(START, END, alternatives=3)
+
+    def test_observed_speeds_reorder_routes(self):
+        """A congested direct road makes the longer bypass the fastest route."""
+        result = create_router(speeds={101: 5.0, 102: 40.0}).route(START, END)
+
+        first, second = result["routes"]
+        assert len(first["geometry"]["coordinates"]) == 3
+        assert first["duration_seconds"] < second["duration_seconds"]
+        assert first["distance_meters"] > second["distance_meters"]
+
+    def test_speeds_only_apply_to_traffic_profile(self):
+        """The plain driving profile ignores observed speeds."""
+        router = create_router(speeds={101: 5.0})
+
+        result = router.route(START, END, profile="driving")
+
+        assert len(result["routes"][0]["geometry"]["coordinates"]) == 2
+
+    def test_zone_edges_are_masked(self):
+        """A zone over the direct road leaves only the bypass, even though it is longer."""
+        zones = AvoidanceZones.from_geojson([{"type": "Polygon", "coordinates": [[
+            [72.5045, 22.999], [72.5055, 22.999], [72.5055, 23.001], [72.5045, 23.001], [72.5045, 22.999]
+        ]]}])
+
+        result = create_router().route(START, END, alternatives=3, avoid_zones=zones)
+
+        assert len(result["routes"]) == 1
+        assert len(result["routes"][0]["geometry"]["coordinates"]) == 3
+        assert result["avoidance"] == {"zones": 1, "blocked_edges": 1}
+
+    def test_zone_over_every_route_is_404(self):
+        """When every path enters a zone the router reports that nothing avoids it."""
+        zones = AvoidanceZones.from_geojson([{"type": "Polygon", "coordinates": [[
+            [72.509, 22.99], [72.52, 22.99], [72.52, 23.01], [72.509, 23.01], [72.509, 22.99]
+        ]]}])
+
+        with pytest.raises(HTTPException) as exc_info:
+            create_router().route(START, END, avoid_zones=zones)
+        assert exc_info.value.status_code == 404
+
+    def test_far_away_points_are_rejected(self):
+        """Coordinates well off the loaded network raise a 400."""
+        with pytest.raises(HTTPException) as exc_info:
+            create_router().route((72.60, 23.10), END)
+        assert exc_info.value.status_code == 400
+
+    def test_unreachable_destination_is_404(self):
+        """The network is one-way, so the reverse trip has no route."""
+        with pytest.raises(HTTPException) as exc_info:
+            create_router().route(END, START)
+        assert exc_info.value.status_code == 404
+
+
+class TestLoadSegmentSpeeds:
+    """Test suite for reading per-segment speeds from TrafficDynamics."""
+
+    def test_latest_reading_per_segment(self):
+        """Only the newest positive speed of each segment is used."""
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        db.add_all([
+            TrafficDynamics(road_segment_id=101, timestamp=datetime(2025, 1, 1, 8), average_speed=12.0),
+            TrafficDynamics(road_segment_id=101, timestamp=datetime(2025, 1, 1, 9), average_speed=25.0),
+            TrafficDynamics(road_segment_id=102, timestamp=datetime(2025, 1, 1, 9), average_speed=0.0),
+        ])
+        db.commit()
+
+        assert load_segment_speeds(db) == {101: 25.0}
+        db.close()
+
+
+def create_session(roads=()):
+    """Helper to open an in-memory database session holding the given RoadNetwork rows."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all([RoadNetwork(id=road_id, name=name) for road_id, name in roads])
+    db.commit()
+    return db
+
+
+class TestRoadNetworkIds:
+    """Test suite for re-indexing an uploaded network by RoadNetwork.id."""
+
+    def test_id_property_is_used(self):
+        """A road_segment_id column of known ids becomes the index as is."""
+        network = create_two_route_network().reset_index(drop=True)
+        network["road_segment_id"] = [7, 3]
+        db = create_session([(7, "Direct Road"), (3, "Bypass")])
+
+        ids = road_network_ids(network, db)
+
+        assert ids.tolist() == [7, 3]
+        assert ids.dtype == "int64"
+        db.close()
+
+    @pytest.mark.parametrize("values, expected", [
+        (["way/1", "3"], [7, 3]),  # OSM-style strings fall back to the name; digit strings are ids
+        ([1.5, 3.0], [7, 3]),  # non-integral floats are not truncated
+        ([3, 3], [7, 3]),  # a repeated id identifies neither row
+        ([99, 3], [7, 3]),  # ids missing from road_network fall back to the name
+        ([3, "way/2"], [3, None]),  # a name match never reuses an id another row holds
+    ])
+    def test_bad_id_values_fall_back_to_names(self, values, expected, caplog):
+        """road_segment_id values that are not unique, integral, known ids are matched by name instead."""
+        network = create_two_route_network().reset_index(drop=True)
+        network["name"] = ["Direct Road", "Bypass"]
+        network["road_segment_id"] = values
+        db = create_session([(7, "Direct Road"), (3, "Bypass")])
+
+        with caplog.at_level(logging.WARNING, logger="local_routing"):
+            assert road_network_ids(network, db).tolist() == expected
+        assert "not unique, integral RoadNetwork ids" in caplog.text
+        db.close()
+
+    def test_id_property_is_not_trusted(self):
+        """A plain id property (an OSM way id) is never taken for RoadNetwork.id."""
+        network = create_two_route_network().reset_index(drop=True)
+        network["id"] = [3, 7]
+        network["name"] = ["Direct Road", "Bypass"]
+        db = create_session([(7, "Direct Road"), (3, "Bypass")])
+
+        assert road_network_ids(network, db).tolist() == [7, 3]
+        db.close()
+
+    def test_names_are_matched_against_road_network(self):
+        """Without an id column, names are looked up; unknown and duplicated names get None."""
+        network = gpd.GeoDataFrame(
+            {"name": ["Direct Road", "Bypass", "Ring Road", "Unknown"]},
+            geometry=[LineString([START, END])] * 4,
+        )
+        db = create_session([(7, "Direct Road"), (3, "Bypass"), (4, "Ring Road"), (5, "Ring Road")])
+
+        assert road_network_ids(network, db).tolist() == [7, 3, None, None]
+        db.close()
+
+    def test_speeds_reach_segments_whose_ids_differ_from_row_numbers(self):
+        """Speeds keyed by RoadNetwork.id slow the right road once the upload is re-indexed."""
+        network = create_two_route_network().reset_index(drop=True)
+        network["name"] = ["Direct Road", "Bypass"]
+        db = create_session([(7, "Direct Road"), (3, "Bypass")])
+        network.index = road_network_ids(network, db)
+        db.close()
+
+        router = LocalRouter(CSRRoadGraph.from_road_network(network), speed_loader=lambda: {7: 5.0, 3: 40.0})
+        first, second = router.route(START, END)["routes"]
+
+        assert len(first["geometry"]["coordinates"]) == 3
+        assert first["duration_seconds"] < second["duration_seconds"]
+
+
+class TestDiversionRoutesBackend:
+    """Test suite for get_diversion_routes dispatching to the local router."""
+
+    def test_no_token_routes_locally(self, monkeypatch):
+        """Without a Mapbox token the registered local router answers."""
+        monkeypatch.setattr(mapbox_service, "MAPBOX_ACCESS_TOKEN", None)
+        monkeypatch.delenv("MAPBOX_ACCESS_TOKEN", raising=False)
+        monkeypatch.setattr(mapbox_service, "_local_router", create_router())
+
+        result = asyncio.run(mapbox_service.get_diversion_routes(START, END, alternatives=1))
+
+        assert result["engine"] == "local"
+        assert len(result["routes"]) == 1
+
+    def test_local_backend_without_network_is_503(self, monkeypatch):
+        """Forcing the local backend before a network is uploaded is reported as unavailable."""
+        monkeypatch.setattr(mapbox_service, "ROUTING_BACKEND", "local")
+        monkeypatch.setattr(mapbox_service, "_local_router", None)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(mapbox_service.get_diversion_routes(START, END))
+        assert exc_info.value.status_code == 503
@@ -0,0 +1,565 @@
+"""
+Pytest unit tests for mapbox_service module.
+Runs the service functions against a local stand-in transport instead of api.mapbox.com.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import httpx
+from fastapi import HTTPException
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mapbox_service
+
+
+ORIGIN = (72.5714, 23.0225)
+DESTINATION = (72.5800, 23.0350)
+
+
+def directions_stand_in(requests_seen):
+    """Helper to build a transport that answers Directions requests with one route."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request)
+        return httpx.Response(200, json={
+            "routes": [{"duration": 600, "distance": 4200, "geometry": {"type": "LineString", "coordinates": []}, "legs": []}],
+            "waypoints": [],
+        })
+    return httpx.MockTransport(handler)
+
+
+@pytest.fixture(autouse=True)
+def mapbox_token(monkeypatch):
+    monkeypatch.setattr(mapbox_service, "MAPBOX_ACCESS_TOKEN", "test-token")
+    mapbox_service.directions_cache.clear()
+    monkeypatch.setattr(mapbox_service, "directions_flight", mapbox_service.SingleFlight())
+    monkeypatch.setattr(mapbox_service, "isochrone_flight", mapbox_service.SingleFlight())
+    monkeypatch.setattr(mapbox_service, "rate_limiters", {
+        api: mapbox_service.TokenBucket(6000, burst=100) for api in mapbox_service.MAPBOX_RATE_LIMITS
+    })
+    monkeypatch.setattr(mapbox_service, "retry_counts", {api: 0 for api in mapbox_service.MAPBOX_RATE_LIMITS})
+    monkeypatch.setattr(mapbox_service, "RETRY_BASE_DELAY_S", 0.001)
+    yield
+    asyncio.run(mapbox_service.close_http_client())
+
+
+class TestSharedHttpClient:
+    """Test suite for the application-scoped Mapbox HTTP client."""
+
+    def test_calls_reuse_one_client(self):
+        """Consecutive service calls go through the same pooled client and injected transport."""
+        seen = []
+
+        async def scenario():
+            client = await mapbox_service.start_http_client(transport=directions_stand_in(seen))
+            first = await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+            second = await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION, profile="driving")
+            return client, first, second
+
+        client, first, second = asyncio.run(scenario())
+
+        assert len(seen) == 2
+        assert mapbox_service.get_http_client() is client
+        assert seen[0].url.path.endswith(f"/driving-traffic/{ORIGIN[0]},{ORIGIN[1]};{DESTINATION[0]},{DESTINATION[1]}")
+        assert seen[1].url.path.startswith("/directions/v5/mapbox/driving/")
+        assert first["routes"][0]["distance_km"] == 4.2
+        assert second["routes"][0]["profile"] == "driving"
+
+    def test_close_and_recreate(self):
+        """Closing the client releases it; the next caller gets a fresh open client."""
+        async def scenario():
+            started = await mapbox_service.start_http_client(transport=directions_stand_in([]))
+            await mapbox_service.close_http_client()
+            return started, mapbox_service.get_http_client()
+
+        started, recreated = asyncio.run(scenario())
+
+        assert started.is_closed
+        assert recreated is not started
+        assert not recreated.is_closed
+
+    def test_upstream_error_is_mapped(self):
+        """A 429 that persists through the retries surfaces as the service's HTTPException."""
+        transport = httpx.MockTransport(lambda request: httpx.Response(429, text="rate limited"))
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=transport)
+            await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(scenario())
+        assert exc_info.value.status_code == 429
+
+
+class TestDirectionsCache:
+    """Test suite for the Directions TTL + LRU cache."""
+
+    def test_repeated_and_nearby_requests_hit_cache(self):
+        """Same or grid-equivalent coordinates are answered without a second upstream call."""
+        seen = []
+        nearby = (ORIGIN[0] + 0.0001, ORIGIN[1] - 0.0001)
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=directions_stand_in(seen))
+            await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+            await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+            await mapbox_service.get_diversion_routes(nearby, DESTINATION)
+            await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION, alternatives=1)
+
+        asyncio.run(scenario())
+
+        assert len(seen) == 2
+        assert mapbox_service.get_cache_stats()["directions"]["hits"] == 2
+        assert mapbox_service.get_cache_stats()["directions"]["misses"] == 2
+
+    def test_callers_cannot_modify_cached_routes(self):
+        """Annotating a returned route leaves the cached copy untouched."""
+        async def scenario():
+            await mapbox_service.start_http_client(transport=directions_stand_in([]))
+            first = await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+            first["routes"][0]["traffic_severity"] = "Moderate"
+            return await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+
+        second = asyncio.run(scenario())
+
+        assert "traffic_severity" not in second["routes"][0]
+
+    def test_entries_expire_after_ttl(self, monkeypatch):
+        """An entry is served until its TTL passes, then counted as a miss."""
+        clock = [1000.0]
+        monkeypatch.setattr(mapbox_service.time, "monotonic", lambda: clock[0])
+        cache = mapbox_service.TTLLRUCache(max_entries=4)
+
+        cache.set("key", "value", ttl=120)
+        clock[0] += 119
+        assert cache.get("key") == "value"
+        clock[0] += 2
+        assert cache.get("key") is None
+        assert (cache.hits, cache.misses, len(cache)) == (1, 1, 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Past max_entries the entry read least recently is dropped first."""
+        cache = mapbox_service.TTLLRUCache(max_entries=2)
+
+        cache.set("a", 1, ttl=60)
+        cache.set("b", 2, ttl=60)
+        cache.get("a")
+        cache.set("c", 3, ttl=60)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+
+def slow_stand_in(requests_seen, payload, status_code=200):
+    """Helper to build a transport that answers after a short delay, so concurrent calls overlap."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(status_code, json=payload)
+    return httpx.MockTransport(handler)
+
+
+class TestSingleFlight:
+    """Test suite for coalescing identical in-flight Mapbox calls."""
+
+    def test_concurrent_directions_share_one_upstream_call(self):
+        """Identical concurrent requests make one Directions call and each get their own copy."""
+        seen = []
+        payload = {"routes": [{"duration": 600, "distance": 4200, "legs": []}], "waypoints": []}
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=slow_stand_in(seen, payload))
+            return await asyncio.gather(*[
+                mapbox_service.get_diversion_routes(ORIGIN, DESTINATION) for _ in range(5)
+            ])
+
+        results = asyncio.run(scenario())
+
+        assert len(seen) == 1
+        assert mapbox_service.directions_flight.deduplicated == 4
+        assert mapbox_service.get_cache_stats()["coalesced"]["directions"] == {"in_flight": 0, "deduplicated": 4}
+        assert all(r["routes"][0]["distance_km"] == 4.2 for r in results)
+        assert results[0]["routes"] is not results[1]["routes"]
+
+    def test_concurrent_isochrones_share_one_upstream_call(self):
+        """Interval order does not matter; a different center is its own call."""
+        seen = []
+        payload = {"type": "FeatureCollection", "features": [{"properties": {"contour": 5}}]}
+        elsewhere = (72.60, 23.05)
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=slow_stand_in(seen, payload))
+            return await asyncio.gather(
+                mapbox_service.calculate_impact_isochrone(ORIGIN, [5, 10]),
+                mapbox_service.calculate_impact_isochrone(ORIGIN, [10, 5]),
+                mapbox_service.calculate_impact_isochrone(elsewhere, [5, 10]),
+            )
+
+        first, second, third = asyncio.run(scenario())
+
+        assert len(seen) == 2
+        assert mapbox_service.isochrone_flight.deduplicated == 1
+        assert first["isochrones"] == second["isochrones"] == payload
+        assert second["intervals_minutes"] == [10, 5]
+        assert third["center"] == elsewhere
+
+    def test_upstream_error_reaches_every_waiter(self):
+        """A failed shared call raises the same HTTPException for all callers and is not remembered."""
+        seen = []
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=slow_stand_in(seen, {"message": "bad coordinates"}, 422))
+            return await asyncio.gather(
+                mapbox_service.get_diversion_routes(ORIGIN, DESTINATION),
+                mapbox_service.get_diversion_routes(ORIGIN, DESTINATION),
+                return_exceptions=True,
+            )
+
+        errors = asyncio.run(scenario())
+
+        assert len(seen) == 1
+        assert [e.status_code for e in errors] == [400, 400]
+        assert mapbox_service.directions_flight.stats()["in_flight"] == 0
+
+
+def scripted_stand_in(requests_seen, responses):
+    """Helper to build a transport that replays the given responses in order."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests_seen.append(request)
+        return responses[min(len(requests_seen), len(responses)) - 1]
+    return httpx.MockTransport(handler)
+
+
+class TestRateLimitAndRetry:
+    """Test suite for the per-API token buckets and retrying GETs."""
+
+    def test_transient_errors_are_retried(self):
+        """A 503 and a 429 are retried and the third answer is returned to the caller."""
+        seen = []
+        ok = httpx.Response(200, json={"routes": [{"duration": 60, "distance": 1000, "legs": []}]})
+        transport = scripted_stand_in(seen, [httpx.Response(503), httpx.Response(429), ok])
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=transport)
+            return await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+
+        result = asyncio.run(scenario())
+
+        assert len(seen) == 3
+        assert result["routes"][0]["distance_km"] == 1.0
+        assert mapbox_service.get_cache_stats()["rate_limits"]["directions"]["retries"] == 2
+
+    def test_retries_are_bounded(self):
+        """A persistent 503 is tried MAPBOX_MAX_RETRIES + 1 times, then mapped to an error."""
+        seen = []
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=scripted_stand_in(seen, [httpx.Response(503)]))
+            await mapbox_service.get_traffic_matrix([ORIGIN], [DESTINATION])
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(scenario())
+        assert exc_info.value.status_code == 500
+        assert len(seen) == mapbox_service.MAPBOX_MAX_RETRIES + 1
+
+    def test_client_errors_are_not_retried(self):
+        """A 422 is the caller's fault and goes straight to the error mapping."""
+        seen = []
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=scripted_stand_in(seen, [httpx.Response(422)]))
+            await mapbox_service.calculate_impact_isochrone(ORIGIN, [5])
+
+        with pytest.raises(HTTPException):
+            asyncio.run(scenario())
+        assert len(seen) == 1
+
+    def test_retry_after_is_honored(self, monkeypatch):
+        """The wait before retrying a 429 comes from its Retry-After header."""
+        seen, sleeps = [], []
+        real_sleep = asyncio.sleep
+
+        async def recording_sleep(delay):
+            sleeps.append(delay)
+            await real_sleep(0)
+
+        monkeypatch.setattr(mapbox_service.asyncio, "sleep", recording_sleep)
+        transport = scripted_stand_in(seen, [
+            httpx.Response(429, headers={"Retry-After": "2"}),
+            httpx.Response(200, json={"type": "FeatureCollection", "features": []}),
+        ])
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=transport)
+            return await mapbox_service.calculate_impact_isochrone(ORIGIN, [5])
+
+        result = asyncio.run(scenario())
+
+        assert result["success"]
+        assert sleeps[0] == 2.0
+
+    def test_long_retry_after_is_not_clamped(self, monkeypatch):
+        """A Retry-After past RETRY_MAX_DELAY_S but within the retry budget is slept in full."""
+        seen, sleeps = [], []
+        clock = [100.0]
+        real_sleep = asyncio.sleep
+
+        async def recording_sleep(delay):
+            # Advance the service's clock so the token bucket refills as if the wait happened
+            sleeps.append(delay)
+            clock[0] += delay
+            await real_sleep(0)
+
+        monkeypatch.setattr(mapbox_service, "time", SimpleNamespace(monotonic=lambda: clock[0], time=time.time))
+        monkeypatch.setattr(mapbox_service.asyncio, "sleep", recording_sleep)
+        monkeypatch.setattr(mapbox_service, "rate_limiters", {
+            api: mapbox_service.TokenBucket(6000, burst=100) for api in mapbox_service.MAPBOX_RATE_LIMITS
+        })
+        monkeypatch.setattr(mapbox_service, "MAPBOX_RETRY_BUDGET_S", 60.0)
+        transport = scripted_stand_in(seen, [
+            httpx.Response(429, headers={"Retry-After": "30"}),
+            httpx.Response(200, json={"type": "FeatureCollection", "features": []}),
+        ])
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=transport)
+            return await mapbox_service.calculate_impact_isochrone(ORIGIN, [5])
+
+        assert asyncio.run(scenario())["success"]
+        assert sleeps[0] == 30.0
+        assert len(seen) == 2
+
+    def test_retry_after_beyond_budget_fails_fast(self, monkeypatch):
+        """A Retry-After longer than the retry budget is not slept; the bucket is held back for it."""
+        seen, sleeps = [], []
+
+        async def recording_sleep(delay):
+            sleeps.append(delay)
+
+        monkeypatch.setattr(mapbox_service.asyncio, "sleep", recording_sleep)
+        monkeypatch.setattr(mapbox_service, "MAPBOX_RETRY_BUDGET_S", 20.0)
+        transport = scripted_stand_in(seen, [httpx.Response(429, headers={"Retry-After": "120"})])
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=transport)
+            await mapbox_service.calculate_impact_isochrone(ORIGIN, [5])
+
+        with pytest.raises(HTTPException):
+            asyncio.run(scenario())
+        assert len(seen) == 1
+        assert sleeps == []
+        with pytest.raises(HTTPException) as exc_info:
+            mapbox_service.rate_limiters["isochrone"].reserve()
+        assert exc_info.value.status_code == 429
+
+    def test_parse_retry_after(self):
+        """Both delta-seconds and HTTP-date forms are understood; junk is ignored."""
+        in_a_minute = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+
+        assert mapbox_service.parse_retry_after("3") == 3.0
+        assert 55 < mapbox_service.parse_retry_after(in_a_minute) <= 60
+        assert mapbox_service.parse_retry_after("soon") is None
+        assert mapbox_service.parse_retry_after(None) is None
+
+    def test_token_bucket_queues_then_rejects(self, monkeypatch):
+        """Past the burst, callers are spaced at the quota rate until the wait exceeds max_wait."""
+        clock = [50.0]
+        monkeypatch.setattr(mapbox_service.time, "monotonic", lambda: clock[0])
+        bucket = mapbox_service.TokenBucket(60, burst=2, max_wait=2.5)
+
+        waits = [bucket.reserve() for _ in range(4)]
+        with pytest.raises(HTTPException) as exc_info:
+            bucket.reserve()
+
+        assert waits == pytest.approx([0.0, 0.0, 1.0, 2.0])
+        assert exc_info.value.status_code == 429
+        assert (bucket.throttled, bucket.rejected) == (2, 1)
+        clock[0] += 10
+        assert bucket.reserve() == 0.0
+
+
+class TestZoneAvoidance:
+    """Test suite for dropping Directions routes that enter an avoidance polygon."""
+
+    ZONE = {"type": "Polygon", "coordinates": [[
+        [72.574, 23.026], [72.577, 23.026], [72.577, 23.029], [72.574, 23.029], [72.574, 23.026]
+    ]]}
+
+    @staticmethod
+    def two_route_stand_in(requests_seen):
+        """Helper to answer with a route through the zone and one around it."""
+        through = [list(ORIGIN), [72.5755, 23.0275], list(DESTINATION)]
+        around = [list(ORIGIN), [72.5714, 23.0350], list(DESTINATION)]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            requests_seen.append(request)
+            return httpx.Response(200, json={"routes": [
+                {"duration": 500, "distance": 3000, "geometry": {"type": "LineString", "coordinates": through}, "legs": []},
+                {"duration": 700, "distance": 4500, "geometry": {"type": "LineString", "coordinates": around}, "legs": []},
+            ]})
+        return httpx.MockTransport(handler)
+
+    def test_route_through_zone_is_excluded(self):
+        """Only the route that stays out of the polygon is returned; alternatives are always requested."""
+        seen = []
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=self.two_route_stand_in(seen))
+            return await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION, avoid_polygon=self.ZONE, alternatives=1)
+
+        result = asyncio.run(scenario())
+
+        assert [r["id"] for r in result["routes"]] == ["route-2"]
+        assert result["avoidance"] == {"zones": 1, "excluded_routes": 1}
+        assert seen[0].url.params["alternatives"] == "true"
+
+    def test_cached_result_is_filtered_per_request(self):
+        """The cached Directions answer is shared; zones only filter each caller's copy."""
+        seen = []
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=self.two_route_stand_in(seen))
+            avoided = await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION, avoid_polygon=self.ZONE)
+            plain = await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION)
+            return avoided, plain
+
+        avoided, plain = asyncio.run(scenario())
+
+        assert len(seen) == 1
+        assert len(avoided["routes"]) == 1
+        assert len(plain["routes"]) == 2
+
+    def test_no_clear_route_is_404(self, monkeypatch):
+        """Without a local graph to fall back on, a zone covering every route is a 404."""
+        monkeypatch.setattr(mapbox_service, "_local_router", None)
+        everywhere = {"type": "Polygon", "coordinates": [[[72, 22], [73, 22], [73, 24], [72, 24], [72, 22]]]}
+
+        async def scenario():
+            await mapbox_service.start_http_client(transport=self.two_route_stand_in([]))
+            await mapbox_service.get_diversion_routes(ORIGIN, DESTINATION, avoid_polygon=everywhere)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(scenario())
+        assert exc_info.value.status_code == 404
+
+
+LANDMARKS = [
+    {"place_name": "Sabarmati Ashram, Ahmedabad, Gujarat", "lon": 72.5806, "lat": 23.0607, "type": "poi", "relevance": 1},
+    {"place_name": "Sabarmati Riverfront, Ahmedabad, Gujarat", "lon": 72.5770, "lat": 23.0300, "type": "poi", "relevance": 0.9},
+]
+
+
+class TestGeocodeCache:
+    """Test suite for the two-tier geocoding cache."""
+
+    def test_normalized_queries_share_an_entry(self, tmp_path):
+        """Case, punctuation and spacing differences hit the same forward entry."""
+        cache = mapbox_service.GeocodeCache(str(tmp_path / "geocode.sqlite3"))
+
+        cache.put_forward("Sabarmati  Ashram", LANDMARKS[:1])
+
+        assert cache.get_forward("sabarmati ashram!") == LANDMARKS[:1]
+        assert cache.memory.hits == 1
+
+    def test_longer_query_is_narrowed_from_prefix(self, tmp_path):
+        """Typing past a cached query filters its results instead of calling Mapbox."""
+        cache = mapbox_service.GeocodeCache(str(tmp_path / "geocode.sqlite3"))
+        cache.put_forward("sabarmati", LANDMARKS)
+
+        assert cache.get_forward("sabarmati riv") == LANDMARKS[1:]
+        assert cache.get_forward("sabarmati zoo") is None
+        assert cache.prefix_hits == 1
+
+    def test_disk_tier_survives_restart_and_warms_memory(self, tmp_path):
+        """A new cache over the same file serves earlier lookups, from memory after warm()."""
+        path = str(tmp_path / "geocode.sqlite3")
+        first = mapbox_service.GeocodeCache(path)
+        first.put_forward("Sabarmati Ashram", LANDMARKS[:1])
+        first.put_reverse(72.58061, 23.06072, {"address": "Ashram Road, Ahmedabad", "type": "address"})
+        first.close()
+
+        restarted = mapbox_service.GeocodeCache(path)
+        assert restarted.warm() == 2
+        assert restarted.get_forward("sabarmati ashram") == LANDMARKS[:1]
+        assert restarted.get_reverse(72.58058, 23.06068)["address"] == "Ashram Road, Ahmedabad"
+        assert restarted.disk_hits == 0
+
+        cold = mapbox_service.GeocodeCache(path)
+        assert cold.get_forward("sabarmati ashram") == LANDMARKS[:1]
+        assert cold.disk_hits == 1
+
+    def test_expired_disk_entries_are_ignored(self, tmp_path):
+        """Rows older than the TTL are neither served nor warmed."""
+        path = str(tmp_path / "geocode.sqlite3")
+        writer = mapbox_service.GeocodeCache(path)
+        writer.put_forward("sabarmati", LANDMARKS)
+        writer.close()
+
+        expired = mapbox_service.GeocodeCache(path, ttl=0)
+
+        assert expired.warm() == 0
+        assert expired.get_forward("sabarmati") is None
+
+    def test_miss_reads_key_and_prefixes_in_one_query(self, tmp_path):
+        """A cold lookup fetches the exact key and every prefix with a single SELECT."""
+        path = str(tmp_path / "geocode.sqlite3")
+        writer = mapbox_service.GeocodeCache(path)
+        writer.put_forward("sabarmati", LANDMARKS)
+        writer.close()
+
+        cold = mapbox_service.GeocodeCache(path)
+        statements = []
+        cold._connection().set_trace_callback(statements.append)
+
+        assert cold.get_forward("sabarmati riv") == LANDMARKS[1:]
+        assert len([s for s in statements if s.startswith("SELECT")]) == 1
+
+    def test_async_lookups_read_disk_off_the_event_loop(self, tmp_path):
+        """The async lookups run the SQLite query in a worker thread."""
+        path = str(tmp_path / "geocode.sqlite3")
+        writer = mapbox_service.GeocodeCache(path)
+        writer.put_forward("sabarmati", LANDMARKS)
+        writer.put_reverse(72.58061, 23.06072, {"address": "Ashram Road, Ahmedabad", "type": "address"})
+        writer.close()
+
+        cold = mapbox_service.GeocodeCache(path)
+        threads = []
+        disk_get_many = cold._disk_get_many
+        cold._disk_get_many = lambda *args: threads.append(threading.current_thread()) or disk_get_many(*args)
+
+        async def lookups():
+            return (
+                await cold.get_forward_async("sabarmati"),
+                await cold.get_reverse_async(72.58061, 23.06072),
+            )
+
+        forward, reverse = asyncio.run(lookups())
+
+        assert forward == LANDMARKS
+        assert reverse["address"] == "Ashram Road, Ahmedabad"
+        assert len(threads) == 2
+        assert threading.main_thread() not in threads
+
+    def test_writes_are_batched_by_a_background_thread(self, tmp_path):
+        """put_* returns after the memory write; the writer thread stores entries in the background."""
+        cache = mapbox_service.GeocodeCache(str(tmp_path / "geocode.sqlite3"))
+        statements = []
+        cache._connection().set_trace_callback(statements.append)
+
+        for i in range(5):
+            cache.put_reverse(72.5 + i, 23.0, {"address": f"Stop {i}", "type": "address"})
+        cache.flush()
+
+        inserted = cache._connection().execute("SELECT COUNT(*) FROM geocode_cache").fetchone()[0]
+        assert inserted == 5
+        assert cache._writer is not threading.current_thread()
+        assert 1 <= len([s for s in statements if s == "COMMIT"]) <= 5
+        cache.close()
@@ -0,0 +1,238 @@
+"""
+Pytest unit tests for road_graph module.
+Tests for the spatial index used to snap GPS points onto the road network
+and for the bulk road graph builders (NetworkX and CSR).
+"""
+
+import pytest
+import numpy as np
+import networkx as nx
+import geopandas as gpd
+from shapely.geometry import LineString, Point
+from shapely.ops import nearest_points
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from road_graph import RoadSegmentIndex, build_road_graph, CSRRoadGraph, haversine_m
+
+
+def create_test_network():
+    """Helper to create a small road network GeoDataFrame around Ahmedabad."""
+    lines = [
+        LineString([(72.5200, 23.0300), (72.5250, 23.0350), (72.5300, 23.0400)]),
+        LineString([(72.5300, 23.0400), (72.5400, 23.0400)]),
+        LineString([(72.5400, 23.0400), (72.5400, 23.0500), (72.5500, 23.0500)]),
+    ]
+    return gpd.GeoDataFrame({"name": ["A", "B", "C"]}, geometry=lines, index=[10, 11, 12])
+
+
+class TestRoadSegmentIndex:
+    """Test suite for RoadSegmentIndex bulk snapping."""
+
+    def test_matches_brute_force_nearest(self):
+        """Bulk snapping returns the same segment, point and distance as a per-segment scan."""
+        network = create_test_network()
+        index = RoadSegmentIndex(network)
+
+        rng = np.random.default_rng(42)
+        lons = rng.uniform(72.52, 72.55, 200)
+        lats = rng.uniform(23.03, 23.05, 200)
+        result = index.snap(lons, lats, tolerance=1.0)
+
+        for i in range(len(lons)):
+            point = Point(lons[i], lats[i])
+            distances = [point.distance(geom) for geom in network.geometry]
+            best = int(np.argmin(distances))
+            expected_point, _ = nearest_points(network.geometry.iloc[best], point)
+
+            assert result.road_segment_id[i] == network.index[best]
+            assert result.distance[i] == pytest.approx(distances[best])
+            assert result.snapped_lon[i] == pytest.approx(expected_point.x)
+            assert result.snapped_lat[i] == pytest.approx(expected_point.y)
+
+    def test_points_outside_tolerance_are_not_snapped(self):
+        """Points farther than the tolerance keep their distance but get no snapped coordinates."""
+        index = RoadSegmentIndex(create_test_network())
+
+        result = index.snap([72.5250, 72.6000], [23.03505, 23.1000], tolerance=0.0001)
+
+        assert result.within_tolerance.tolist() == [True, False]
+        assert result.road_segment_id[0] == 10
+        assert result.road_segment_id[1] is None
+        assert np.isnan(result.snapped_lat[1])
+        assert result.distance[1] > 0.0001
+
+    def test_empty_input(self):
+        """Snapping an empty batch returns empty arrays."""
+        index = RoadSegmentIndex(create_test_network())
+
+        result = index.snap([], [], tolerance=0.0001)
+
+        assert len(result.distance) == 0
+        assert len(result.road_segment_id) == 0
+
+
+def build_reference_graph(road_network):
+    """Per-row reference builder (the original iterrows implementation)."""
+    G = nx.DiGraph()
+    for idx, row in road_network.iterrows():
+        if isinstance(row.geometry, LineString):
+            coords = list(row.geometry.coords)
+            for coord in coords:
+                node_id = (round(coord[0], 6), round(coord[1], 6))
+                if not G.has_node(node_id):
+                    G.add_node(node_id, lat=coord[1], lon=coord[0])
+            for i in range(len(coords) - 1):
+                start_node = (round(coords[i][0], 6), round(coords[i][1], 6))
+                end_node = (round(coords[i+1][0], 6), round(coords[i+1][1], 6))
+                G.add_edge(start_node, end_node,
+                           length=Point(coords[i]).distance(Point(coords[i+1])),
+                           segment_id=idx,
+                           geometry=LineString([coords[i], coords[i+1]]))
+    return G
+
+
+class TestBuildRoadGraph:
+    """Test suite for the vectorized build_road_graph."""
+
+    def test_matches_reference_builder(self):
+        """Bulk builder produces the same nodes, edges and attributes as the per-row loop."""
+        network = create_test_network()
+        expected = build_reference_graph(network)
+
+        graph = build_road_graph(network)
+
+        assert list(graph.nodes(data=True)) == list(expected.nodes(data=True))
+        assert list(graph.edges()) == list(expected.edges())
+        for u, v, data in graph.edges(data=True):
+            assert data['length'] == pytest.approx(expected[u][v]['length'])
+            assert data['segment_id'] == expected[u][v]['segment_id']
+            assert data['geometry'].equals(expected[u][v]['geometry'])
+            assert data['length_m'] == pytest.approx(haversine_m(*u, *v))
+
+    def test_shared_endpoints_become_one_node(self):
+        """Coordinates shared between segments map to a single intersection node."""
+        graph = build_road_graph(create_test_network())
+
+        assert graph.number_of_nodes() == 6
+        assert graph.has_edge((72.53, 23.04), (72.54, 23.04))
+        assert graph.has_edge((72.54, 23.04), (72.54, 23.05))
+
+    def test_without_geometry(self):
+        """include_geometry=False leaves the per-edge LineStrings out."""
+        graph = build_road_graph(create_test_network(), include_geometry=False)
+
+        assert graph.number_of_edges() == 5
+        for _, _, data in graph.edges(data=True):
+            assert 'geometry' not in data
+            assert set(data) == {'length', 'length_m', 'segment_id'}
+
+
+class TestCSRRoadGraph:
+    """Test suite for the compact CSR road graph."""
+
+    def test_matches_networkx_graph(self):
+        """CSR nodes and edges describe the same graph as build_road_graph."""
+        network = create_test_network()
+        graph = build_road_graph(network, include_geometry=False)
+
+        csr = CSRRoadGraph.from_road_network(network)
+
+        assert csr.num_nodes == graph.number_of_nodes()
+        assert csr.num_edges == graph.number_of_edges()
+        assert [csr.node_key(i) for i in range(csr.num_nodes)] == list(graph.nodes())
+        for u in range(csr.num_nodes):
+            for e in csr.edge_range(u):
+                u_key, v_key = csr.node_key(u), csr.node_key(csr.indices[e])
+                assert graph.has_edge(u_key, v_key)
+                assert csr.edge_segment_id(e) == graph[u_key][v_key]['segment_id']
+                assert csr.length[e] == graph[u_key][v_key]['length_m']
+
+    def test_duplicate_edges_keep_last_segment(self):
+        """Two segments over the same node pair collapse to one edge, like DiGraph.add_edge."""
+        lines = [
+            LineString([(72.52, 23.03), (72.53, 23.03)]),
+            LineString([(72.52, 23.03), (72.53, 23.03)]),
+        ]
+        network = gpd.GeoDataFrame(geometry=lines, index=[5, 7])
+
+        csr = CSRRoadGraph.from_road_network(network)
+
+        assert csr.num_edges == 1
+        assert csr.edge_segment_id(0) == 7
+
+    def test_compact_dtypes(self):
+        """Topology is stored as 32-bit arrays; lengths keep full precision so they equal 'length_m'."""
+        csr = CSRRoadGraph.from_road_network(create_test_network())
+
+        assert csr.indptr.dtype == np.int32
+        assert csr.indices.dtype == np.int32
+        assert csr.rev_source.dtype == np.int32
+        assert csr.length.dtype == np.float64
+        assert csr.weight.dtype == np.float64
+        assert csr.indptr[-1] == csr.num_edges
+
+    def test_adjacency_matches_networkx(self):
+        """succ, pred and [] give the same neighbors and edge data as the DiGraph, by node key."""
+        network = create_test_network()
+        graph = build_road_graph(network, include_geometry=False)
+
+        csr = CSRRoadGraph.from_road_network(network)
+
+        assert csr.nodes() == list(graph.nodes())
+        assert sorted(csr.edges()) == sorted(graph.edges())
+        for node in graph.nodes():
+            assert node in csr
+            for view, expected in ((csr.succ, graph.succ), (csr.pred, graph.pred)):
+                assert view[node].keys() == expected[node].keys()
+                for other, data in view[node].items():
+                    assert data['length_m'] == expected[node][other]['length_m']
+                    assert data['segment_id'] == expected[node][other]['segment_id']
+                    assert data['length'] == pytest.approx(expected[node][other]['length'], abs=1e-5)
+            assert csr[node].keys() == graph[node].keys()
+        assert (0.0, 0.0) not in csr
+
+    def test_neighbors_match_adjacency(self):
+        """neighbors() yields each node's edges as plain numbers, forward and reverse, like succ/pred."""
+        csr = CSRRoadGraph.from_road_network(create_test_network())
+        keys = csr.node_keys
+
+        for node in range(csr.num_nodes):
+            for reverse, view in ((False, csr.succ), (True, csr.pred)):
+                edges = list(csr.neighbors(node, reverse=reverse))
+                adjacency = view[keys[node]]
+                assert [keys[v] for v, _, _ in edges] == list(adjacency)
+                for v, cost, edge in edges:
+                    assert type(v) is int and type(cost) is float and type(edge) is int
+                    assert cost == adjacency[keys[v]]['length_m']
+                    assert csr.edge_segment_id(edge) == adjacency[keys[v]]['segment_id']
+
+        csr.weight = csr.weight * 2
+        assert [cost for _, cost, _ in csr.neighbors(0, 'weight')] == (csr.length[csr.edge_range(0)] * 2).tolist()
+
+    def test_nearest_nodes_matches_linear_scan(self):
+        """KD-tree batch lookup returns the same nodes as scanning every node."""
+        csr = CSRRoadGraph.from_road_network(create_test_network())
+
+        rng = np.random.default_rng(7)
+        lons = rng.uniform(72.50, 72.57, 100)
+        lats = rng.uniform(23.02, 23.06, 100)
+        nodes, distances = csr.nearest_nodes(lons, lats)
+
+        for i in range(len(lons)):
+            scan = np.hypot(csr.node_coords[:, 0] - lons[i], csr.node_coords[:, 1] - lats[i])
+            assert nodes[i] == int(np.argmin(scan))
+            assert distances[i] == pytest.approx(scan.min())
+
+    def test_nearest_nodes_on_empty_graph(self):
+        """An empty network resolves every point to -1."""
+        empty = gpd.GeoDataFrame(geometry=[LineString([(0, 0), (1, 1)])]).iloc[:0]
+        csr = CSRRoadGraph.from_road_network(empty)
+
+        nodes, distances = csr.nearest_nodes([72.5], [23.0])
+
+        assert nodes.tolist() == [-1]
+        assert np.isinf(distances[0])
@@ -0,0 +1,306 @@
+"""
+Pytest unit tests for road_routing module.
+Tests for the budgeted shortest-path and k-shortest-paths searches used by the route endpoints.
+"""
+
+import pytest
+import numpy as np
+import networkx as nx
+import geopandas as gpd
+from shapely.geometry import LineString
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from road_graph import CSRRoadGraph, build_road_graph, haversine_m
+from road_routing import (
+    RoutePath, SearchBudget, bidirectional_astar_path, dijkstra_path, k_shortest_paths, node_haversine_m, path_cost,
+)
+
+
+def create_grid_graph(rows=6, cols=6):
+    """Helper to create a directed street grid with distinct edge lengths."""
+    G = nx.DiGraph()
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols:
+                length = 1.0 + 0.01 * (r * cols + c)
+                G.add_edge((r, c), (r, c + 1), length=length)
+                G.add_edge((r, c + 1), (r, c), length=length)
+            if r + 1 < rows:
+                length = 1.0 + 0.02 * (r * cols + c)
+                G.add_edge((r, c), (r + 1, c), length=length)
+                G.add_edge((r + 1, c), (r, c), length=length)
+    return G
+
+
+def create_city_graph(num_nodes=80, num_edges=300, seed=3):
+    """Helper to create a random road graph keyed by (lon, lat) with 'length_m' at or above the haversine distance."""
+    rng = np.random.default_rng(seed)
+    nodes = [(72.50 + 0.05 * rng.random(), 23.00 + 0.05 * rng.random()) for _ in range(num_nodes)]
+    G = nx.DiGraph()
+    G.add_nodes_from(nodes)
+    for _ in range(num_edges):
+        u, v = rng.choice(num_nodes, size=2, replace=False)
+        detour = 1.0 + 0.5 * rng.random()
+        G.add_edge(nodes[u], nodes[v], length_m=node_haversine_m(nodes[u], nodes[v]) * detour)
+    return G
+
+
+def create_street_network(size=8, seed=2):
+    """Helper to create a (lon, lat) street grid GeoDataFrame where some streets are one-way."""
+    rng = np.random.default_rng(seed)
+    step = 0.001
+    lines = []
+    for r in range(size):
+        for c in range(size):
+            p = (72.50 + c * step + 0.0002 * rng.random(), 23.00 + r * step)
+            for q in ((72.50 + (c + 1) * step, p[1]), (p[0], 23.00 + (r + 1) * step)):
+                if q[0] < 72.50 + size * step and q[1] < 23.00 + size * step:
+                    lines.append(LineString([p, q]))
+                    if rng.random() < 0.7:
+                        lines.append(LineString([q, p]))
+    return gpd.GeoDataFrame(geometry=lines, index=range(100, 100 + len(lines)))
+
+
+class TestDijkstraPath:
+    """Test suite for the single-pair Dijkstra search."""
+
+    def test_matches_networkx(self):
+        """Cost and path agree with nx.dijkstra_path."""
+        G = create_grid_graph()
+
+        cost, path = dijkstra_path(G, (0, 0), (5, 5))
+
+        assert path == nx.dijkstra_path(G, (0, 0), (5, 5), weight='length')
+        assert cost == pytest.approx(nx.dijkstra_path_length(G, (0, 0), (5, 5), weight='length'))
+
+    def test_ignored_edges_force_detour(self):
+        """Ignoring the only direct edge makes the search go around it."""
+        G = nx.DiGraph()
+        G.add_edge('a', 'b', length=1.0)
+        G.add_edge('a', 'c', length=1.0)
+        G.add_edge('c', 'b', length=1.0)
+
+        assert dijkstra_path(G, 'a', 'b') == (1.0, ['a', 'b'])
+        assert dijkstra_path(G, 'a', 'b', ignored_edges={('a', 'b')}) == (2.0, ['a', 'c', 'b'])
+        assert dijkstra_path(G, 'a', 'b', ignored_nodes={'c'}, ignored_edges={('a', 'b')}) is None
+
+
+class TestBidirectionalAStar:
+    """Test suite for the bidirectional A* shortest-path query."""
+
+    def test_matches_dijkstra(self):
+        """Costs agree with plain Dijkstra for many random origin/destination pairs."""
+        G = create_city_graph()
+        nodes = list(G.nodes())
+        rng = np.random.default_rng(11)
+
+        for _ in range(50):
+            s, t = (nodes[i] for i in rng.choice(len(nodes), size=2, replace=False))
+            expected = dijkstra_path(G, s, t, weight='length_m')
+            result = bidirectional_astar_path(G, s, t)
+            if expected is None:
+                assert result is None
+                continue
+            cost, path = result
+            assert cost == pytest.approx(expected[0])
+            assert path[0] == s and path[-1] == t
+            assert path_cost(G, path, 'length_m') == pytest.approx(cost)
+
+    def test_astar_settles_fewer_nodes(self):
+        """The haversine heuristic prunes the search compared to Dijkstra."""
+        G = create_city_graph(num_nodes=400, num_edges=2000)
+        nodes = list(G.nodes())
+
+        dijkstra_budget, astar_budget = SearchBudget(), SearchBudget()
+        dijkstra_path(G, nodes[0], nodes[1], weight='length_m', budget=dijkstra_budget)
+        dijkstra_path(G, nodes[0], nodes[1], weight='length_m', budget=astar_budget, heuristic=node_haversine_m)
+
+        assert astar_budget.expansions < dijkstra_budget.expansions
+
+    def test_heuristic_matches_edge_lengths(self):
+        """node_haversine_m is the same distance road_graph.haversine_m gives edges as 'length_m'."""
+        rng = np.random.default_rng(8)
+        for lon1, lat1, lon2, lat2 in rng.uniform([72.4, 22.9, 72.4, 22.9], [72.7, 23.2, 72.7, 23.2], (20, 4)):
+            assert node_haversine_m((lon1, lat1), (lon2, lat2)) == pytest.approx(
+                float(haversine_m(lon1, lat1, lon2, lat2)), rel=1e-12
+            )
+
+    def test_same_source_and_target(self):
+        """A zero-length query returns the single node."""
+        G = create_city_graph()
+        node = next(iter(G.nodes()))
+
+        assert bidirectional_astar_path(G, node, node) == (0.0, [node])
+
+
+class TestKShortestPaths:
+    """Test suite for the bounded Yen's k-shortest-paths engine."""
+
+    def test_matches_networkx_shortest_simple_paths(self):
+        """The k paths have the same costs, in order, as networkx's Yen implementation."""
+        G = create_grid_graph()
+
+        result = k_shortest_paths(G, (0, 0), (5, 5), k=5)
+
+        expected = []
+        for path in nx.shortest_simple_paths(G, (0, 0), (5, 5), weight='length'):
+            expected.append(path_cost(G, path))
+            if len(expected) == 5:
+                break
+        assert [cost for cost, _ in result] == pytest.approx(expected)
+        for cost, path in result:
+            assert path[0] == (0, 0) and path[-1] == (5, 5)
+            assert len(set(path)) == len(path)
+            assert cost == pytest.approx(path_cost(G, path))
+
+    def test_heuristic_search_gives_same_costs(self):
+        """A* spur searches find the same k path costs as plain Dijkstra."""
+        G = create_city_graph()
+        nodes = list(G.nodes())
+
+        plain = k_shortest_paths(G, nodes[0], nodes[1], k=4, weight='length_m')
+        guided = k_shortest_paths(G, nodes[0], nodes[1], k=4, weight='length_m', heuristic=node_haversine_m)
+
+        assert [cost for cost, _ in guided] == pytest.approx([cost for cost, _ in plain])
+
+    def test_stops_when_no_more_paths(self):
+        """A graph with two routes yields two paths even when more are requested."""
+        G = nx.DiGraph()
+        G.add_edge('a', 'b', length=1.0)
+        G.add_edge('b', 'd', length=1.0)
+        G.add_edge('a', 'c', length=2.0)
+        G.add_edge('c', 'd', length=2.0)
+
+        result = k_shortest_paths(G, 'a', 'd', k=3)
+
+        assert result == [(2.0, ['a', 'b', 'd']), (4.0, ['a', 'c', 'd'])]
+
+    def test_ignored_edges_are_never_used(self):
+        """Blocked edges are avoided by the first search and every spur search, with or without A*."""
+        G = create_city_graph()
+        nodes = list(G.nodes())
+        first = k_shortest_paths(G, nodes[0], nodes[1], k=1, weight='length_m')[0][1]
+        blocked = {(first[0], first[1])}
+
+        for heuristic in (None, node_haversine_m):
+            result = k_shortest_paths(G, nodes[0], nodes[1], k=4, weight='length_m',
+                                      heuristic=heuristic, ignored_edges=blocked)
+            assert result
+            for _, path in result:
+                assert not blocked & set(zip(path[:-1], path[1:]))
+
+    def test_unreachable_or_missing_nodes(self):
+        """Disconnected or unknown endpoints give no paths."""
+        G = create_grid_graph(2, 2)
+        G.add_node('island')
+
+        assert k_shortest_paths(G, (0, 0), 'island') == []
+        assert k_shortest_paths(G, (0, 0), 'nowhere') == []
+
+    def test_expansion_budget_returns_partial_result(self):
+        """Running out of expansions returns the paths found so far instead of hanging."""
+        G = create_grid_graph(20, 20)
+
+        budget = SearchBudget(max_expansions=500)
+        result = k_shortest_paths(G, (0, 0), (19, 19), k=50, budget=budget)
+
+        assert 1 <= len(result) < 50
+        assert result[0][1] == nx.dijkstra_path(G, (0, 0), (19, 19), weight='length')
+
+    def test_time_budget(self):
+        """A zero time budget stops before any path is settled."""
+        G = create_grid_graph()
+
+        assert k_shortest_paths(G, (0, 0), (5, 5), budget=SearchBudget(time_limit_s=0)) == []
+
+
+class TestRoutePath:
+    """Test suite for the RoutePath edge-attribute arrays."""
+
+    def test_arrays_follow_the_path(self):
+        """Prefix lengths and per-edge arrays are read from the graph once, in path order."""
+        G = nx.DiGraph()
+        G.add_edge('a', 'b', length=1.0, length_m=110.0, segment_id=4)
+        G.add_edge('b', 'c', length=2.5, length_m=270.0, segment_id=9)
+
+        route = RoutePath.from_nodes(G, ['a', 'b', 'c'], cost=380.0)
+
+        assert route.cumulative_length.tolist() == [0.0, 1.0, 3.5]
+        assert route.length == 3.5
+        assert route.num_segments == 2
+        assert route.cost == 380.0
+        assert route.edge_attrs['length_m'].tolist() == [110.0, 270.0]
+        assert route.edge_attrs['segment_id'].tolist() == [4, 9]
+
+    def test_single_node_path(self):
+        """A zero-edge path has zero length and no edge entries."""
+        G = nx.DiGraph()
+        G.add_node('a')
+
+        route = RoutePath.from_nodes(G, ['a'])
+
+        assert route.length == 0.0
+        assert route.num_segments == 0
+        assert len(route.edge_attrs['length']) == 0
+
+
+class TestSearchOnCSRGraph:
+    """Test suite for running the searches on a CSRRoadGraph instead of a DiGraph."""
+
+    def test_same_results_as_networkx(self):
+        """A*, Yen's and RoutePath give the same paths and edge data on both graph forms."""
+        network = create_street_network()
+        G = build_road_graph(network, include_geometry=False)
+        csr = CSRRoadGraph.from_road_network(network)
+        nodes = list(G.nodes())
+        rng = np.random.default_rng(4)
+
+        for _ in range(20):
+            s, t = (nodes[i] for i in rng.choice(len(nodes), size=2, replace=False))
+            assert bidirectional_astar_path(csr, s, t) == bidirectional_astar_path(G, s, t)
+            expected = k_shortest_paths(G, s, t, k=3, weight='length_m', heuristic=node_haversine_m)
+            paths = k_shortest_paths(csr, s, t, k=3, weight='length_m', heuristic=node_haversine_m)
+            assert paths == expected
+            for cost, path in paths:
+                route, reference = RoutePath.from_nodes(csr, path, cost), RoutePath.from_nodes(G, path, cost)
+                assert np.array_equal(route.edge_attrs['length_m'], reference.edge_attrs['length_m'])
+                assert route.edge_attrs['segment_id'].tolist() == reference.edge_attrs['segment_id'].tolist()
+                assert route.length == pytest.approx(reference.length, abs=1e-5)
+
+    def test_searches_read_the_arrays(self, monkeypatch):
+        """The searches walk the CSR arrays and never build the per-node adjacency dicts."""
+        lines = [LineString([u, v]) for u, v in create_city_graph().edges()]
+        network = gpd.GeoDataFrame(geometry=lines, index=range(100, 100 + len(lines)))
+        G = build_road_graph(network, include_geometry=False)
+        csr = CSRRoadGraph.from_road_network(network)
+        s, t = csr.node_key(0), csr.node_key(1)
+        path = nx.dijkstra_path(G, s, t, weight='length_m')
+        blocked = {(path[0], path[1])}
+        expected = (
+            bidirectional_astar_path(G, s, t, ignored_edges=blocked),
+            k_shortest_paths(G, s, t, k=3, weight='length_m', heuristic=node_haversine_m, ignored_edges=blocked),
+            k_shortest_paths(G, s, t, k=3, weight='length_m', ignored_edges=blocked),
+        )
+
+        def no_dicts(self, key):
+            raise AssertionError("search built an adjacency dict")
+
+        monkeypatch.setattr(type(csr.succ), '__getitem__', no_dicts)
+        assert (
+            bidirectional_astar_path(csr, s, t, ignored_edges=blocked),
+            k_shortest_paths(csr, s, t, k=3, weight='length_m', heuristic=node_haversine_m, ignored_edges=blocked),
+            k_shortest_paths(csr, s, t, k=3, weight='length_m', ignored_edges=blocked),
+        ) == expected
+        assert len(expected[1]) == 3 and expected[0][1] != path
+
+    def test_missing_nodes(self):
+        """Keys that are not graph nodes find no path."""
+        csr = CSRRoadGraph.from_road_network(create_street_network(size=3))
+        node = csr.node_key(0)
+
+        assert bidirectional_astar_path(csr, node, (0.0, 0.0)) is None
+        assert k_shortest_paths(csr, (0.0, 0.0), node) == []
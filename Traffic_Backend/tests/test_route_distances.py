@@ -0,0 +1,88 @@
+"""
+Pytest tests for the /routes/distances endpoint.
+Tests A* and contraction-hierarchy answers and the per-request search budget on a small street grid.
+"""
+
+from types import SimpleNamespace
+
+import geopandas as gpd
+import pytest
+from fastapi.testclient import TestClient
+from shapely.geometry import LineString
+
+from Traffic_Backend import main
+from Traffic_Backend.contraction_hierarchy import ContractionHierarchy
+from Traffic_Backend.main import app
+from Traffic_Backend.road_graph import CSRRoadGraph
+from Traffic_Backend.road_routing import bidirectional_astar_path
+from Traffic_Backend.routers import routes
+
+STEP = 0.001
+
+
+def create_grid_csr(size=6):
+    """Helper to build a two-way street grid around (72.50, 23.00)."""
+    lines = []
+    for r in range(size):
+        for c in range(size):
+            p = (72.50 + c * STEP, 23.00 + r * STEP)
+            for q in ((p[0] + STEP, p[1]), (p[0], p[1] + STEP)):
+                if q[0] < 72.50 + size * STEP - STEP / 2 and q[1] < 23.00 + size * STEP - STEP / 2:
+                    lines += [LineString([p, q]), LineString([q, p])]
+    return CSRRoadGraph.from_road_network(gpd.GeoDataFrame(geometry=lines))
+
+
+PAIRS = [
+    {"start_lon": 72.500, "start_lat": 23.000, "end_lon": 72.505, "end_lat": 23.005},
+    {"start_lon": 72.502, "start_lat": 23.001, "end_lon": 72.500, "end_lat": 23.004},
+    {"start_lon": 72.505, "start_lat": 23.000, "end_lon": 72.501, "end_lat": 23.003},
+]
+
+
+@pytest.fixture
+def csr(monkeypatch):
+    """A street grid loaded as the routing graph, without a contraction hierarchy."""
+    graph = create_grid_csr()
+    monkeypatch.setattr(main, "road_network_csr", graph)
+    monkeypatch.setattr(main, "road_network_ch", None)
+    return graph
+
+
+def expected_km(csr):
+    """Helper to compute each pair's A* distance in km."""
+    distances = []
+    for pair in PAIRS:
+        nodes, _ = csr.nearest_nodes([pair["start_lon"], pair["end_lon"]], [pair["start_lat"], pair["end_lat"]])
+        cost, _ = bidirectional_astar_path(csr, csr.node_key(int(nodes[0])), csr.node_key(int(nodes[1])))
+        distances.append(round(cost / 1000, 4))
+    return distances
+
+
+class TestRouteDistances:
+    """Test suite for POST /routes/distances."""
+
+    def test_astar_distances(self, csr):
+        """Every pair is answered within the request budget."""
+        body = TestClient(app).post("/routes/distances", json={"pairs": PAIRS}).json()
+
+        assert body == {"distances_km": expected_km(csr), "contraction_hierarchy": False, "complete": True}
+
+    def test_spent_request_budget_leaves_remaining_pairs_null(self, csr, monkeypatch):
+        """Pairs after the request budget runs out are null and the result is marked incomplete."""
+        # Request start, then the clock as each pair is reached: the third is past the 5 s budget
+        clock = iter([0.0, 1.0, 2.0, 9.0])
+        monkeypatch.setattr(routes, "ROUTE_DISTANCES_TIME_BUDGET_S", 5.0)
+        monkeypatch.setattr(routes, "time", SimpleNamespace(perf_counter=lambda: next(clock)))
+
+        body = TestClient(app).post("/routes/distances", json={"pairs": PAIRS}).json()
+
+        assert body["distances_km"] == expected_km(csr)[:2] + [None]
+        assert body["complete"] is False
+
+    def test_contraction_hierarchy_answers_match(self, csr, monkeypatch):
+        """With a hierarchy loaded the same distances come back without the A* budget."""
+        monkeypatch.setattr(main, "road_network_ch", ContractionHierarchy.build(csr))
+
+        body = TestClient(app).post("/routes/distances", json={"pairs": PAIRS}).json()
+
+        assert body == {"distances_km": expected_km(csr), "contraction_hierarchy": True, "complete": True}
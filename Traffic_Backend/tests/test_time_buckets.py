@@ -0,0 +1,152 @@
+"""
+Pytest unit tests for time_buckets module.
+Tests the SQL each dialect gets and the hourly aggregations they produce.
+
+Queries run on SQLite, and on MySQL too when NAVDRISHTI_TEST_MYSQL_URL points
+at a disposable database.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine.default import DefaultDialect
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Traffic_Backend import time_buckets
+from Traffic_Backend.db_config import get_db
+from Traffic_Backend.main import app
+from Traffic_Backend.models import Base, RoadNetwork, TrafficDynamics
+from Traffic_Backend.time_buckets import hour_bucket, hour_of_day, parse_hour_bucket
+
+MYSQL_URL = os.getenv("NAVDRISHTI_TEST_MYSQL_URL")
+
+
+class standard_hour_bucket(hour_bucket):
+    """hour_bucket compiled with the standard-SQL fallback on every dialect."""
+    inherit_cache = True
+
+
+compiles(standard_hour_bucket)(time_buckets._hour_bucket_default)
+
+
+def compiled(expression, dialect):
+    return str(select(expression).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def Session(request):
+    """Empty database wired into the analytics router."""
+    if request.param == "sqlite":
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    elif MYSQL_URL:
+        engine = create_engine(MYSQL_URL)
+    else:
+        pytest.skip("NAVDRISHTI_TEST_MYSQL_URL not set")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield factory
+    app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine)
+
+
+class TestCompiledSql:
+    """Test suite for the per-dialect SQL of the bucketing expressions."""
+
+    @pytest.mark.parametrize("dialect, expected", [
+        (sqlite.dialect(), "strftime('%Y-%m-%d %H:00:00', traffic_dynamics.timestamp)"),
+        (mysql.dialect(), "DATE_FORMAT(traffic_dynamics.timestamp, '%%Y-%%m-%%d %%H:00:00')"),
+        (postgresql.dialect(), "to_char(date_trunc('hour', traffic_dynamics.timestamp), 'YYYY-MM-DD HH24:00:00')"),
+    ])
+    def test_hour_bucket(self, dialect, expected):
+        assert expected in compiled(hour_bucket(TrafficDynamics.timestamp), dialect)
+
+    def test_hour_bucket_falls_back_to_standard_sql(self):
+        """Other dialects get EXTRACT/CAST/CASE instead of an error."""
+        sql = compiled(hour_bucket(TrafficDynamics.timestamp), DefaultDialect())
+
+        assert "CAST(CAST(EXTRACT(year FROM traffic_dynamics.timestamp) AS INTEGER) AS VARCHAR(4)) || '-'" in sql
+        assert "EXTRACT(hour FROM traffic_dynamics.timestamp)" in sql and sql.count("THEN '0' ||") == 3
+
+    @pytest.mark.parametrize("dialect, expected", [
+        (sqlite.dialect(), "CAST(strftime('%H', traffic_dynamics.timestamp) AS INTEGER)"),
+        (mysql.dialect(), "HOUR(traffic_dynamics.timestamp)"),
+        (postgresql.dialect(), "CAST(EXTRACT(HOUR FROM traffic_dynamics.timestamp) AS INTEGER)"),
+    ])
+    def test_hour_of_day(self, dialect, expected):
+        assert expected in compiled(hour_of_day(TrafficDynamics.timestamp), dialect)
+
+
+class TestHourlyAggregation:
+    """Test suite for grouping by the bucketing expressions in the database."""
+
+    def test_group_by_hour_bucket(self, Session):
+        """Readings are grouped into the hour that holds them."""
+        db = Session()
+        db.add(RoadNetwork(id=1, name="Road 1"))
+        for minute in (5, 40, 65):
+            db.add(TrafficDynamics(road_segment_id=1, timestamp=datetime(2025, 1, 1, 8) + timedelta(minutes=minute)))
+        db.commit()
+
+        rows = db.execute(
+            select(hour_bucket(TrafficDynamics.timestamp).label("hour"), hour_of_day(TrafficDynamics.timestamp),
+                   func.count())
+            .group_by("hour", hour_of_day(TrafficDynamics.timestamp)).order_by("hour")
+        ).all()
+        db.close()
+
+        assert [(parse_hour_bucket(hour), of_day, count) for hour, of_day, count in rows] == [
+            (datetime(2025, 1, 1, 8), 8, 2),
+            (datetime(2025, 1, 1, 9), 9, 1),
+        ]
+
+    def test_standard_sql_fallback_matches_native_bucket(self, Session):
+        """The fallback yields the same zero-padded text as the dialect's own function."""
+        db = Session()
+        db.add(RoadNetwork(id=1, name="Road 1"))
+        for timestamp in (datetime(2025, 1, 2, 3, 4), datetime(2025, 11, 21, 14, 59)):
+            db.add(TrafficDynamics(road_segment_id=1, timestamp=timestamp))
+        db.commit()
+
+        rows = db.execute(
+            select(hour_bucket(TrafficDynamics.timestamp), standard_hour_bucket(TrafficDynamics.timestamp))
+            .order_by(TrafficDynamics.timestamp)
+        ).all()
+        db.close()
+
+        assert [(str(native), fallback) for native, fallback in rows] == [
+            ("2025-01-02 03:00:00", "2025-01-02 03:00:00"),
+            ("2025-11-21 14:00:00", "2025-11-21 14:00:00"),
+        ]
+
+    def test_traffic_trends_are_hourly(self, Session):
+        """/analytics/traffic-trends reports one row per hour and congestion state, stamped with the hour."""
+        hour = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+        db = Session()
+        db.add(RoadNetwork(id=1, name="Road 1"))
+        for minute, speed, state in ((10, 30.0, "moderate"), (20, 50.0, "moderate"), (30, 10.0, "congested")):
+            db.add(TrafficDynamics(road_segment_id=1, timestamp=hour + timedelta(minutes=minute),
+                                   average_speed=speed, vehicle_count=5, congestion_state=state))
+        db.commit()
+        db.close()
+
+        trends = TestClient(app).get("/analytics/traffic-trends?hours=6").json()
+
+        assert [(t["timestamp"], t["congestion_state"], t["avg_speed"], t["vehicle_count"]) for t in trends] == [
+            (hour.isoformat(), "congested", 10.0, 5),
+            (hour.isoformat(), "moderate", 40.0, 10),
+        ]
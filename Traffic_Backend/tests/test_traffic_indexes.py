@@ -0,0 +1,122 @@
+"""
+Pytest query-plan checks for the traffic_dynamics indexes.
+Runs each endpoint, captures the SQL it sends for traffic_dynamics and asserts
+the database plans it through an index rather than a full table scan.
+
+SQLite always runs; MySQL runs when NAVDRISHTI_TEST_MYSQL_URL points at a
+disposable database (its tables are created and dropped by the test).
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Traffic_Backend.db_config import get_db
+from Traffic_Backend.main import app
+from Traffic_Backend.models import Base, RoadNetwork, TrafficDynamics
+from Traffic_Backend.routers import traffic
+
+INDEXES = ("ix_traffic_dynamics_segment_timestamp", "ix_traffic_dynamics_timestamp")
+MYSQL_URL = os.getenv("NAVDRISHTI_TEST_MYSQL_URL")
+
+
+def create_test_engine(backend):
+    if backend == "sqlite":
+        return create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    if not MYSQL_URL:
+        pytest.skip("NAVDRISHTI_TEST_MYSQL_URL not set")
+    return create_engine(MYSQL_URL)
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def indexed_db(request):
+    """Database with a few days of readings, wired into the app; yields (engine, captured statements)."""
+    engine = create_test_engine(request.param)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    db = Session()
+    now = datetime.now()
+    db.add_all([RoadNetwork(id=segment_id, name=f"Road {segment_id}", base_capacity=100) for segment_id in range(1, 6)])
+    # Core insert: only the raw table is queried here, so the latest/rollup upkeep is skipped
+    db.execute(insert(TrafficDynamics), [
+        {"road_segment_id": segment_id, "timestamp": now - timedelta(minutes=minutes),
+         "vehicle_count": 20 + minutes % 50, "average_speed": 30.0 + minutes % 20, "congestion_state": "moderate"}
+        for segment_id in range(1, 6) for minutes in range(0, 3 * 24 * 60, 30)
+    ])
+    db.commit()
+    db.close()
+    if request.param == "sqlite":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM traffic_dynamics" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[traffic.get_db] = override_get_db
+    yield engine, captured
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(traffic.get_db, None)
+    event.remove(engine, "before_cursor_execute", capture)
+    Base.metadata.drop_all(bind=engine)
+
+
+def traffic_dynamics_access(engine, statement, parameters):
+    """
+    How the plan reads traffic_dynamics: one index name per access, or None
+    for an access that is not a range/lookup search of one of INDEXES
+    (full table scans and full index scans alike).
+    """
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            details = [row[-1] for row in plan if " traffic_dynamics " in row[-1] + " "]
+            return [
+                next((name for name in INDEXES if name in detail), None) if detail.startswith("SEARCH") else None
+                for detail in details
+            ]
+        plan = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+        return [
+            row["key"] if row["type"] in ("range", "ref") else None
+            for row in plan if row["table"] == "traffic_dynamics"
+        ]
+
+
+class TestTrafficDynamicsIndexes:
+    """Test suite for index use by the endpoints that filter traffic history."""
+
+    @pytest.mark.parametrize("path", [
+        "/analytics/traffic-trends?hours=6",
+        "/analytics/traffic-trends?hours=6&road_segment_id=2",
+        "/traffic/history/2?limit=20",
+        "/ai/anomalies?hours=6",
+    ])
+    def test_endpoint_queries_use_indexes(self, indexed_db, path):
+        """Every traffic_dynamics read of the endpoint goes through one of the indexes."""
+        engine, captured = indexed_db
+
+        response = TestClient(app).get(path)
+
+        assert response.status_code == 200
+        assert captured, "endpoint issued no traffic_dynamics query"
+        for statement, parameters in captured:
+            access = traffic_dynamics_access(engine, statement, parameters)
+            assert access and all(name in INDEXES for name in access), (statement, access)
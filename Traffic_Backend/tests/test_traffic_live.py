@@ -0,0 +1,333 @@
+"""
+Pytest tests for the /traffic/live endpoint.
+Runs against an in-memory SQLite database and counts the SQL statements each request issues.
+"""
+
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Traffic_Backend.main import app
+from Traffic_Backend.models import Base, RoadNetwork, TrafficDynamics, TrafficLatest, rebuild_traffic_latest
+from Traffic_Backend.routers import traffic
+from Traffic_Backend import models
+from Traffic_Backend import road_geometry_cache as geometry_cache
+
+
+@pytest.fixture
+def live_db(tmp_path, monkeypatch):
+    """In-memory database wired into the traffic router, plus a list of executed statements."""
+    # The endpoint writes its debug file to the working directory
+    monkeypatch.chdir(tmp_path)
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[traffic.get_db] = override_get_db
+    cache = geometry_cache.RoadGeometryCache()
+    monkeypatch.setattr(geometry_cache, "road_geometry_cache", cache)
+    monkeypatch.setattr(traffic, "road_geometry_cache", cache)
+    yield Session, statements
+    app.dependency_overrides.pop(traffic.get_db, None)
+
+
+@pytest.fixture
+def parse_count(monkeypatch):
+    """Counts geometry texts parsed by the geometry cache."""
+    calls = []
+
+    def counting_loads(text, *args, **kwargs):
+        calls.append(text)
+        return json.loads(text, *args, **kwargs)
+
+    monkeypatch.setattr(geometry_cache, "json", SimpleNamespace(loads=counting_loads, dumps=json.dumps))
+    return calls
+
+
+def add_segments(Session, count, readings_per_segment=3):
+    """Helper to add roads with several TrafficDynamics readings each; the last reading is the newest."""
+    db = Session()
+    start = datetime(2025, 1, 1, 8, 0)
+    for i in range(1, count + 1):
+        coordinates = [[72.50 + 0.001 * i, 23.00], [72.50 + 0.001 * i, 23.01]]
+        db.add(RoadNetwork(id=i, name=f"Road {i}", base_capacity=100,
+                           geometry=json.dumps({"type": "LineString", "coordinates": coordinates})))
+        for r in range(readings_per_segment):
+            db.add(TrafficDynamics(road_segment_id=i, timestamp=start + timedelta(minutes=5 * r),
+                                   vehicle_count=10 * (r + 1), average_speed=40.0 - r, congestion_state="moderate"))
+    db.commit()
+    db.close()
+
+
+def latest_row(Session, segment_id):
+    """Helper to read one segment's traffic_latest row as a dict."""
+    db = Session()
+    row = db.get(TrafficLatest, segment_id)
+    db.close()
+    return row and {"timestamp": row.timestamp, "average_speed": row.average_speed}
+
+
+class TestTrafficLatest:
+    """Test suite for keeping traffic_latest current on insert."""
+
+    def test_insert_upserts_latest(self, live_db):
+        """Each segment has one row, holding its newest reading."""
+        Session, _ = live_db
+        add_segments(Session, 2, readings_per_segment=4)
+
+        db = Session()
+        assert db.query(TrafficLatest).count() == 2
+        db.close()
+        assert latest_row(Session, 1) == {"timestamp": datetime(2025, 1, 1, 8, 15), "average_speed": 37.0}
+
+    def test_late_reading_does_not_replace_newer(self, live_db):
+        """An out-of-order observation stays in the history only."""
+        Session, _ = live_db
+        add_segments(Session, 1)
+
+        db = Session()
+        db.add(TrafficDynamics(road_segment_id=1, timestamp=datetime(2025, 1, 1, 7, 0), average_speed=5.0))
+        db.commit()
+        db.close()
+
+        assert latest_row(Session, 1)["average_speed"] == 38.0
+
+    def test_rebuild_matches_history(self, live_db):
+        """Rebuilding from history gives the same rows the inserts produced."""
+        Session, _ = live_db
+        add_segments(Session, 3)
+        before = [latest_row(Session, i) for i in (1, 2, 3)]
+
+        db = Session()
+        db.query(TrafficLatest).delete()
+        db.commit()
+        rebuild_traffic_latest(db.connection())
+        db.commit()
+        db.close()
+
+        assert [latest_row(Session, i) for i in (1, 2, 3)] == before
+
+    def test_upsert_is_a_single_statement(self, live_db):
+        """On SQLite a reading reaches traffic_latest through one INSERT ... ON CONFLICT."""
+        Session, statements = live_db
+        add_segments(Session, 1, readings_per_segment=1)
+        statements.clear()
+
+        db = Session()
+        db.add(TrafficDynamics(road_segment_id=1, timestamp=datetime(2025, 1, 1, 9, 0), average_speed=20.0))
+        db.commit()
+        db.close()
+
+        latest = [s for s in statements if "traffic_latest" in s]
+        assert len(latest) == 1 and "ON CONFLICT" in latest[0]
+        assert latest_row(Session, 1)["average_speed"] == 20.0
+
+    def test_insert_race_falls_back_to_update(self, live_db, monkeypatch):
+        """Without an upsert clause, losing the INSERT race to a concurrent first reading retries the UPDATE."""
+        Session, _ = live_db
+        add_segments(Session, 1, readings_per_segment=0)
+        monkeypatch.setattr(models, "_dialect_insert", lambda connection, table: None)
+
+        def concurrent_first_reading(connection):
+            connection.execute(TrafficLatest.__table__.insert().values(
+                road_segment_id=1, timestamp=datetime(2025, 1, 1, 8, 0), average_speed=50.0
+            ))
+
+        db = Session()
+        connection = db.connection()
+        reading = SimpleNamespace(road_segment_id=1, id=None, timestamp=datetime(2025, 1, 1, 9, 0), average_speed=20.0,
+                                  flow_entropy=None, congestion_state=None, vehicle_count=None)
+        models.upsert_traffic_latest(RacingConnection(connection, concurrent_first_reading), reading)
+        db.commit()
+        db.close()
+
+        assert latest_row(Session, 1) == {"timestamp": datetime(2025, 1, 1, 9, 0), "average_speed": 20.0}
+
+    def test_route_live_reads_latest_row(self, live_db):
+        """GET /traffic/live/{route_id} answers from traffic_latest by primary key."""
+        Session, statements = live_db
+        add_segments(Session, 2)
+        statements.clear()
+
+        response = TestClient(app).get("/traffic/live/2")
+
+        assert response.json()["average_speed"] == 38.0
+        assert len(statements) == 1
+        assert "FROM traffic_latest" in statements[0] and "FROM traffic_dynamics" not in statements[0]
+        assert TestClient(app).get("/traffic/live/99").status_code == 404
+
+
+class RacingConnection:
+    """Connection stand-in that lets a concurrent writer commit its row right before the INSERT attempt."""
+
+    def __init__(self, connection, concurrent_writer):
+        self.connection = connection
+        self.dialect = connection.dialect
+        self.concurrent_writer = concurrent_writer
+
+    def execute(self, statement, *args, **kwargs):
+        return self.connection.execute(statement, *args, **kwargs)
+
+    def begin_nested(self):
+        self.concurrent_writer(self.connection)
+        return self.connection.begin_nested()
+
+
+class TestTrafficLive:
+    """Test suite for GET /traffic/live."""
+
+    def test_latest_reading_per_segment(self, live_db):
+        """Each segment appears once with its newest reading and its road's geometry."""
+        Session, _ = live_db
+        add_segments(Session, 3)
+
+        response = TestClient(app).get("/traffic/live")
+
+        body = response.json()
+        assert response.status_code == 200
+        assert "mock" not in body
+        assert sorted(s["segment_id"] for s in body["segments"]) == ["seg_1", "seg_2", "seg_3"]
+        first = next(s for s in body["segments"] if s["segment_id"] == "seg_1")
+        assert first["speed_kmh"] == 38.0
+        assert first["vehicle_count"] == 30
+        assert first["coordinates"] == [[72.501, 23.0], [72.501, 23.01]]
+        assert 0.0 <= first["congestion_level"] <= 1.0
+
+    def test_query_count_does_not_grow_with_segments(self, live_db):
+        """Ten and two hundred segments are served with the same number of statements (cold cache)."""
+        Session, statements = live_db
+        client = TestClient(app)
+
+        add_segments(Session, 10)
+        statements.clear()
+        assert len(client.get("/traffic/live").json()["segments"]) == 10
+        small = len(statements)
+
+        db = Session()
+        db.query(TrafficLatest).delete()
+        db.query(TrafficDynamics).delete()
+        db.query(RoadNetwork).delete()
+        db.commit()
+        db.close()
+        add_segments(Session, 200)
+        statements.clear()
+        assert len(client.get("/traffic/live").json()["segments"]) == 200
+
+        # The joined read, plus one fetch of the geometries not cached yet
+        assert len(statements) == small == 2
+
+    def test_empty_database_returns_mock(self, live_db):
+        """Without traffic readings the dashboard still gets mock segments."""
+        response = TestClient(app).get("/traffic/live")
+
+        assert response.json()["mock"] is True
+
+    def test_geometries_parsed_once_across_polls(self, live_db, parse_count):
+        """Repeated polls serve cached geometries without fetching or parsing them again."""
+        Session, statements = live_db
+        add_segments(Session, 5)
+        client = TestClient(app)
+
+        first = client.get("/traffic/live").json()
+        statements.clear()
+        second = client.get("/traffic/live").json()
+
+        assert len(parse_count) == 5
+        assert first["segments"] == second["segments"]
+        assert traffic.road_geometry_cache.stats()["hits"] == 5
+        # A warm poll selects only the version, never the geometry text
+        assert len(statements) == 1
+        assert "geometry_version" in statements[0] and "road_network.geometry," not in statements[0]
+
+    def test_changed_geometry_is_reparsed(self, live_db, parse_count):
+        """An edited road is served with its new coordinates on the next poll."""
+        Session, _ = live_db
+        add_segments(Session, 2)
+        client = TestClient(app)
+        client.get("/traffic/live")
+
+        db = Session()
+        db.get(RoadNetwork, 1).geometry = json.dumps({"type": "LineString", "coordinates": [[72.6, 23.1], [72.6, 23.2]]})
+        db.commit()
+        db.close()
+        # The ORM update dropped the stale entry right away
+        assert len(traffic.road_geometry_cache) == 1
+        body = client.get("/traffic/live").json()
+
+        first = next(s for s in body["segments"] if s["segment_id"] == "seg_1")
+        assert first["coordinates"] == [[72.6, 23.1], [72.6, 23.2]]
+        assert len(parse_count) == 3
+
+    def test_geometry_changed_elsewhere_is_reparsed(self, live_db, parse_count):
+        """A Core update with a new version (e.g. from another process) is picked up without invalidation."""
+        Session, _ = live_db
+        add_segments(Session, 2)
+        client = TestClient(app)
+        client.get("/traffic/live")
+
+        db = Session()
+        db.execute(update(RoadNetwork).where(RoadNetwork.id == 2).values(
+            geometry=json.dumps({"type": "LineString", "coordinates": [[72.7, 23.1], [72.7, 23.2]]}),
+            geometry_version="edited",
+        ))
+        db.commit()
+        db.close()
+        assert len(traffic.road_geometry_cache) == 2
+        body = client.get("/traffic/live").json()
+
+        second = next(s for s in body["segments"] if s["segment_id"] == "seg_2")
+        assert second["coordinates"] == [[72.7, 23.1], [72.7, 23.2]]
+        assert len(parse_count) == 3
+
+    def test_orm_geometry_update_bumps_version(self, live_db):
+        """Changing geometry through the ORM gives the road a new geometry_version."""
+        Session, _ = live_db
+        add_segments(Session, 1)
+        db = Session()
+        road = db.get(RoadNetwork, 1)
+        before = road.geometry_version
+        road.name = "Renamed"
+        db.commit()
+        renamed = road.geometry_version
+        road.geometry = json.dumps({"type": "LineString", "coordinates": [[72.6, 23.1], [72.6, 23.2]]})
+        db.commit()
+
+        assert before and renamed == before
+        assert road.geometry_version != before
+        db.close()
+
+    def test_segment_errors_reach_the_regular_log_rate_limited(self, live_db, monkeypatch, caplog):
+        """A broken road is skipped and warned about once per interval, even with diagnostics off."""
+        Session, _ = live_db
+        add_segments(Session, 2)
+        db = Session()
+        db.get(RoadNetwork, 2).geometry = "not json"
+        db.commit()
+        db.close()
+        monkeypatch.setattr(traffic, "_segment_errors", {"logged_at": None, "suppressed": 0})
+        client = TestClient(app)
+
+        with caplog.at_level("WARNING", logger="traffic_live"):
+            first = client.get("/traffic/live").json()
+            client.get("/traffic/live")
+
+        assert [s["segment_id"] for s in first["segments"]] == ["seg_1"]
+        warnings = [r.getMessage() for r in caplog.records if r.name == "traffic_live"]
+        assert len(warnings) == 1
+        assert "Skipped 1 of 2 segments" in warnings[0] and "segment 2" in warnings[0]
+        assert traffic._segment_errors["suppressed"] == 1
@@ -0,0 +1,291 @@
+"""
+Pytest unit tests for traffic_rollups module.
+Tests incremental rollup upkeep, rebuilds, rollup selection, retention and the analytics endpoints reading rollups.
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from Traffic_Backend import models, traffic_rollups
+from Traffic_Backend.db_config import get_db
+from Traffic_Backend.main import app
+from Traffic_Backend.models import (
+    Base, RoadNetwork, TrafficDynamics, TrafficLatest, TrafficRollup1h, TrafficRollup1m, TrafficRollup15m,
+)
+
+NOW = datetime(2025, 3, 10, 12, 0)
+
+
+@pytest.fixture
+def Session():
+    """In-memory database wired into the analytics router."""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+
+    def override_get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield factory
+    app.dependency_overrides.pop(get_db, None)
+
+
+def add_readings(Session, readings):
+    """Helper to insert (segment_id, timestamp, speed, vehicles) readings through the ORM."""
+    db = Session()
+    for segment_id in {r[0] for r in readings}:
+        if db.get(RoadNetwork, segment_id) is None:
+            db.add(RoadNetwork(id=segment_id, name=f"Road {segment_id}", base_capacity=100))
+    for segment_id, timestamp, speed, vehicles in readings:
+        db.add(TrafficDynamics(road_segment_id=segment_id, timestamp=timestamp, average_speed=speed,
+                               vehicle_count=vehicles, flow_entropy=0.5))
+    db.commit()
+    db.close()
+
+
+def rollup_rows(Session, rollup):
+    """Helper to read a rollup table as {(segment_id, bucket_start): row}."""
+    db = Session()
+    rows = {(r.road_segment_id, r.bucket_start): r for r in db.query(rollup).all()}
+    db.close()
+    return rows
+
+
+class TestIncrementalRollups:
+    """Test suite for rollups kept current on insert."""
+
+    def test_readings_land_in_every_granularity(self, Session):
+        """Three readings in one hour make three minute, two quarter-hour and one hourly bucket."""
+        add_readings(Session, [
+            (1, datetime(2025, 3, 10, 8, 1, 10), 30.0, 10),
+            (1, datetime(2025, 3, 10, 8, 1, 50), 40.0, 20),
+            (1, datetime(2025, 3, 10, 8, 20), None, 30),
+        ])
+
+        assert len(rollup_rows(Session, TrafficRollup1m)) == 2
+        assert sorted(b for _, b in rollup_rows(Session, TrafficRollup15m)) == [
+            datetime(2025, 3, 10, 8, 0), datetime(2025, 3, 10, 8, 15)
+        ]
+        hour = rollup_rows(Session, TrafficRollup1h)[(1, datetime(2025, 3, 10, 8, 0))]
+        assert hour.sample_count == 3
+        assert (hour.speed_count, hour.speed_sum, hour.speed_sq_sum) == (2, 70.0, 2500.0)
+        assert (hour.vehicle_samples, hour.vehicle_sum) == (3, 60)
+        assert hour.entropy_sum == pytest.approx(1.5)
+
+    def test_rebuild_matches_incremental(self, Session):
+        """Rebuilding from raw history reproduces the incrementally maintained buckets."""
+        add_readings(Session, [
+            (segment_id, NOW - timedelta(minutes=7 * i), 20.0 + i, i) for segment_id in (1, 2) for i in range(40)
+        ])
+        before = {r: rollup_rows(Session, r) for r in (TrafficRollup1m, TrafficRollup15m, TrafficRollup1h)}
+
+        db = Session()
+        traffic_rollups.rebuild_traffic_rollups(db.connection(), now=NOW)
+        db.commit()
+        db.close()
+
+        for rollup, rows in before.items():
+            after = rollup_rows(Session, rollup)
+            assert after.keys() == rows.keys()
+            for key, row in rows.items():
+                assert (after[key].sample_count, after[key].speed_sum, after[key].vehicle_sum) == \
+                    (row.sample_count, row.speed_sum, row.vehicle_sum)
+
+    def test_rebuild_fills_empty_rollups(self, Session):
+        """Rollup tables emptied (or created next to bulk-loaded history) are filled from every raw reading."""
+        add_readings(Session, [(1, NOW - timedelta(minutes=7 * i), 20.0 + i, i) for i in range(40)])
+        before = rollup_rows(Session, TrafficRollup1h)
+        db = Session()
+        db.query(TrafficRollup1h).delete()
+        db.commit()
+
+        traffic_rollups.rebuild_traffic_rollups(db.connection(), now=NOW)
+        db.commit()
+        db.close()
+
+        after = rollup_rows(Session, TrafficRollup1h)
+        assert after.keys() == before.keys()
+        assert {key: row.sample_count for key, row in after.items()} == \
+            {key: row.sample_count for key, row in before.items()}
+
+    def test_rebuild_keeps_buckets_raw_retention_purged(self, Session, monkeypatch):
+        """Hourly buckets older than the remaining raw history survive a rebuild; newer ones are recomputed."""
+        monkeypatch.setattr(traffic_rollups, "RAW_RETENTION_DAYS", 7)
+        add_readings(Session, [
+            (1, NOW - timedelta(days=30, minutes=20), 30.0, 5),
+            (1, NOW - timedelta(days=30, minutes=10), 40.0, 6),
+            (1, NOW - timedelta(days=7, minutes=30), 45.0, 7),
+            (1, NOW - timedelta(hours=1), 50.0, 8),
+        ])
+        db = Session()
+        traffic_rollups.apply_retention(db.connection(), now=NOW)
+        db.commit()
+        assert db.query(TrafficDynamics).count() == 1
+        before = rollup_rows(Session, TrafficRollup1h)
+
+        traffic_rollups.rebuild_traffic_rollups(db.connection(), now=NOW)
+        db.commit()
+        db.close()
+
+        after = rollup_rows(Session, TrafficRollup1h)
+        assert after.keys() == before.keys()
+        assert after[(1, datetime(2025, 2, 8, 11, 0))].sample_count == 2
+        assert after[(1, datetime(2025, 3, 3, 11, 0))].sample_count == 1
+        assert after[(1, NOW - timedelta(hours=1))].sample_count == 1
+
+
+    def test_each_rollup_is_one_upsert_statement(self, Session):
+        """On SQLite a reading reaches each rollup table through one INSERT ... ON CONFLICT."""
+        add_readings(Session, [(1, NOW, 30.0, 10)])
+        db = Session()
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+        db.add(TrafficDynamics(road_segment_id=1, timestamp=NOW, average_speed=40.0))
+        db.commit()
+        db.close()
+
+        rollup_statements = [s for s in statements if "traffic_rollup_" in s]
+        assert len(rollup_statements) == 3
+        assert all("ON CONFLICT" in s for s in rollup_statements)
+        assert rollup_rows(Session, TrafficRollup1h)[(1, NOW)].sample_count == 2
+
+    def test_insert_race_falls_back_to_update(self, Session, monkeypatch):
+        """Without an upsert clause, buckets inserted concurrently are added to instead of failing."""
+        db = Session()
+        db.add(RoadNetwork(id=1, name="Road 1"))
+        db.commit()
+        monkeypatch.setattr(models, "_dialect_insert", lambda connection, table: None)
+        connection = db.connection()
+        reading = SimpleNamespace(road_segment_id=1, timestamp=NOW, average_speed=30.0, vehicle_count=10, flow_entropy=None)
+
+        class RacingConnection:
+            """Connection stand-in on which a concurrent writer adds the same reading right before the first INSERT."""
+            dialect = connection.dialect
+            raced = False
+
+            def execute(self, statement, *args, **kwargs):
+                return connection.execute(statement, *args, **kwargs)
+
+            def begin_nested(self):
+                if not self.raced:
+                    self.raced = True
+                    models.upsert_traffic_rollups(connection, reading)
+                return connection.begin_nested()
+
+        models.upsert_traffic_rollups(RacingConnection(), reading)
+        db.commit()
+        db.close()
+
+        for rollup in (TrafficRollup1m, TrafficRollup15m, TrafficRollup1h):
+            bucket = rollup_rows(Session, rollup)[(1, NOW)]
+            assert (bucket.sample_count, bucket.speed_sum, bucket.vehicle_sum) == (2, 60.0, 20)
+
+
+class TestRollupSelection:
+    """Test suite for choosing the rollup a query reads."""
+
+    @pytest.mark.parametrize("window, group_seconds, expected", [
+        (timedelta(hours=1), None, TrafficRollup1m),
+        (timedelta(hours=6), None, TrafficRollup15m),
+        (timedelta(days=1), None, TrafficRollup1h),
+        (timedelta(hours=6), 3600, TrafficRollup15m),
+        (timedelta(days=7), 3600, TrafficRollup1h),
+        # No rollup is within the skew limit: the finest one is used
+        (timedelta(minutes=10), None, TrafficRollup1m),
+    ])
+    def test_coarsest_rollup_within_skew(self, window, group_seconds, expected):
+        """The widest buckets that keep the window start error under ROLLUP_MAX_SKEW win."""
+        assert traffic_rollups.rollup_for(NOW - window, now=NOW, group_seconds=group_seconds) is expected
+
+    def test_retention_rules_out_fine_rollups(self):
+        """A window reaching past the 15-minute rollup's retention reads the hourly one."""
+        assert traffic_rollups.rollup_for(NOW - timedelta(days=90), now=NOW) is TrafficRollup1h
+
+
+class TestRetention:
+    """Test suite for apply_retention."""
+
+    def test_raw_rows_are_kept_by_default(self, Session, monkeypatch):
+        """Without TRAFFIC_RAW_RETENTION_DAYS raw history is never deleted; fine rollups still are."""
+        monkeypatch.delenv("TRAFFIC_RAW_RETENTION_DAYS", raising=False)
+        monkeypatch.setattr(
+            traffic_rollups, "RAW_RETENTION_DAYS", traffic_rollups._retention_days("TRAFFIC_RAW_RETENTION_DAYS", "")
+        )
+        add_readings(Session, [(1, NOW - timedelta(days=400), 30.0, 5), (1, NOW, 35.0, 6)])
+
+        db = Session()
+        deleted = traffic_rollups.apply_retention(db.connection(), now=NOW)
+        db.commit()
+        assert "traffic_dynamics" not in deleted
+        assert deleted["traffic_rollup_1m"] == 1
+        assert db.query(TrafficDynamics).count() == 2
+        db.close()
+
+    def test_old_rows_are_deleted(self, Session, monkeypatch):
+        """Raw rows and fine buckets past retention go; hourly buckets and latest readings stay."""
+        monkeypatch.setattr(traffic_rollups, "RAW_RETENTION_DAYS", 7)
+        add_readings(Session, [
+            (1, NOW - timedelta(days=10), 30.0, 5),
+            (1, NOW - timedelta(hours=1), 35.0, 6),
+            # Segment 2 stopped reporting: its only reading is also its latest
+            (2, NOW - timedelta(days=10), 50.0, 7),
+        ])
+
+        db = Session()
+        deleted = traffic_rollups.apply_retention(db.connection(), now=NOW)
+        db.commit()
+        db.close()
+
+        assert deleted["traffic_dynamics"] == 1
+        assert deleted["traffic_rollup_1m"] == 2
+        db = Session()
+        assert db.query(TrafficDynamics).count() == 2
+        assert db.get(TrafficLatest, 2).average_speed == 50.0
+        assert db.query(TrafficRollup1h).count() == 3
+        db.close()
+
+
+class TestAnalyticsFromRollups:
+    """Test suite for analytics endpoints answered from rollups."""
+
+    def test_speed_profiles_match_raw_averages(self, Session):
+        """Hour-of-day averages and sample sizes equal those of the raw readings."""
+        now = datetime.now().replace(minute=30)
+        readings = [(1, now - timedelta(days=1, minutes=m), 20.0 + m, m) for m in range(0, 60, 6)]
+        add_readings(Session, readings)
+
+        profiles = TestClient(app).get("/analytics/speed-profiles?days=3").json()
+
+        by_hour = {}
+        for _, timestamp, speed, vehicles in readings:
+            by_hour.setdefault(timestamp.hour, []).append((speed, vehicles))
+        assert {p["hour"]: p["sample_size"] for p in profiles} == {h: len(v) for h, v in by_hour.items()}
+        for profile in profiles:
+            speeds = [s for s, _ in by_hour[profile["hour"]]]
+            assert profile["avg_speed"] == round(sum(speeds) / len(speeds), 2)
+
+    def test_summary_survives_raw_retention(self, Session, monkeypatch):
+        """All-time totals still count readings whose raw rows were expired."""
+        monkeypatch.setattr(traffic_rollups, "RAW_RETENTION_DAYS", 7)
+        add_readings(Session, [(1, datetime.now() - timedelta(days=d), 40.0, 10) for d in (1, 20, 40)])
+        db = Session()
+        traffic_rollups.apply_retention(db.connection())
+        db.commit()
+        db.close()
+
+        summary = TestClient(app).get("/analytics/summary").json()
+
+        assert summary["total_traffic_records"] == 3
+        assert summary["avg_speed_kmh"] == 40.0
+        assert summary["most_congested_segment"] == "Road 1"
@@ -0,0 +1,94 @@
+"""
+Pytest unit tests for zone_avoidance module.
+Tests zone parsing and the STRtree-backed route and edge intersection checks.
+"""
+
+import os
+import sys
+
+import numpy as np
+import shapely
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from zone_avoidance import AvoidanceZones, zone_geometry
+
+
+def square(lon, lat, half=0.001):
+    """Helper to create a GeoJSON square polygon centered on (lon, lat)."""
+    ring = [[lon - half, lat - half], [lon + half, lat - half], [lon + half, lat + half],
+            [lon - half, lat + half], [lon - half, lat - half]]
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+ZONE_A = square(72.505, 23.000)
+ZONE_B = square(72.600, 23.100)
+
+
+class TestZoneGeometry:
+    """Test suite for zone_geometry."""
+
+    def test_accepts_polygon_and_feature(self):
+        """A bare Polygon and a Feature wrapping it give the same geometry."""
+        feature = {"type": "Feature", "properties": {}, "geometry": ZONE_A}
+
+        assert zone_geometry(ZONE_A).equals(zone_geometry(feature))
+
+    def test_rejects_non_polygons(self):
+        """Points, empty input and malformed rings yield None."""
+        assert zone_geometry({"type": "Point", "coordinates": [72.5, 23.0]}) is None
+        assert zone_geometry({}) is None
+        assert zone_geometry({"type": "Polygon", "coordinates": [[[72.5, 23.0]]]}) is None
+
+    def test_repairs_self_intersecting_ring(self):
+        """A bow-tie polygon is made valid instead of breaking intersection tests."""
+        bow_tie = {"type": "Polygon", "coordinates": [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]}
+
+        geometry = zone_geometry(bow_tie)
+
+        assert geometry.is_valid
+        assert geometry.area > 0
+
+
+class TestAvoidanceZones:
+    """Test suite for AvoidanceZones."""
+
+    def test_route_through_zone_is_detected(self):
+        """Only the polyline crossing a zone is reported."""
+        zones = AvoidanceZones.from_geojson([ZONE_A, ZONE_B])
+
+        assert zones.intersects_line([[72.50, 23.00], [72.51, 23.00]])
+        assert not zones.intersects_line([[72.50, 23.01], [72.51, 23.01]])
+        assert not zones.intersects_line([])
+
+    def test_filter_routes(self):
+        """Routes entering a zone are dropped and counted."""
+        zones = AvoidanceZones.from_geojson([ZONE_A])
+        through = {"id": "route-1", "geometry": {"coordinates": [[72.50, 23.00], [72.51, 23.00]]}}
+        around = {"id": "route-2", "geometry": {"coordinates": [[72.50, 23.00], [72.505, 23.003], [72.51, 23.00]]}}
+
+        clear, excluded = zones.filter_routes([through, around])
+
+        assert [r["id"] for r in clear] == ["route-2"]
+        assert excluded == 1
+
+    def test_edge_mask_matches_brute_force(self):
+        """The tree-filtered mask over many edges equals testing every edge against every zone."""
+        rng = np.random.default_rng(2)
+        starts = np.column_stack([72.50 + 0.01 * rng.random(300), 23.00 + 0.01 * rng.random(300)])
+        lines = shapely.linestrings(np.stack([starts, starts + 0.0005], axis=1))
+        zones = AvoidanceZones.from_geojson([square(72.503, 23.003), square(72.507, 23.006, half=0.002)])
+
+        expected = np.array([any(line.intersects(z) for z in zones.geometries) for line in lines])
+
+        assert expected.any()
+        assert np.array_equal(zones.intersecting(lines), expected)
+
+    def test_no_zones(self):
+        """An empty zone set blocks nothing."""
+        zones = AvoidanceZones.from_geojson([{"type": "Point", "coordinates": [72.5, 23.0]}])
+
+        assert len(zones) == 0
+        assert not zones.intersects_line([[72.50, 23.00], [72.51, 23.00]])
+        assert not zones.intersecting(shapely.linestrings([[[72.50, 23.00], [72.51, 23.00]]])).any()
@@ -0,0 +1,95 @@
+"""
+Dialect-portable time bucketing for SQL aggregations.
+
+hour_bucket() and hour_of_day() are SQL expressions that compile to the
+active database's own date functions (strftime on SQLite, DATE_FORMAT/HOUR on
+MySQL, date_trunc/EXTRACT on PostgreSQL, standard EXTRACT/CAST elsewhere), so
+GROUP BY on them runs in the database whichever backend db_config connects to.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import Integer, String, case, cast, extract, literal, literal_column
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+# Text form of an hour bucket on every dialect
+HOUR_BUCKET_FORMAT = '%Y-%m-%d %H:00:00'
+
+
+class hour_bucket(FunctionElement):
+    """Start of the hour holding a DateTime expression, as 'YYYY-MM-DD HH:00:00' text."""
+    type = String()
+    inherit_cache = True
+    name = 'hour_bucket'
+
+
+class hour_of_day(FunctionElement):
+    """Hour (0-23) of a DateTime expression, as an integer."""
+    type = Integer()
+    inherit_cache = True
+    name = 'hour_of_day'
+
+
+def parse_hour_bucket(value) -> datetime:
+    """datetime of an hour_bucket() result."""
+    return value if isinstance(value, datetime) else datetime.strptime(value, HOUR_BUCKET_FORMAT)
+
+
+def _argument(element, compiler, **kw):
+    return compiler.process(element.clauses.clauses[0], **kw)
+
+
+@compiles(hour_bucket, 'sqlite')
+def _hour_bucket_sqlite(element, compiler, **kw):
+    return f"strftime('%Y-%m-%d %H:00:00', {_argument(element, compiler, **kw)})"
+
+
+@compiles(hour_bucket, 'mysql')
+def _hour_bucket_mysql(element, compiler, **kw):
+    # Bound rather than inlined, so the MySQL drivers' %-formatting leaves it alone
+    pattern = compiler.process(literal(HOUR_BUCKET_FORMAT), **kw)
+    return f"DATE_FORMAT({_argument(element, compiler, **kw)}, {pattern})"
+
+
+@compiles(hour_bucket, 'postgresql')
+def _hour_bucket_postgresql(element, compiler, **kw):
+    return f"to_char(date_trunc('hour', {_argument(element, compiler, **kw)}), 'YYYY-MM-DD HH24:00:00')"
+
+
+@compiles(hour_bucket)
+def _hour_bucket_default(element, compiler, **kw):
+    # SQL standard EXTRACT/CAST/CASE, zero-padded by hand; the dialect renders the concatenation
+    timestamp = element.clauses.clauses[0]
+
+    def field(name):
+        value = cast(extract(name, timestamp), Integer)
+        text = cast(value, String(4))
+        if name == 'year':
+            return text
+        return case((value < 10, literal_column("'0'", String) + text), else_=text)
+
+    def separator(text):
+        return literal_column(f"'{text}'", String)
+
+    bucket = (
+        field('year') + separator('-') + field('month') + separator('-') + field('day')
+        + separator(' ') + field('hour') + separator(':00:00')
+    )
+    return compiler.process(bucket, **kw)
+
+
+@compiles(hour_of_day, 'sqlite')
+def _hour_of_day_sqlite(element, compiler, **kw):
+    return f"CAST(strftime('%H', {_argument(element, compiler, **kw)}) AS INTEGER)"
+
+
+@compiles(hour_of_day, 'mysql')
+def _hour_of_day_mysql(element, compiler, **kw):
+    return f"HOUR({_argument(element, compiler, **kw)})"
+
+
+@compiles(hour_of_day)
+def _hour_of_day_default(element, compiler, **kw):
+    # SQL standard; PostgreSQL returns numeric, hence the cast
+    return f"CAST(EXTRACT(HOUR FROM {_argument(element, compiler, **kw)}) AS INTEGER)"
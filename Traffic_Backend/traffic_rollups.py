@@ -0,0 +1,231 @@
+"""
+Rollup storage for TrafficDynamics history.
+
+Every inserted reading is added to per-segment 1-minute, 15-minute and hourly
+buckets (traffic_rollup_1m/15m/1h, maintained by the insert listener in
+models.py). Analytics read the coarsest rollup that answers their query.
+
+Retention runs every TRAFFIC_RETENTION_INTERVAL_S seconds and trims the fine
+rollups (TRAFFIC_ROLLUP_1M_RETENTION_DAYS, default 2; ..._15M_..., default 60);
+hourly buckets are kept unless TRAFFIC_ROLLUP_1H_RETENTION_DAYS is set.
+Deleting raw traffic_dynamics rows is opt-in: set TRAFFIC_RAW_RETENTION_DAYS
+to the days of raw history to keep. Unset, raw history is never deleted.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Type
+
+from sqlalchemy import func, select
+from starlette.concurrency import run_in_threadpool
+
+from Traffic_Backend.models import (
+    TRAFFIC_ROLLUPS, TrafficDynamics, TrafficLatest, TrafficRollup1h, TrafficRollup1m, TrafficRollup15m,
+    ROLLUP_SUM_COLUMNS, TrafficRollupColumns, rollup_bucket_start, rollup_increments,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _retention_days(name: str, default: str) -> Optional[float]:
+    """Days from the environment; empty or 0 keeps data forever."""
+    value = float(os.getenv(name, default) or 0)
+    return value if value > 0 else None
+
+
+# How long each store keeps data (days); None keeps it forever. Raw deletion is opt-in
+RAW_RETENTION_DAYS = _retention_days("TRAFFIC_RAW_RETENTION_DAYS", "")
+ROLLUP_RETENTION_DAYS = {
+    TrafficRollup1m: _retention_days("TRAFFIC_ROLLUP_1M_RETENTION_DAYS", "2"),
+    TrafficRollup15m: _retention_days("TRAFFIC_ROLLUP_15M_RETENTION_DAYS", "60"),
+    TrafficRollup1h: _retention_days("TRAFFIC_ROLLUP_1H_RETENTION_DAYS", ""),
+}
+RETENTION_INTERVAL_S = float(os.getenv("TRAFFIC_RETENTION_INTERVAL_S", "3600"))
+
+# Largest share of a query window that aligning its start to a bucket boundary may add
+ROLLUP_MAX_SKEW = 0.05
+
+# Raw rows read per round-trip when rebuilding rollups
+REBUILD_BATCH_ROWS = 5000
+
+
+def rollup_for(cutoff: datetime, now: Optional[datetime] = None,
+               group_seconds: Optional[int] = None) -> Type[TrafficRollupColumns]:
+    """
+    Coarsest rollup that answers a query over [cutoff, now].
+
+    The rollup must still retain cutoff, its buckets must nest in the query's
+    time grouping (group_seconds, e.g. 3600 for per-hour results), and flooring
+    cutoff to its bucket may widen the window by at most ROLLUP_MAX_SKEW. When
+    no rollup meets the skew limit the finest usable one is used; the hourly
+    rollup is the last resort.
+    """
+    now = now or datetime.now()
+    window_s = max((now - cutoff).total_seconds(), 1.0)
+    usable = []
+    for rollup in TRAFFIC_ROLLUPS:
+        retention = ROLLUP_RETENTION_DAYS.get(rollup)
+        if retention is not None and cutoff < now - timedelta(days=retention):
+            continue
+        if group_seconds and group_seconds % rollup.bucket_seconds:
+            continue
+        usable.append(rollup)
+    if not usable:
+        return TrafficRollup1h
+    within_skew = [r for r in usable if r.bucket_seconds <= window_s * ROLLUP_MAX_SKEW]
+    return within_skew[-1] if within_skew else usable[0]
+
+
+def rollup_window_start(rollup: Type[TrafficRollupColumns], cutoff: datetime) -> datetime:
+    """First bucket_start a query from cutoff reads from rollup."""
+    return rollup_bucket_start(cutoff, rollup.bucket_seconds)
+
+
+def apply_retention(connection, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Delete raw readings and rollup buckets past their retention.
+
+    Raw readings still referenced by traffic_latest are kept, so a segment that
+    stopped reporting keeps its last reading.
+
+    Returns:
+        Rows deleted per table
+    """
+    now = now or datetime.now()
+    deleted = {}
+    if RAW_RETENTION_DAYS is not None:
+        raw = TrafficDynamics.__table__
+        referenced = select(TrafficLatest.traffic_dynamics_id).where(TrafficLatest.traffic_dynamics_id.isnot(None))
+        result = connection.execute(raw.delete().where(
+            raw.c.timestamp < now - timedelta(days=RAW_RETENTION_DAYS),
+            raw.c.id.not_in(referenced),
+        ))
+        deleted[raw.name] = result.rowcount
+    for rollup in TRAFFIC_ROLLUPS:
+        retention = ROLLUP_RETENTION_DAYS.get(rollup)
+        if retention is None:
+            continue
+        table = rollup.__table__
+        cutoff = rollup_bucket_start(now - timedelta(days=retention), rollup.bucket_seconds)
+        deleted[table.name] = connection.execute(table.delete().where(table.c.bucket_start < cutoff)).rowcount
+    return deleted
+
+
+def _raw_history_start(connection, now: datetime) -> Optional[datetime]:
+    """
+    Earliest time from which traffic_dynamics still holds every reading (None
+    when it holds none that raw retention could have deleted). Retention keeps
+    old rows that traffic_latest references, so those are not counted.
+    """
+    raw = TrafficDynamics.__table__
+    referenced = select(TrafficLatest.traffic_dynamics_id).where(TrafficLatest.traffic_dynamics_id.isnot(None))
+    start = connection.execute(select(func.min(raw.c.timestamp)).where(raw.c.id.not_in(referenced))).scalar()
+    if RAW_RETENTION_DAYS is not None:
+        cutoff = now - timedelta(days=RAW_RETENTION_DAYS)
+        start = max(start, cutoff) if start is not None else cutoff
+    return start
+
+
+def _next_bucket_start(timestamp: datetime, bucket_seconds: int) -> datetime:
+    """First bucket boundary at or after timestamp."""
+    start = rollup_bucket_start(timestamp, bucket_seconds)
+    return start if start == timestamp else start + timedelta(seconds=bucket_seconds)
+
+
+def rebuild_traffic_rollups(connection, now: Optional[datetime] = None):
+    """
+    Refill the rollup tables from the raw history (existing databases, bulk
+    loads that bypass the ORM). An empty rollup table is filled from every raw
+    reading. A filled one is rebuilt only from the first bucket the raw history
+    still fully covers: earlier buckets may be the only record of readings raw
+    retention has deleted, so they are kept as they are. Buckets already past a
+    rollup's retention are not recreated.
+    """
+    now = now or datetime.now()
+    raw = TrafficDynamics.__table__
+    history_start = _raw_history_start(connection, now)
+    # Per rollup, the first bucket_start to rebuild (None rebuilds every bucket)
+    first_bucket = {}
+    for rollup in TRAFFIC_ROLLUPS:
+        table = rollup.__table__
+        bounds = []
+        retention = ROLLUP_RETENTION_DAYS.get(rollup)
+        if retention is not None:
+            bounds.append(now - timedelta(days=retention))
+        if connection.execute(select(table.c.bucket_start).limit(1)).first() is not None:
+            if history_start is None:
+                continue
+            bounds.append(history_start)
+        if bounds:
+            first_bucket[rollup] = _next_bucket_start(max(bounds), rollup.bucket_seconds)
+            connection.execute(table.delete().where(table.c.bucket_start >= first_bucket[rollup]))
+        else:
+            first_bucket[rollup] = None
+            connection.execute(table.delete())
+    if not first_bucket:
+        return
+
+    segment_ids = connection.execute(
+        select(raw.c.road_segment_id).where(raw.c.road_segment_id.isnot(None)).distinct()
+    ).scalars().all()
+    columns = (raw.c.id, raw.c.timestamp, raw.c.average_speed, raw.c.vehicle_count, raw.c.flow_entropy)
+    # One segment's buckets are held at a time; its readings are paged by id
+    for segment_id in segment_ids:
+        buckets = {rollup: {} for rollup in first_bucket}
+        last_id = 0
+        while True:
+            readings = connection.execute(
+                select(*columns)
+                .where(raw.c.road_segment_id == segment_id, raw.c.id > last_id, raw.c.timestamp.isnot(None))
+                .order_by(raw.c.id)
+                .limit(REBUILD_BATCH_ROWS)
+            ).all()
+            if not readings:
+                break
+            last_id = readings[-1].id
+            for reading in readings:
+                _add_to_buckets(buckets, first_bucket, reading)
+        _insert_buckets(connection, segment_id, buckets)
+
+
+def _add_to_buckets(buckets, first_bucket, reading):
+    increments = rollup_increments(reading)
+    for rollup, by_start in buckets.items():
+        if first_bucket[rollup] is not None and reading.timestamp < first_bucket[rollup]:
+            continue
+        totals = by_start.setdefault(
+            rollup_bucket_start(reading.timestamp, rollup.bucket_seconds), dict.fromkeys(ROLLUP_SUM_COLUMNS, 0)
+        )
+        for name, value in increments.items():
+            totals[name] += value
+
+
+def _insert_buckets(connection, segment_id, buckets):
+    for rollup, by_start in buckets.items():
+        if by_start:
+            connection.execute(rollup.__table__.insert(), [
+                {"road_segment_id": segment_id, "bucket_start": start, **totals}
+                for start, totals in by_start.items()
+            ])
+
+
+async def run_retention_periodically(session_factory, interval_s: float = RETENTION_INTERVAL_S):
+    """Apply retention every interval_s seconds until cancelled."""
+    def run_once():
+        db = session_factory()
+        try:
+            deleted = apply_retention(db.connection())
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    while True:
+        try:
+            deleted = await run_in_threadpool(run_once)
+            logger.info("Traffic retention deleted %s", deleted)
+        except Exception:
+            logger.exception("Traffic retention failed")
+        await asyncio.sleep(interval_s)
@@ -0,0 +1,87 @@
+"""
+Construction-zone avoidance for diversion routing.
+
+Zone polygons are prepared and indexed in an STRtree, so a candidate route or a
+batch of road-graph edges is only tested exactly against the zones whose
+bounding boxes it touches.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString, shape
+from shapely.geometry.base import BaseGeometry
+from shapely.strtree import STRtree
+
+logger = logging.getLogger("zone_avoidance")
+
+
+def zone_geometry(geojson: Dict[str, Any]) -> Optional[BaseGeometry]:
+    """
+    Polygonal shapely geometry of a GeoJSON Polygon, MultiPolygon or Feature.
+    Returns None for empty or non-polygonal input; invalid rings are repaired.
+    """
+    if not geojson:
+        return None
+    if geojson.get("type") == "Feature":
+        geojson = geojson.get("geometry") or {}
+    if geojson.get("type") not in ("Polygon", "MultiPolygon"):
+        return None
+    try:
+        geometry = shape(geojson)
+    except (ValueError, TypeError, AttributeError, IndexError) as e:
+        logger.warning(f"Ignoring malformed zone polygon: {e}")
+        return None
+    if not geometry.is_valid:
+        geometry = shapely.make_valid(geometry)
+    return None if geometry.is_empty else geometry
+
+
+class AvoidanceZones:
+    """
+    Set of zones routes must not enter.
+
+    Args:
+        geometries: Polygonal shapely geometries (see zone_geometry)
+    """
+
+    def __init__(self, geometries: Iterable[BaseGeometry]):
+        self.geometries = np.array([g for g in geometries if g is not None and not g.is_empty], dtype=object)
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+
+    @classmethod
+    def from_geojson(cls, polygons: Iterable[Dict[str, Any]]) -> "AvoidanceZones":
+        return cls(zone_geometry(p) for p in polygons)
+
+    def __len__(self) -> int:
+        return len(self.geometries)
+
+    def intersects_line(self, coordinates: Sequence[Sequence[float]]) -> bool:
+        """Whether a [lon, lat] polyline enters any zone."""
+        if len(self) == 0 or len(coordinates) == 0:
+            return False
+        line = LineString(coordinates) if len(coordinates) > 1 else shapely.points(coordinates[0])
+        candidates = self.tree.query(line)
+        return bool(shapely.intersects(self.geometries[candidates], line).any())
+
+    def intersecting(self, geometries: np.ndarray) -> np.ndarray:
+        """Boolean mask over an array of geometries (e.g. road-graph edges) that touch any zone."""
+        mask = np.zeros(len(geometries), dtype=bool)
+        if len(self) == 0 or len(geometries) == 0:
+            return mask
+        # Bounding-box candidates from the tree, then the exact test against the prepared zones
+        geometry_idx, zone_idx = self.tree.query(geometries)
+        hits = shapely.intersects(self.geometries[zone_idx], geometries[geometry_idx])
+        mask[geometry_idx[hits]] = True
+        return mask
+
+    def filter_routes(self, routes: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """Split parsed routes into those clear of every zone and a count of the ones dropped."""
+        clear = [
+            route for route in routes
+            if not self.intersects_line(route.get("geometry", {}).get("coordinates", []))
+        ]
+        return clear, len(routes) - len(clear)